@@ -29,11 +29,13 @@ classes = [
     panels.import_model.ImportModelPanel,
     panels.import_model.ModelFolderSelector,
     panels.import_model.ModelImporter,
+    panels.import_model.BatchModelImporter,
+    panels.import_model.LazyTextureLoader,
     panels.export_model.ExportModelPanel,
     panels.export_model.ModelExporterOperator,
+    panels.export_model.BatchModelExporterOperator,
     panels.export_model.VanillaNusktbSelector,
     panels.io_matl.MaterialPanel,
-    panels.io_matl.SsbhLibJsonFileSelector,
     panels.io_matl.NumatbFileSelector,
     panels.io_matl.MatlReimporter,
     panels.exo_skel.BuildBoneList,
@@ -48,6 +50,7 @@ classes = [
     panels.import_anim.AnimArmatureClearOperator,
     panels.import_anim.AnimCameraClearOperator,
     panels.import_anim.AnimModelImporterOperator,
+    panels.import_anim.BatchAnimModelImporterOperator,
     panels.import_anim.AnimCameraImporterOperator,
 ]
 
@@ -61,12 +64,15 @@ def register():
 
     properties.register()
     shaders.custom_sampler_node.register()
+    panels.texture_cache.register()
     print('Loaded Smash Ultimate Blender Tools!')
 
 def unregister():
     print('Unloading Smash Ultimate Blender Tools')
 
+    panels.texture_cache.unregister()
     shaders.custom_sampler_node.unregister()
+    operators.shader_db.close_shader_database()
     for cls in reversed(classes):
         try:
             bpy.utils.unregister_class(cls)
@@ -0,0 +1,295 @@
+'''
+Command line driver for running imports and exports without the UI.
+
+Run this with Blender in background mode and pass the command after '--'.
+    blender -b --factory-startup --python cli.py -- import-model --folder fighter/mario/model/body/c00 --save mario.blend
+    blender -b mario.blend --python cli.py -- export-model --armature c00 --output out/c00 --vanilla-nusktb model.nusktb
+    blender -b mario.blend --python cli.py -- import-anim --armature c00 --anim a00wait1.nuanmb --save mario.blend
+    blender -b mario.blend --python cli.py -- batch-import-anims --armature c00 --folder motion/body/c00 --nla --save mario.blend
+    blender -b --factory-startup --python cli.py -- batch-import-models --root fighter/mario/model --save mario.blend
+    blender -b --factory-startup --python cli.py -- export-farm --jobs jobs.json --workers 8
+
+The result is printed as a single line of JSON starting with RESULT_PREFIX and optionally written to --json.
+Blender exits with a non zero exit code if the command fails.
+'''
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+import bpy
+
+RESULT_PREFIX = 'SUB_CLI_RESULT: '
+ADDON_MODULE_NAME = 'smash_ultimate_blender'
+
+
+class Reporter:
+    '''
+    Collects the messages that would normally be shown by operator.report in the UI.
+    '''
+    def __init__(self):
+        self.messages = []
+
+    def report(self, type, message):
+        level = next(iter(type), 'INFO')
+        print(f'{level}: {message}')
+        self.messages.append({'level': level, 'message': message})
+
+    def has_errors(self):
+        return any(m['level'] == 'ERROR' for m in self.messages)
+
+
+def load_addon():
+    '''
+    Imports the addon from this folder and registers it if needed.
+    The folder name isn't always a valid module name, so load the package by its file location.
+    '''
+    module = sys.modules.get(ADDON_MODULE_NAME)
+    if module is not None:
+        return module
+
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    spec = importlib.util.spec_from_file_location(
+        ADDON_MODULE_NAME, os.path.join(addon_dir, '__init__.py'), submodule_search_locations=[addon_dir])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[ADDON_MODULE_NAME] = module
+    spec.loader.exec_module(module)
+
+    # An installed and enabled copy of the addon already registered the classes and properties.
+    if not hasattr(bpy.types.Scene, 'sub_anim_armature'):
+        module.register()
+    return module
+
+
+def find_armature(name):
+    armature = bpy.data.objects.get(name)
+    if armature is None or armature.type != 'ARMATURE':
+        raise RuntimeError(f'No armature named {name} found in {bpy.data.filepath or "the current file"}')
+    return armature
+
+
+def import_model(addon, context, args, reporter):
+    import_model = addon.panels.import_model
+    dir = os.path.join(os.path.abspath(args.folder), '')
+    model_files = import_model.find_model_files(dir)
+    if model_files['.numshb'] == '' or model_files['.nusktb'] == '':
+        raise RuntimeError(f'Needs .NUMSHB and .NUSKTB at a minimum to import {dir}')
+
+    armature = import_model.import_model_files(context, dir,
+                                               model_files['.numdlb'], model_files['.numshb'], model_files['.nusktb'],
+                                               model_files['.numatb'], model_files['.nuhlpb'],
+                                               args.all_vertex_groups, args.lazy_textures)
+    if args.name:
+        armature.name = args.name
+    return {'armature': armature.name, 'files': model_files}
+
+
+def batch_import_models(addon, context, args, reporter):
+    results = addon.panels.import_model.batch_import_models(
+        reporter, context, os.path.abspath(args.root), args.all_vertex_groups, args.lazy_textures)
+    models = [
+        {'folder': name, 'armature': armature.name if armature is not None else None, 'seconds': seconds, 'error': error}
+        for name, armature, seconds, error in results
+    ]
+    return {'models': models}
+
+
+def export_model(addon, context, args, reporter):
+    armature = find_armature(args.armature)
+    os.makedirs(args.output, exist_ok=True)
+    exclude = set(args.exclude)
+    vanilla_nusktb = os.path.abspath(args.vanilla_nusktb) if args.vanilla_nusktb else ''
+    addon.panels.export_model.export_model(reporter, context, os.path.join(os.path.abspath(args.output), ''),
+                                           armature, vanilla_nusktb,
+                                           'numdlb' not in exclude, 'numshb' not in exclude, 'numshexb' not in exclude,
+                                           'nusktb' not in exclude, 'numatb' not in exclude, 'nuhlpb' not in exclude,
+                                           args.bone_linkage)
+    return {'armature': armature.name, 'output': os.path.abspath(args.output)}
+
+
+def export_farm(addon, context, args, reporter):
+    '''
+    Runs the export jobs from a JSON list like [{"blend": "c00.blend", "armature": "c00", "output": "out/c00"}]
+    in parallel background Blender processes.
+    The optional job keys are "vanilla_nusktb", "bone_linkage", and "exclude".
+    '''
+    export_model = addon.panels.export_model
+    with open(args.jobs) as f:
+        job_dicts = json.load(f)
+
+    jobs = [
+        export_model.ExportJob(os.path.abspath(job['blend']), job['armature'], os.path.abspath(job['output']),
+                               job.get('vanilla_nusktb', ''), job.get('bone_linkage', 'ORDER_AND_VALUES'), job.get('exclude', []))
+        for job in job_dicts
+    ]
+
+    temp_dir = tempfile.mkdtemp(prefix='sub_export_')
+    try:
+        results = export_model.run_export_jobs(jobs, args.workers, temp_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for result in results:
+        if not result.success:
+            reporter.report({'ERROR'}, f'Failed to export {result.job.armature_name} from {result.job.blend_path}: {result.error}')
+
+    exports = [
+        {'blend': r.job.blend_path, 'armature': r.job.armature_name, 'output': r.job.output_dir,
+         'success': r.success, 'seconds': r.seconds, 'error': r.error}
+        for r in results
+    ]
+    return {'exports': exports}
+
+
+def get_keyframe_tolerances(addon, args):
+    if not args.decimate:
+        return None
+    return addon.panels.anim_fcurves.KeyframeTolerances(args.location_tolerance, args.rotation_tolerance,
+                                                        args.scale_tolerance, args.material_tolerance)
+
+
+def import_anim(addon, context, args, reporter):
+    # The animation importer works on the armature selected in the UI.
+    context.scene.sub_anim_armature = find_armature(args.armature)
+    tolerances = get_keyframe_tolerances(addon, args)
+    writer = addon.panels.import_anim.import_model_anim(context, os.path.abspath(args.anim),
+                                                        not args.no_transform, not args.no_material,
+                                                        not args.no_visibility, args.start_frame,
+                                                        not args.no_compress, tolerances)
+    return {'armature': args.armature, 'anim': os.path.abspath(args.anim),
+            'keyframes': writer.key_count, 'uncompressed_keyframes': writer.frame_key_count}
+
+
+def batch_import_anims(addon, context, args, reporter):
+    context.scene.sub_anim_armature = find_armature(args.armature)
+    results = addon.panels.import_anim.batch_import_model_anims(
+        context, os.path.abspath(args.folder),
+        not args.no_transform, not args.no_material, not args.no_visibility, args.start_frame,
+        not args.no_compress, get_keyframe_tolerances(addon, args),
+        args.nla, args.set_frame_range)
+    if len(results) == 0:
+        reporter.report({'WARNING'}, f'No .nuanmb files found in {args.folder}')
+    for name, writer, error in results:
+        if error is not None:
+            reporter.report({'ERROR'}, f'Failed to import {name}: {error}')
+    anims = [
+        {'file': name, 'action': writer.action.name if writer is not None else None,
+         'keyframes': writer.key_count if writer is not None else 0, 'error': error}
+        for name, writer, error in results
+    ]
+    return {'armature': args.armature, 'anims': anims}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='blender -b --python cli.py --', description='Smash Ultimate Blender command line tools')
+    parser.add_argument('--json', help='Also write the JSON result to this file')
+    parser.add_argument('--save', help='Save the .blend file to this path after the command finishes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import-model', help='Import a single model folder')
+    import_parser.add_argument('--folder', required=True)
+    import_parser.add_argument('--name', help='Rename the imported armature')
+    import_parser.add_argument('--all-vertex-groups', action='store_true')
+    import_parser.add_argument('--lazy-textures', action='store_true')
+    import_parser.set_defaults(func=import_model)
+
+    batch_parser = subparsers.add_parser('batch-import-models', help='Import every model folder under a root folder')
+    batch_parser.add_argument('--root', required=True)
+    batch_parser.add_argument('--all-vertex-groups', action='store_true')
+    batch_parser.add_argument('--lazy-textures', action='store_true')
+    batch_parser.set_defaults(func=batch_import_models)
+
+    export_parser = subparsers.add_parser('export-model', help='Export an armature and its meshes to a folder')
+    export_parser.add_argument('--armature', required=True)
+    export_parser.add_argument('--output', required=True)
+    export_parser.add_argument('--vanilla-nusktb', default='')
+    export_parser.add_argument('--bone-linkage', default='ORDER_AND_VALUES', choices=['ORDER_AND_VALUES', 'ORDER_ONLY', 'NO_LINK'])
+    export_parser.add_argument('--exclude', nargs='*', default=[],
+                               choices=['numdlb', 'numshb', 'numshexb', 'nusktb', 'numatb', 'nuhlpb'])
+    export_parser.set_defaults(func=export_model)
+
+    farm_parser = subparsers.add_parser('export-farm', help='Export a JSON list of armatures in parallel worker processes')
+    farm_parser.add_argument('--jobs', required=True)
+    farm_parser.add_argument('--workers', type=int, default=4)
+    farm_parser.set_defaults(func=export_farm)
+
+    anim_parser = subparsers.add_parser('import-anim', help='Import a .nuanmb onto an armature')
+    anim_parser.add_argument('--armature', required=True)
+    anim_parser.add_argument('--anim', required=True)
+    anim_parser.set_defaults(func=import_anim)
+
+    batch_anim_parser = subparsers.add_parser('batch-import-anims', help='Import every .nuanmb in a folder into separate actions')
+    batch_anim_parser.add_argument('--armature', required=True)
+    batch_anim_parser.add_argument('--folder', required=True)
+    batch_anim_parser.add_argument('--nla', action='store_true', help='Add the actions as strips on a new NLA track')
+    batch_anim_parser.add_argument('--set-frame-range', action='store_true')
+    batch_anim_parser.set_defaults(func=batch_import_anims)
+
+    # The animation options are the same for both commands.
+    for parser_with_options in [anim_parser, batch_anim_parser]:
+        parser_with_options.add_argument('--start-frame', type=int, default=1)
+        parser_with_options.add_argument('--no-transform', action='store_true')
+        parser_with_options.add_argument('--no-material', action='store_true')
+        parser_with_options.add_argument('--no-visibility', action='store_true')
+        parser_with_options.add_argument('--no-compress', action='store_true', help='Add a keyframe on every frame')
+        parser_with_options.add_argument('--decimate', action='store_true', help='Remove keyframes that are within the tolerances')
+        parser_with_options.add_argument('--location-tolerance', type=float, default=0.001)
+        parser_with_options.add_argument('--rotation-tolerance', type=float, default=0.1, help='The tolerance in degrees')
+        parser_with_options.add_argument('--scale-tolerance', type=float, default=0.001)
+        parser_with_options.add_argument('--material-tolerance', type=float, default=0.001)
+
+    return parser.parse_args(argv)
+
+
+def run(argv):
+    '''
+    Runs the command and returns the result dict that is output as JSON.
+    '''
+    start = time.time()
+    args = parse_args(argv)
+    reporter = Reporter()
+    result = {'command': args.command, 'success': False, 'timings': {}, 'messages': reporter.messages, 'error': None}
+
+    try:
+        load_start = time.time()
+        addon = load_addon()
+        result['timings']['load_addon'] = time.time() - load_start
+
+        command_start = time.time()
+        result['output'] = args.func(addon, bpy.context, args, reporter)
+        result['timings'][args.command] = time.time() - command_start
+
+        if args.save:
+            save_start = time.time()
+            bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.save))
+            result['timings']['save'] = time.time() - save_start
+
+        result['success'] = not reporter.has_errors()
+    except Exception as e:
+        result['error'] = str(e)
+        result['traceback'] = traceback.format_exc()
+
+    result['timings']['total'] = time.time() - start
+    return result, args.json
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    result, json_path = run(argv)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(result, f, indent=2)
+    print(RESULT_PREFIX + json.dumps(result))
+
+    if not result['success']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1 @@
-from . import master_shader, material_inputs
\ No newline at end of file
+from . import master_shader, material_inputs, material_instances, shader_db
\ No newline at end of file
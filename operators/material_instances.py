@@ -0,0 +1,122 @@
+import bpy
+
+from . import master_shader
+
+# Marks node groups copied from the master shader for a particular shader label.
+SHADER_LABEL_PROPERTY = 'smash_ultimate_shader_label'
+
+# Maps a shader label to the name of its shared node group.
+_shader_label_to_group_name = {}
+
+# Maps a node group's pointer to its (input count, SocketIndex).
+_group_socket_indices = {}
+
+# Groups copied from the master shader have the same inputs, so share their SocketIndex.
+_input_names_to_socket_index = {}
+
+
+def get_shader_node_group(shader_label):
+    '''
+    Returns the node group shared by every material with this shader label.
+    The inputs' values and visibility are stored on each material's group node,
+    so materials only need their own copy of the master shader if they edit the group itself.
+    '''
+    group_name = _shader_label_to_group_name.get(shader_label)
+    group = bpy.data.node_groups.get(group_name) if group_name is not None else None
+    if group is not None and group.get(SHADER_LABEL_PROPERTY) == shader_label:
+        return group
+
+    # The cache is empty after reloading the addon or opening a different file.
+    group = next((g for g in bpy.data.node_groups if g.get(SHADER_LABEL_PROPERTY) == shader_label), None)
+    if group is None:
+        master_node_group = bpy.data.node_groups.get(master_shader.get_master_shader_name())
+        group = master_node_group.copy()
+        group.name = shader_label
+        group[SHADER_LABEL_PROPERTY] = shader_label
+
+    _shader_label_to_group_name[shader_label] = group.name
+    return group
+
+
+class SocketIndex:
+    '''
+    Lookups for the inputs of a node group created by master_shader.create_master_shader.
+    Input names start with the param id like 'BlendState0 Field1 (Source Color)' or 'Texture0 RGB (Col Map Layer 1)'.
+    Parameters with multiple inputs have a field name like 'Field1' or 'RGB' after the param id.
+    '''
+    def __init__(self, names):
+        self.names = names
+        self.name_to_index = {name: i for i, name in enumerate(names)}
+        # Maps a param id to a list of (input index, field name) in input order.
+        self.param_to_fields = {}
+        for i, name in enumerate(names):
+            parts = name.split(' ')
+            self.param_to_fields.setdefault(parts[0], []).append((i, parts[1] if len(parts) > 1 else ''))
+
+    def get_indices(self, param_id):
+        return [i for i, _ in self.param_to_fields.get(param_id, [])]
+
+    def get_fields(self, param_id):
+        return self.param_to_fields.get(param_id, [])
+
+
+def get_socket_index(node_group_node):
+    '''
+    Returns the SocketIndex for the node's group.
+    Accessing the input names through Blender is slow, so the index is only created once for each group.
+    '''
+    key = node_group_node.node_tree.as_pointer()
+    inputs = node_group_node.inputs
+    cached = _group_socket_indices.get(key)
+    # The pointer may be reused by a different group after the original group is deleted.
+    if cached is not None and cached[0] == len(inputs) and cached[1].names[0] == inputs[0].name:
+        return cached[1]
+
+    names = tuple(input.name for input in inputs)
+    socket_index = _input_names_to_socket_index.get(names)
+    if socket_index is None:
+        socket_index = SocketIndex(names)
+        _input_names_to_socket_index[names] = socket_index
+    _group_socket_indices[key] = (len(names), socket_index)
+    return socket_index
+
+
+def get_hidden_inputs(node_group_node):
+    hide = [False] * len(node_group_node.inputs)
+    node_group_node.inputs.foreach_get('hide', hide)
+    return hide
+
+
+def set_visible_inputs(node_group_node, visible_indices):
+    '''
+    Hides every input except visible_indices with a single update instead of setting hide for each socket.
+    '''
+    hide = [True] * len(node_group_node.inputs)
+    for i in visible_indices:
+        hide[i] = False
+    node_group_node.inputs.foreach_set('hide', hide)
+
+
+def update_hidden_inputs(node_group_node, shown_indices, hidden_indices):
+    '''
+    Shows and hides the given inputs with a single update and leaves the other inputs unchanged.
+    '''
+    hide = get_hidden_inputs(node_group_node)
+    for i in shown_indices:
+        hide[i] = False
+    for i in hidden_indices:
+        hide[i] = True
+    node_group_node.inputs.foreach_set('hide', hide)
+
+
+def set_input_value(input, value):
+    '''
+    Only assigns the value if it differs from the current value to avoid unnecessary updates.
+    '''
+    current = input.default_value
+    if isinstance(current, (bool, int, float, str)):
+        if current == value:
+            return
+    elif tuple(current) == tuple(value):
+        return
+    input.default_value = value
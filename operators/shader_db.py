@@ -0,0 +1,157 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from . import shader_snapshot
+
+# SQLite limits the number of ? parameters in a single statement.
+MAX_QUERY_PARAMETERS = 900
+
+
+def get_shader_db_file_path():
+    # This file was generated with duplicates removed to optimize space.
+    # https://github.com/ScanMountGoat/Smush-Material-Research#shader-database
+    this_file_path = Path(__file__)
+    return this_file_path.parent.parent.joinpath('shader_file').joinpath('Nufx.db').resolve()
+
+
+def get_shader_program_name(shader_label):
+    # The database has a single entry for each program, so don't include the render pass tag.
+    return shader_label[:len('SFX_PBS_0000000000000080')]
+
+
+class LruCache:
+    '''
+    A dict that discards the least recently used item once it has more than max_size items.
+    '''
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+
+class ShaderDatabase:
+    '''
+    Cached queries for the shader database.
+    The connection is opened once in read only mode and reused for every query.
+    Results are cached per shader program, so materials that share a shader only query the database once.
+    '''
+    def __init__(self, path, max_cached_programs=1024):
+        self.con = sqlite3.connect(Path(path).as_uri() + '?mode=ro', uri=True, check_same_thread=False)
+        # The connection may be used from worker threads, so only run one query at a time.
+        self.lock = threading.Lock()
+        self.vertex_attributes = LruCache(max_cached_programs)
+        self.material_parameters = LruCache(max_cached_programs)
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+    def get_vertex_attributes(self, shader_label):
+        '''
+        Returns the attribute names like 'map1' or 'colorSet1' required by the shader.
+        Invalid shaders return an empty list.
+        '''
+        name = get_shader_program_name(shader_label)
+        attributes = self.vertex_attributes.get(name)
+        if attributes is None:
+            self.prefetch([name])
+            attributes = self.vertex_attributes.get(name)
+        return attributes
+
+    def get_material_parameters(self, shader_label):
+        '''
+        Returns the param ids like 160 for CustomVector0 used by the shader in ascending order.
+        Invalid shaders return an empty list.
+        '''
+        name = get_shader_program_name(shader_label)
+        parameters = self.material_parameters.get(name)
+        if parameters is None:
+            self.prefetch([name])
+            parameters = self.material_parameters.get(name)
+        return parameters
+
+    def prefetch(self, shader_labels):
+        '''
+        Caches the data for all of the shaders with a single query per table.
+        This is much faster than querying each shader separately for matls with many materials.
+        '''
+        names = {get_shader_program_name(label) for label in shader_labels}
+        names = sorted(name for name in names if name not in self.vertex_attributes or name not in self.material_parameters)
+        for i in range(0, len(names), MAX_QUERY_PARAMETERS):
+            self.query_programs(names[i:i + MAX_QUERY_PARAMETERS])
+
+    def query_programs(self, names):
+        placeholders = ', '.join('?' for _ in names)
+        attributes_sql = f"""
+            SELECT s.Name, v.AttributeName
+            FROM VertexAttribute v
+            INNER JOIN ShaderProgram s ON v.ShaderProgramID = s.ID
+            WHERE s.Name IN ({placeholders})
+            ORDER BY v.ID
+            """
+        parameters_sql = f"""
+            SELECT s.Name, m.ParamId
+            FROM MaterialParameter m
+            INNER JOIN ShaderProgram s ON m.ShaderProgramID = s.ID
+            WHERE s.Name IN ({placeholders})
+            ORDER BY m.ParamId
+            """
+        with self.lock:
+            attribute_rows = self.con.execute(attributes_sql, names).fetchall()
+            parameter_rows = self.con.execute(parameters_sql, names).fetchall()
+
+        # Cache an empty list for invalid shaders to avoid querying them again.
+        attributes = {name: [] for name in names}
+        for name, attribute_name in attribute_rows:
+            attributes[name].append(attribute_name)
+
+        parameters = {name: [] for name in names}
+        for name, param_id in parameter_rows:
+            parameters[name].append(param_id)
+
+        for name in names:
+            self.vertex_attributes.put(name, attributes[name])
+            self.material_parameters.put(name, parameters[name])
+
+
+_shader_database = None
+
+
+def get_shader_database():
+    '''
+    Returns the shared shader database, which is opened on first use.
+    This uses the precompiled snapshot if possible and falls back to querying SQLite.
+    '''
+    global _shader_database
+    if _shader_database is None:
+        db_path = get_shader_db_file_path()
+        try:
+            _shader_database = shader_snapshot.ShaderSnapshot(
+                shader_snapshot.get_shader_snapshot_file_path(), shader_snapshot.hash_database_file(db_path))
+        except (OSError, ValueError) as e:
+            print(f'Failed to open the shader snapshot. Using the SQLite database instead: {e}')
+            _shader_database = ShaderDatabase(db_path)
+    return _shader_database
+
+
+def close_shader_database():
+    global _shader_database
+    if _shader_database is not None:
+        _shader_database.close()
+        _shader_database = None
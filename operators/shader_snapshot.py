@@ -0,0 +1,277 @@
+'''
+A compact snapshot of the shader database that can be read without SQLite.
+
+The snapshot is generated from shader_file/Nufx.db with
+    python operators/shader_snapshot.py build
+and compared against querying the database with
+    python operators/shader_snapshot.py benchmark
+
+This file doesn't use any relative imports or Blender modules, so it can run outside of Blender.
+
+All values are little endian. Sections are aligned to 8 bytes.
+    header: magic, version, program count, attribute count, param count, 16 byte blake2b hash of the database file
+    attribute names: a u8 length followed by UTF-8 bytes for each attribute name
+    param ids: a u32 for each param id in ascending order
+    name hashes: a u64 hash of each shader program name in ascending order
+    attribute bitsets: one bitset of attribute name indices for each program in hash order
+    param bitsets: one bitset of param id indices for each program in hash order
+'''
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+MAGIC = b'NUFXSNAP'
+VERSION = 2
+HEADER = struct.Struct('<8sIIII16s')
+
+
+def get_shader_snapshot_file_path():
+    this_file_path = Path(__file__)
+    return this_file_path.parent.parent.joinpath('shader_file').joinpath('Nufx.bin').resolve()
+
+
+def get_shader_program_name(shader_label):
+    # The database has a single entry for each program, so don't include the render pass tag.
+    return shader_label[:len('SFX_PBS_0000000000000080')]
+
+
+def hash_name(name):
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def hash_database_file(db_path):
+    '''
+    Returns a hash of the database file contents.
+    Edits that don't change the file size still change the hash.
+    '''
+    with open(db_path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+
+def word_count(bit_count):
+    return (bit_count + 63) // 64
+
+
+def pad8(data):
+    data.extend(b'\0' * (-len(data) % 8))
+
+
+def build_snapshot(db_path, snapshot_path):
+    '''
+    Compiles the shader database at db_path into a snapshot file.
+    '''
+    con = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        programs = con.execute('SELECT ID, Name FROM ShaderProgram').fetchall()
+        attribute_rows = con.execute('SELECT ShaderProgramID, AttributeName FROM VertexAttribute ORDER BY ID').fetchall()
+        parameter_rows = con.execute('SELECT ShaderProgramID, ParamId FROM MaterialParameter ORDER BY ID').fetchall()
+    finally:
+        con.close()
+
+    # Use the order of first appearance, so the most common attributes like map1 have the lowest bits.
+    attribute_names = list(dict.fromkeys(name for _, name in attribute_rows))
+    attribute_to_bit = {name: i for i, name in enumerate(attribute_names)}
+    param_ids = sorted({param_id for _, param_id in parameter_rows})
+    param_to_bit = {param_id: i for i, param_id in enumerate(param_ids)}
+
+    attribute_bits = {id: 0 for id, _ in programs}
+    for program_id, name in attribute_rows:
+        attribute_bits[program_id] |= 1 << attribute_to_bit[name]
+
+    param_bits = {id: 0 for id, _ in programs}
+    for program_id, param_id in parameter_rows:
+        param_bits[program_id] |= 1 << param_to_bit[param_id]
+
+    hashed_programs = sorted((hash_name(name), id) for id, name in programs)
+    hashes = [name_hash for name_hash, _ in hashed_programs]
+    if len(set(hashes)) != len(hashes):
+        raise ValueError('Shader program name hashes are not unique')
+
+    data = bytearray(HEADER.pack(MAGIC, VERSION, len(programs), len(attribute_names), len(param_ids), hash_database_file(db_path)))
+
+    for name in attribute_names:
+        encoded = name.encode('utf-8')
+        data.extend(struct.pack('<B', len(encoded)))
+        data.extend(encoded)
+    pad8(data)
+
+    data.extend(struct.pack(f'<{len(param_ids)}I', *param_ids))
+    pad8(data)
+
+    data.extend(struct.pack(f'<{len(hashes)}Q', *hashes))
+
+    attribute_words = word_count(len(attribute_names))
+    param_words = word_count(len(param_ids))
+    for _, id in hashed_programs:
+        data.extend(attribute_bits[id].to_bytes(attribute_words * 8, 'little'))
+    for _, id in hashed_programs:
+        data.extend(param_bits[id].to_bytes(param_words * 8, 'little'))
+
+    with open(snapshot_path, 'wb') as f:
+        f.write(data)
+
+
+class ShaderSnapshot:
+    '''
+    Reads shader data from a memory mapped snapshot file.
+    Opening the file only parses the small header and string table.
+    Lookups are a binary search over the sorted name hashes.
+    '''
+    def __init__(self, path, expected_db_hash=None):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, program_count, attribute_count, param_count, db_hash = HEADER.unpack_from(self.mmap, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{path} is not a supported shader snapshot')
+            # Detect snapshots that weren't regenerated after updating the database.
+            if expected_db_hash is not None and db_hash != expected_db_hash:
+                raise ValueError(f'{path} is out of date with the shader database')
+
+            offset = HEADER.size
+            self.attribute_names = []
+            for _ in range(attribute_count):
+                length = self.mmap[offset]
+                self.attribute_names.append(self.mmap[offset + 1:offset + 1 + length].decode('utf-8'))
+                offset += 1 + length
+            offset += -offset % 8
+
+            self.param_ids = list(struct.unpack_from(f'<{param_count}I', self.mmap, offset))
+            offset += param_count * 4
+            offset += -offset % 8
+
+            self.program_count = program_count
+            self.attribute_words = word_count(attribute_count)
+            self.param_words = word_count(param_count)
+
+            # The snapshot is little endian, which matches all platforms supported by Blender.
+            view = memoryview(self.mmap)
+            self.hashes = view[offset:offset + program_count * 8].cast('Q')
+            offset += program_count * 8
+            self.attribute_bitsets = view[offset:offset + program_count * self.attribute_words * 8].cast('Q')
+            offset += program_count * self.attribute_words * 8
+            self.param_bitsets = view[offset:offset + program_count * self.param_words * 8].cast('Q')
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        # Release the views before closing the map to avoid a BufferError.
+        for name in ['hashes', 'attribute_bitsets', 'param_bitsets']:
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+                setattr(self, name, None)
+        self.mmap.close()
+
+    def find_program_index(self, shader_label):
+        name_hash = hash_name(get_shader_program_name(shader_label))
+        index = bisect_left(self.hashes, name_hash)
+        if index < self.program_count and self.hashes[index] == name_hash:
+            return index
+        return None
+
+    def read_bits(self, bitsets, word_count, index):
+        bits = 0
+        for i in range(word_count):
+            bits |= bitsets[index * word_count + i] << (64 * i)
+        return bits
+
+    def get_vertex_attributes(self, shader_label):
+        '''
+        Returns the attribute names like 'map1' or 'colorSet1' required by the shader.
+        Invalid shaders return an empty list.
+        '''
+        index = self.find_program_index(shader_label)
+        if index is None:
+            return []
+        bits = self.read_bits(self.attribute_bitsets, self.attribute_words, index)
+        return [name for i, name in enumerate(self.attribute_names) if bits & (1 << i)]
+
+    def get_material_parameters(self, shader_label):
+        '''
+        Returns the param ids like 160 for CustomVector0 used by the shader in ascending order.
+        Invalid shaders return an empty list.
+        '''
+        index = self.find_program_index(shader_label)
+        if index is None:
+            return []
+        bits = self.read_bits(self.param_bitsets, self.param_words, index)
+        return [param_id for i, param_id in enumerate(self.param_ids) if bits & (1 << i)]
+
+    def prefetch(self, shader_labels):
+        # Lookups are already fast enough that there is nothing to prefetch.
+        pass
+
+
+def benchmark(db_path, snapshot_path):
+    con = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    names = [row[0] for row in con.execute('SELECT Name FROM ShaderProgram')]
+    con.close()
+
+    sql = """
+        SELECT v.AttributeName
+        FROM VertexAttribute v
+        INNER JOIN ShaderProgram s ON v.ShaderProgramID = s.ID
+        WHERE s.Name = ?
+        """
+
+    # Connecting for every lookup matches the original implementation.
+    start = time.perf_counter()
+    for name in names:
+        with sqlite3.connect(db_path) as con:
+            con.execute(sql, (name,)).fetchall()
+        con.close()
+    sqlite_connect_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    con = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    sqlite_results = {name: [row[0] for row in con.execute(sql, (name,))] for name in names}
+    con.close()
+    sqlite_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = ShaderSnapshot(snapshot_path, hash_database_file(db_path))
+    open_seconds = time.perf_counter() - start
+    snapshot_results = {name: snapshot.get_vertex_attributes(name) for name in names}
+    snapshot_seconds = time.perf_counter() - start
+    snapshot.close()
+
+    mismatches = [name for name in names if sorted(sqlite_results[name]) != sorted(snapshot_results[name])]
+
+    print(f'Looked up vertex attributes for {len(names)} shaders')
+    print(f'SQLite with a connection per lookup: {sqlite_connect_seconds} seconds')
+    print(f'SQLite with a single connection: {sqlite_seconds} seconds')
+    print(f'Snapshot: {snapshot_seconds} seconds ({open_seconds} seconds to open)')
+    print(f'Snapshot size: {os.path.getsize(snapshot_path)} bytes, database size: {os.path.getsize(db_path)} bytes')
+    print(f'{len(mismatches)} mismatched shaders')
+    return len(mismatches) == 0
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ['build', 'benchmark']:
+        print('Usage: python shader_snapshot.py build|benchmark [Nufx.db] [Nufx.bin]')
+        return 1
+
+    shader_folder = Path(__file__).parent.parent.joinpath('shader_file')
+    db_path = sys.argv[2] if len(sys.argv) > 2 else str(shader_folder.joinpath('Nufx.db'))
+    snapshot_path = sys.argv[3] if len(sys.argv) > 3 else str(shader_folder.joinpath('Nufx.bin'))
+
+    if sys.argv[1] == 'build':
+        start = time.perf_counter()
+        build_snapshot(db_path, snapshot_path)
+        print(f'Created {snapshot_path} in {time.perf_counter() - start} seconds')
+        return 0
+
+    return 0 if benchmark(db_path, snapshot_path) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+
+# The values of the Keyframe.interpolation enum for foreach_set.
+INTERPOLATION_MODES = {
+    'CONSTANT': 0,
+    'LINEAR': 1,
+    'BEZIER': 2,
+}
+
+
+def find_constant_runs(values, interpolation):
+    '''
+    Returns the indices of the keys needed to reproduce the values exactly and the interpolation for each key.
+    Only the first and last frame of each run of repeated values are needed.
+    The first key of a run is CONSTANT, so the value holds until the last key of the run.
+    CONSTANT curves only need a key when the value changes.
+    '''
+    count = len(values)
+    if count == 0:
+        return np.arange(0), np.zeros(0, dtype=np.int32)
+
+    changes = np.ones(count, dtype=bool)
+    changes[1:] = values[1:] != values[:-1]
+    run_starts = np.flatnonzero(changes)
+
+    mode = INTERPOLATION_MODES[interpolation]
+    if interpolation == 'CONSTANT':
+        return run_starts, np.full(len(run_starts), mode, dtype=np.int32)
+
+    # A run ends right before the next run starts.
+    run_ends = np.append(run_starts[1:] - 1, count - 1)
+    if len(run_starts) == 1:
+        # The value is the same for every frame, so a single key holds it for the whole animation.
+        return run_starts, np.full(1, mode, dtype=np.int32)
+
+    indices = np.unique(np.concatenate([run_starts, run_ends]))
+    interpolations = np.full(len(indices), mode, dtype=np.int32)
+    # The start of a run with more than one frame holds its value until the end of the run.
+    is_held = np.isin(indices, run_starts[run_ends > run_starts])
+    interpolations[is_held] = INTERPOLATION_MODES['CONSTANT']
+    return indices, interpolations
+
+
+def decimate_linear_keys(frames, values, tolerance):
+    '''
+    Returns the indices of the keys needed for linear interpolation to be within tolerance of every value.
+    This recursively splits at the value furthest from the line between the current keys like the
+    Ramer-Douglas-Peucker algorithm, but it measures the error along the value axis.
+    '''
+    count = len(values)
+    if count == 0:
+        return np.arange(0)
+
+    frames = np.asarray(frames, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if np.ptp(values) <= tolerance:
+        # A single key is within tolerance for every frame.
+        return np.arange(1)
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    segments = [(0, count - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+
+        t = (frames[first + 1:last] - frames[first]) / (frames[last] - frames[first])
+        interpolated = values[first] + t * (values[last] - values[first])
+        errors = np.abs(values[first + 1:last] - interpolated)
+        i = np.argmax(errors)
+        if errors[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+
+    return np.flatnonzero(keep)
+
+
+class KeyframeTolerances:
+    '''
+    The maximum error allowed when removing keys from each kind of F-curve.
+    '''
+    def __init__(self, location, rotation_degrees, scale, material):
+        self.location = location
+        self.rotation_degrees = rotation_degrees
+        self.scale = scale
+        self.material = material
+
+    def rotation_quaternion(self):
+        # Unit quaternions for rotations an angle apart are 2 * sin(angle / 4) apart.
+        # Limiting each of the 4 components to half that distance keeps the rotation within the angle.
+        return math.sin(math.radians(self.rotation_degrees) / 4.0)
+
+
+class ActionKeyframeWriter:
+    '''
+    Creates each F-curve once and fills in all of its keyframes with foreach_set.
+    This is much faster than setting values and calling keyframe_insert for every frame,
+    and it doesn't need to change the scene's current frame.
+    Constant and repeated values can optionally be stored with fewer keys without changing the curve.
+    Curves written with a tolerance only keep the keys needed to stay within the tolerance.
+    '''
+    def __init__(self, action, compress_constant=False):
+        self.action = action
+        self.compress_constant = compress_constant
+        self.fcurve_count = 0
+        self.key_count = 0
+        # The key count without any compression for reporting.
+        self.frame_key_count = 0
+
+    def write(self, data_path, index, frames, values, group_name, interpolation='LINEAR', tolerance=None):
+        '''
+        Adds an F-curve with a keyframe for each of the frames and values.
+        '''
+        frames = np.asarray(frames, dtype=np.float32)
+        values = np.asarray(values, dtype=np.float32)
+        self.frame_key_count += len(frames)
+
+        if tolerance is not None and interpolation == 'LINEAR':
+            indices = decimate_linear_keys(frames, values, tolerance)
+            frames = frames[indices]
+            values = values[indices]
+            interpolations = np.full(len(frames), INTERPOLATION_MODES[interpolation], dtype=np.int32)
+        elif self.compress_constant:
+            # Compare the float32 values that are actually stored in the keyframes.
+            indices, interpolations = find_constant_runs(values, interpolation)
+            frames = frames[indices]
+            values = values[indices]
+        else:
+            interpolations = np.full(len(frames), INTERPOLATION_MODES[interpolation], dtype=np.int32)
+
+        fcurve = self.action.fcurves.new(data_path, index=index, action_group=group_name)
+        points = fcurve.keyframe_points
+        points.add(len(frames))
+
+        co = np.empty(len(frames) * 2, dtype=np.float32)
+        co[0::2] = frames
+        co[1::2] = values
+        points.foreach_set('co', co)
+        points.foreach_set('interpolation', interpolations)
+
+        # Sort the keyframes and calculate the handles.
+        fcurve.update()
+
+        self.fcurve_count += 1
+        self.key_count += len(frames)
+        return fcurve
+
+    def write_components(self, data_path, frames, values, group_name, interpolation='LINEAR', tolerance=None):
+        '''
+        Adds an F-curve for each column of the (frames, components) values.
+        '''
+        values = np.asarray(values, dtype=np.float32)
+        for index in range(values.shape[1]):
+            self.write(data_path, index, frames, values[:, index], group_name, interpolation, tolerance)
@@ -0,0 +1,219 @@
+'''
+Converts transform track values to Blender pose bone channels for all frames at once with numpy.
+
+This file doesn't use any relative imports or Blender modules, so it can run outside of Blender.
+
+Setting bone.matrix to parent.matrix @ reorient(raw_matrix) results in a matrix_basis of
+rest.inverted() @ parent_rest @ reorient(raw_matrix) for bones with 'FULL' scale inheritance,
+so the parent's pose isn't needed.
+Bones that don't inherit scale use Blender's 'NONE' inherit_scale mode,
+which removes the parent pose's scale from the rotation and scale but not the location.
+Those bones also need the scale of the parent's armature space pose matrix.
+The rest matrices are the armature space edit bone matrices.
+Quaternions are in Blender's (w, x, y, z) order unless noted otherwise.
+'''
+import numpy as np
+
+# reorient() swaps the X and Y axes and flips some signs.
+# This is the same as conjugating by a signed permutation matrix.
+REORIENTATION = np.array([
+    [ 0.0, 1.0, 0.0, 0.0],
+    [-1.0, 0.0, 0.0, 0.0],
+    [ 0.0, 0.0,-1.0, 0.0],
+    [ 0.0, 0.0, 0.0,-1.0],
+])
+
+# The same fixed matrix returned by reorient_root().
+ROOT_MATRIX = np.array([
+    [ 0.0, 1.0, 0.0, 0.0],
+    [ 0.0, 0.0,-1.0, 0.0],
+    [-1.0, 0.0, 0.0, 0.0],
+    [ 0.0, 0.0, 0.0, 1.0],
+])
+
+
+def extend_frames(values, frame_count):
+    '''
+    Returns values for frame_count frames.
+    A single frame should be assumed to be a constant animation.
+    The last value also applies to any remaining frames.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.minimum(np.arange(frame_count), len(values) - 1)]
+
+
+def quaternions_to_matrices(quaternions):
+    '''
+    Converts (F,4) quaternions in ssbh (x, y, z, w) order to (F,3,3) rotation matrices.
+    '''
+    q = np.asarray(quaternions, dtype=np.float64)
+    # Matrix.Rotation from the axis and angle ignores the length of the quaternion.
+    lengths = np.linalg.norm(q, axis=1, keepdims=True)
+    q = np.divide(q, lengths, out=np.tile([0.0, 0.0, 0.0, 1.0], (len(q), 1)), where=lengths != 0.0)
+    x, y, z, w = q.T
+
+    matrices = np.empty((len(q), 3, 3))
+    matrices[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    matrices[:, 0, 1] = 2.0 * (x * y - z * w)
+    matrices[:, 0, 2] = 2.0 * (x * z + y * w)
+    matrices[:, 1, 0] = 2.0 * (x * y + z * w)
+    matrices[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    matrices[:, 1, 2] = 2.0 * (y * z - x * w)
+    matrices[:, 2, 0] = 2.0 * (x * z - y * w)
+    matrices[:, 2, 1] = 2.0 * (y * z + x * w)
+    matrices[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return matrices
+
+
+def compose_matrices(translations, rotations, scales):
+    '''
+    Returns the (F,4,4) matrices for translation @ rotation @ scale.
+    '''
+    translations = np.asarray(translations, dtype=np.float64)
+    scales = np.asarray(scales, dtype=np.float64)
+
+    matrices = np.zeros((len(translations), 4, 4))
+    # Multiplying by a diagonal scale matrix on the right scales each column.
+    matrices[:, :3, :3] = quaternions_to_matrices(rotations) * scales[:, np.newaxis, :]
+    matrices[:, :3, 3] = translations
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+
+def matrices_to_quaternions(matrices):
+    '''
+    Converts (F,3,3) rotation matrices to (F,4) quaternions.
+    Each quaternion is calculated from the largest of the trace and diagonal to avoid precision issues.
+    '''
+    m = matrices
+    m00, m11, m22 = m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]
+    trace = m00 + m11 + m22
+    case = np.argmax(np.stack([trace, m00, m11, m22], axis=1), axis=1)
+
+    quaternions = np.empty((len(m), 4))
+    # Only one of these is used for each matrix, so clamp to avoid warnings for the others.
+    for i, diagonal in enumerate([trace, m00 - m11 - m22, m11 - m00 - m22, m22 - m00 - m11]):
+        selected = case == i
+        if not np.any(selected):
+            continue
+        n = m[selected]
+        s = np.sqrt(np.maximum(1.0 + diagonal[selected], 1e-12)) * 2.0
+        if i == 0:
+            q = [s / 4.0, (n[:, 2, 1] - n[:, 1, 2]) / s, (n[:, 0, 2] - n[:, 2, 0]) / s, (n[:, 1, 0] - n[:, 0, 1]) / s]
+        elif i == 1:
+            q = [(n[:, 2, 1] - n[:, 1, 2]) / s, s / 4.0, (n[:, 0, 1] + n[:, 1, 0]) / s, (n[:, 0, 2] + n[:, 2, 0]) / s]
+        elif i == 2:
+            q = [(n[:, 0, 2] - n[:, 2, 0]) / s, (n[:, 0, 1] + n[:, 1, 0]) / s, s / 4.0, (n[:, 1, 2] + n[:, 2, 1]) / s]
+        else:
+            q = [(n[:, 1, 0] - n[:, 0, 1]) / s, (n[:, 0, 2] + n[:, 2, 0]) / s, (n[:, 1, 2] + n[:, 2, 1]) / s, s / 4.0]
+        quaternions[selected] = np.stack(q, axis=1)
+
+    # Prefer a positive w like Blender.
+    quaternions[quaternions[:, 0] < 0.0] *= -1.0
+    return quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True)
+
+
+def decompose_matrices(matrices):
+    '''
+    Returns the (F,3) locations, (F,4) quaternions, and (F,3) scales like Matrix.decompose().
+    '''
+    locations = matrices[:, :3, 3].copy()
+
+    basis = matrices[:, :3, :3]
+    scales = np.linalg.norm(basis, axis=1)
+    rotations = np.divide(basis, scales[:, np.newaxis, :], out=np.zeros_like(basis), where=scales[:, np.newaxis, :] != 0.0)
+
+    # Negative scale flips the handedness, which a quaternion can't represent.
+    # Blender negates the whole rotation matrix and scale in this case.
+    negative = np.linalg.det(rotations) < 0.0
+    rotations[negative] *= -1.0
+    scales[negative] *= -1.0
+
+    # Zero scale doesn't have a rotation.
+    rotations[np.any(scales == 0.0, axis=1)] = np.identity(3)
+
+    return locations, matrices_to_quaternions(rotations), scales
+
+
+def make_quaternions_continuous(quaternions):
+    '''
+    Flips the sign of quaternions as needed so each quaternion is closest to the previous frame.
+    q and -q are the same rotation, but interpolating between them goes the long way around.
+    '''
+    if len(quaternions) < 2:
+        return quaternions
+    dots = np.sum(quaternions[1:] * quaternions[:-1], axis=1)
+    # Flipping a quaternion also flips the comparisons for all of the frames after it.
+    signs = np.cumprod(np.where(dots < 0.0, -1.0, 1.0))
+    quaternions[1:] *= signs[:, np.newaxis]
+    return quaternions
+
+
+def get_matrix_scales(matrices):
+    '''
+    Returns the (F,3) lengths of the X, Y, and Z axes of (F,4,4) matrices without shear.
+    '''
+    return np.linalg.norm(matrices[:, :3, :3], axis=1)
+
+
+def calculate_pose_matrices(translations, rotations, scales, parent_pose):
+    '''
+    Returns the (F,4,4) armature space pose matrices for a bone with a track.
+    This is the parent's pose @ reorient(raw_matrix) or the fixed root matrix for root bones.
+    The parent's pose can have a different number of frames than the track.
+    '''
+    if parent_pose is None:
+        return np.tile(ROOT_MATRIX, (len(translations), 1, 1))
+
+    fixed_matrices = REORIENTATION @ compose_matrices(translations, rotations, scales) @ REORIENTATION.T
+    frame_count = max(len(fixed_matrices), len(parent_pose))
+    return extend_frames(parent_pose, frame_count) @ extend_frames(fixed_matrices, frame_count)
+
+
+def calculate_rest_pose_matrices(rest, parent_rest, parent_pose):
+    '''
+    Returns the (F,4,4) armature space pose matrices for a bone without a track,
+    which stays at its rest transform relative to its parent.
+    '''
+    rest = np.asarray(rest, dtype=np.float64)
+    if parent_pose is None:
+        return rest[np.newaxis]
+    return parent_pose @ (np.linalg.inv(np.asarray(parent_rest, dtype=np.float64)) @ rest)
+
+
+def calculate_pose_channels(translations, rotations, scales, rest, parent_rest, parent_scales=None, parent_pose_scales=None):
+    '''
+    Returns the (F,3) location, (F,4) rotation_quaternion, and (F,3) scale pose channels for a bone.
+    The track values are (F,3) translations, (F,4) rotations in ssbh (x, y, z, w) order, and (F,3) scales.
+    Root bones have no parent_rest and use the same fixed orientation as reorient_root().
+    parent_scales are the parent's track scales to divide out for scale compensation.
+    parent_pose_scales are the scales of the parent's armature space pose matrices
+    for bones with the 'NONE' inherit_scale mode.
+    '''
+    frame_count = len(translations)
+    rest_inverse = np.linalg.inv(np.asarray(rest, dtype=np.float64))
+
+    if parent_rest is None:
+        # The root orientation doesn't depend on the track values.
+        basis = np.broadcast_to(rest_inverse @ ROOT_MATRIX, (frame_count, 4, 4))
+    else:
+        raw_matrices = compose_matrices(translations, rotations, scales)
+        fixed_matrices = REORIENTATION @ raw_matrices @ REORIENTATION.T
+        offset_inverse = rest_inverse @ np.asarray(parent_rest, dtype=np.float64)
+        basis = offset_inverse @ fixed_matrices
+
+        if parent_pose_scales is not None and len(parent_pose_scales) > 0:
+            # Blender uses the parent's pose without scale for the rotation and scale,
+            # so the parent's scale is applied to the basis instead to get the same pose.
+            # The location still uses the parent's full pose and doesn't change.
+            parent_pose_scales = extend_frames(parent_pose_scales, frame_count)
+            basis[:, :3, :3] = offset_inverse[:3, :3] @ (parent_pose_scales[:, :, np.newaxis] * fixed_matrices[:, :3, :3])
+
+    locations, quaternions, pose_scales = decompose_matrices(basis)
+    quaternions = make_quaternions_continuous(quaternions)
+
+    if parent_scales is not None and len(parent_scales) > 0:
+        parent_scales = extend_frames(parent_scales, frame_count)
+        pose_scales = np.divide(pose_scales, parent_scales, out=pose_scales, where=parent_scales != 0.0)
+
+    return locations, quaternions, pose_scales
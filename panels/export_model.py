@@ -1,23 +1,27 @@
 import os
 import time
-from .import_model import get_ssbh_lib_json_exe_path
+from .skel_index import SkeletonIndex
 import bpy
 import os.path
 import numpy as np
 from pathlib import Path
 
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import StringProperty, BoolProperty, EnumProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty
 from bpy.types import Operator, Panel
 import re
 from .. import ssbh_data_py
 import bmesh
 import sys
 import json
+import shutil
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from mathutils import Vector, Matrix
 import math
-from ..operators import material_inputs
+from ..operators import material_inputs, material_instances, shader_db
+from . import nuhlpb
 from itertools import groupby
 
 class ExportModelPanel(Panel):
@@ -37,6 +41,9 @@ class ExportModelPanel(Panel):
         row = layout.row(align=True)
         row.prop(context.scene, 'sub_model_export_armature', icon='ARMATURE_DATA')
 
+        row = layout.row(align=True)
+        row.operator('sub.batch_model_exporter', icon='EXPORT', text='Export Selected Armatures to Folders')
+
         if not context.scene.sub_model_export_armature:
             return
         
@@ -70,16 +77,10 @@ class VanillaNusktbSelector(Operator, ImportHelper):
         context.scene.sub_vanilla_nusktb = self.filepath
         return {'FINISHED'}   
 
-class ModelExporterOperator(Operator, ImportHelper):
-    bl_idname = 'sub.model_exporter'
-    bl_label = 'Export To This Folder'
-
-    filter_glob: StringProperty(
-        default="",
-        options={'HIDDEN'},
-        maxlen=255,  # Max internal buffer length, longer would be clamped. Also blender has this in the example but tbh idk what it does yet
-    )
-
+class ExportFileOptions:
+    '''
+    The export options shared by the single and batch export operators.
+    '''
     include_numdlb: BoolProperty(
         name="Export .NUMDLB",
         description="Export .NUMDLB",
@@ -122,6 +123,28 @@ class ModelExporterOperator(Operator, ImportHelper):
         default='ORDER_AND_VALUES',
     )
 
+    def get_excluded_extensions(self):
+        include_flags = [
+            ('numdlb', self.include_numdlb),
+            ('numshb', self.include_numshb),
+            ('numshexb', self.include_numshexb),
+            ('nusktb', self.include_nusktb),
+            ('numatb', self.include_numatb),
+            ('nuhlpb', self.include_nuhlpb),
+        ]
+        return [extension for extension, include in include_flags if not include]
+
+
+class ModelExporterOperator(Operator, ImportHelper, ExportFileOptions):
+    bl_idname = 'sub.model_exporter'
+    bl_label = 'Export To This Folder'
+
+    filter_glob: StringProperty(
+        default="",
+        options={'HIDDEN'},
+        maxlen=255,  # Max internal buffer length, longer would be clamped. Also blender has this in the example but tbh idk what it does yet
+    )
+
     # Initially set the filename field to be nothing
     def invoke(self, context, _event):
         self.filepath = ""
@@ -129,16 +152,169 @@ class ModelExporterOperator(Operator, ImportHelper):
         return {'RUNNING_MODAL'}
     
     def execute(self, context):
-        export_model(self, context, self.filepath, self.include_numdlb, self.include_numshb, self.include_numshexb,
+        export_model(self, context, self.filepath, context.scene.sub_model_export_armature, context.scene.sub_vanilla_nusktb,
+                     self.include_numdlb, self.include_numshb, self.include_numshexb,
                      self.include_nusktb, self.include_numatb, self.include_nuhlpb, self.linked_nusktb_settings)
         return {'FINISHED'}
 
 
-def export_model(operator, context, filepath, include_numdlb, include_numshb, include_numshexb, include_nusktb, include_numatb, include_nuhlpb, linked_nusktb_settings):
+class BatchModelExporterOperator(Operator, ImportHelper, ExportFileOptions):
+    bl_idname = 'sub.batch_model_exporter'
+    bl_label = 'Export Selected Armatures'
+    bl_description = 'Export each selected armature to its own subfolder using background Blender processes'
+
+    filter_glob: StringProperty(
+        default="",
+        options={'HIDDEN'},
+        maxlen=255,
+    )
+
+    worker_count: IntProperty(
+        name='Worker Processes',
+        description='The number of background Blender processes to export with at the same time',
+        default=4,
+        min=1,
+    )
+
+    # Initially set the filename field to be nothing
+    def invoke(self, context, _event):
+        self.filepath = ""
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        armatures = [obj for obj in context.selected_objects if obj.type == 'ARMATURE']
+        if len(armatures) == 0:
+            self.report({'ERROR'}, 'Select at least one armature to export.')
+            return {'CANCELLED'}
+
+        folder = Path(self.filepath)
+        if folder.is_file():
+            folder = folder.parent
+
+        # Each worker opens a copy of the current file, so unsaved changes are still exported.
+        temp_dir = tempfile.mkdtemp(prefix='sub_export_')
+        try:
+            blend_path = os.path.join(temp_dir, 'export.blend')
+            bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+            jobs = [
+                ExportJob(blend_path, armature.name, str(folder.joinpath(bpy.path.clean_name(armature.name))),
+                          context.scene.sub_vanilla_nusktb, self.linked_nusktb_settings, self.get_excluded_extensions())
+                for armature in armatures
+            ]
+            results = run_export_jobs(jobs, self.worker_count, temp_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        failed = [result for result in results if not result.success]
+        for result in failed:
+            self.report({'ERROR'}, f'Failed to export {result.job.armature_name}: {result.error}')
+        self.report({'INFO'}, f'Exported {len(results) - len(failed)} of {len(results)} armatures')
+        return {'FINISHED'}
+
+
+class ExportJob:
+    '''
+    An armature in a .blend file to export to output_dir with the command line export-model command.
+    '''
+    def __init__(self, blend_path, armature_name, output_dir, vanilla_nusktb='', linked_nusktb_settings='ORDER_AND_VALUES', excluded_extensions=None):
+        self.blend_path = blend_path
+        self.armature_name = armature_name
+        self.output_dir = output_dir
+        self.vanilla_nusktb = vanilla_nusktb
+        self.linked_nusktb_settings = linked_nusktb_settings
+        self.excluded_extensions = excluded_extensions if excluded_extensions is not None else []
+
+
+class ExportJobResult:
+    def __init__(self, job, success, seconds, error=None, output=None):
+        self.job = job
+        self.success = success
+        self.seconds = seconds
+        self.error = error
+        # The JSON result from the command line driver if the worker got far enough to write one.
+        self.output = output
+
+
+def get_cli_path():
+    this_file_path = Path(__file__)
+    return this_file_path.parent.parent.joinpath('cli.py').resolve()
+
+
+def get_export_job_command(job, json_path):
+    # Use factory settings so the workers load this copy of the addon instead of whatever is installed.
+    command = [
+        bpy.app.binary_path, '-b', '--factory-startup', job.blend_path,
+        '--python', str(get_cli_path()), '--',
+        '--json', json_path,
+        'export-model', '--armature', job.armature_name, '--output', job.output_dir,
+        '--bone-linkage', job.linked_nusktb_settings,
+    ]
+    if job.vanilla_nusktb != '':
+        command += ['--vanilla-nusktb', job.vanilla_nusktb]
+    if len(job.excluded_extensions) > 0:
+        command += ['--exclude'] + list(job.excluded_extensions)
+    return command
+
+
+def run_export_job(job, json_path):
+    start = time.time()
+    completed = subprocess.run(get_export_job_command(job, json_path), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    end = time.time()
+
+    output = None
+    if os.path.exists(json_path):
+        with open(json_path) as f:
+            output = json.load(f)
+
+    if output is None:
+        # The worker crashed before writing a result, so include the end of its log instead.
+        log_tail = '\n'.join(completed.stdout.splitlines()[-10:])
+        return ExportJobResult(job, False, end - start, f'Worker exited with code {completed.returncode}: {log_tail}')
+
+    error = output['error']
+    if error is None and not output['success']:
+        error = '; '.join(m['message'] for m in output['messages'] if m['level'] == 'ERROR')
+    return ExportJobResult(job, output['success'] and completed.returncode == 0, end - start, error, output)
+
+
+def run_export_jobs(jobs, worker_count, temp_dir):
+    '''
+    Runs each export job in its own background Blender process with up to worker_count processes at once.
+    Blender only supports running operators on the main thread, so separate processes are the only way to export in parallel.
+    Returns an ExportJobResult for each job in the same order as jobs.
+    '''
+    start = time.time()
+
+    # The threads only wait on the worker processes, so they don't compete with Blender for the GIL.
+    with ThreadPoolExecutor(max_workers=max(1, min(worker_count, len(jobs)))) as executor:
+        futures = [
+            executor.submit(run_export_job, job, os.path.join(temp_dir, f'result{i}.json'))
+            for i, job in enumerate(jobs)
+        ]
+        results = [future.result() for future in futures]
+
+    end = time.time()
+    print_export_job_results(results, end - start)
+    return results
+
+
+def print_export_job_results(results, total_seconds):
+    name_width = max([len('Armature')] + [len(result.job.armature_name) for result in results])
+    print(f'{"Armature":<{name_width}}  {"Seconds":>8}  Status')
+    for result in results:
+        status = 'OK' if result.success else f'Failed: {result.error}'
+        print(f'{result.job.armature_name:<{name_width}}  {result.seconds:>8.3f}  {status}')
+    print(f'Exported {len(results)} armatures in {total_seconds} seconds')
+
+
+def export_model(operator, context, filepath, arma, vanilla_nusktb, include_numdlb, include_numshb, include_numshexb, include_nusktb, include_numatb, include_nuhlpb, linked_nusktb_settings):
     '''
     numdlb and numshb are inherently linked, must export both if exporting one
     if include_numdlb:
         export_numdlb(context, filepath)
+    The armature and vanilla .nusktb path are passed explicitly, so this doesn't depend on the UI's scene properties.
     '''
     # Make sure this is a folder instead of a file.
     # TODO: This doesn't work if the file path isn't actually a file on disk?
@@ -149,10 +325,10 @@ def export_model(operator, context, filepath, include_numdlb, include_numshb, in
     # TODO: This only needs to be made for include_numshb or include_nusktb or include_numshexb.
     # The skel needs to be made first to determine the mesh's bone influences.
     ssbh_skel_data = None
-    if '' == context.scene.sub_vanilla_nusktb or 'NO_LINK' == linked_nusktb_settings:
-        ssbh_skel_data = make_skel_no_link(context)
+    if '' == vanilla_nusktb or 'NO_LINK' == linked_nusktb_settings:
+        ssbh_skel_data = make_skel_no_link(context, arma)
     else:
-        ssbh_skel_data = make_skel(context, linked_nusktb_settings)
+        ssbh_skel_data = make_skel(context, arma, vanilla_nusktb, linked_nusktb_settings)
 
     # The uniform buffer for bone transformations in the skinning shader has a fixed size.
     # Limit exports to 511 bones to prevent rendering issues and crashes in game.
@@ -160,13 +336,16 @@ def export_model(operator, context, filepath, include_numdlb, include_numshb, in
         operator.report({'ERROR'}, f'{len(ssbh_skel_data.bones)} bones exceeds the maximum supported count of 511.')
         return
 
+    skel_index = SkeletonIndex(ssbh_skel_data)
+
     # Prepare the scene for export and find the meshes to export.
-    arma = context.scene.sub_model_export_armature
     export_meshes = [child for child in arma.children if child.type == 'MESH']
     export_meshes = [m for m in export_meshes if len(m.data.vertices) > 0] # Skip Empty Objects
     # TODO: Is it possible to keep the correct order for non imported meshes?
     export_meshes.sort(key=lambda mesh: mesh.get("numshb order", 10000))
 
+    validate_required_attributes(operator, export_meshes)
+
     # Smash Ultimate groups mesh objects with the same name like 'c00BodyShape'.
     # Blender appends numbers like '.001' to prevent duplicates, so we need to remove those before grouping.
     export_mesh_groups = [(k, list(g)) for k,g in groupby(export_meshes, lambda x: re.split(r'.\d\d\d', x.name)[0])]
@@ -183,7 +362,7 @@ def export_model(operator, context, filepath, include_numdlb, include_numshb, in
     try:
         # TODO: The mesh is only needed for include_numshb or include_numshexb.
         # TODO: We wouldn't need the skel here if we don't validate influence names for skinning.
-        ssbh_mesh_data = make_mesh_data(operator, context, export_mesh_groups, ssbh_skel_data)
+        ssbh_mesh_data = make_mesh_data(operator, context, export_mesh_groups, skel_index)
     except RuntimeError as e:
         operator.report({'ERROR'}, str(e))
         return
@@ -232,6 +411,29 @@ def create_and_save_matl(operator, folder, export_meshes):
         operator.report({'ERROR'}, str(e))
         
 
+def validate_required_attributes(operator, export_meshes):
+    '''
+    Warn about meshes missing the UV maps or color sets required by their material's shader.
+    These meshes still export but may not render correctly in game.
+    '''
+    database = shader_db.get_shader_database()
+    for mesh in export_meshes:
+        if len(mesh.material_slots) == 0 or mesh.material_slots[0].material is None:
+            continue
+        material = mesh.material_slots[0].material
+        if material.node_tree is None:
+            continue
+        node = material.node_tree.nodes.get('smash_ultimate_shader', None)
+        if node is None:
+            continue
+
+        shader_label = node.inputs['Shader Label'].default_value
+        attribute_names = {layer.name for layer in mesh.data.uv_layers} | {layer.name for layer in mesh.data.vertex_colors}
+        missing = [name for name in database.get_vertex_attributes(shader_label) if name not in attribute_names]
+        if len(missing) > 0:
+            operator.report({'WARNING'}, f'Mesh {mesh.name} is missing attributes {", ".join(missing)} required by the shader {shader_label}.')
+
+
 def get_material_label_from_mesh(operator, mesh):
     if len(mesh.material_slots) == 0:
         message = f'No material assigned for {mesh.name}. Cannot create model.numdlb. Assign a material or disable .NUMDLB export.'
@@ -254,14 +456,6 @@ def get_material_label_from_mesh(operator, mesh):
 
     return mat_label
 
-def find_bone_index(skel, name):
-    for i, bone in enumerate(skel.bones):
-        if bone.name == name:
-            return i
-
-    return None
-
-
 def default_ssbh_material(material_label):
     # Mario's phong0_sfx_0x9a011063_____VTC___TANGENT___BINORMAL_101 material.
     # This is a good default for fighters since the user can just assign textures in another application.
@@ -328,37 +522,44 @@ def make_matl(operator, materials):
 def create_material_entry_from_node_group(node):
     entry = ssbh_data_py.matl_data.MatlEntryData(node.inputs['Material Name'].default_value, node.inputs['Shader Label'].default_value)
 
-    inputs = [input for input in node.inputs if input.hide == False]
-    skip = ['Material Name', 'Shader Label']
+    # Look up inputs by param id instead of parsing every input name for each parameter.
+    socket_index = material_instances.get_socket_index(node)
+    hidden = material_instances.get_hidden_inputs(node)
+    skip = ['Material', 'Shader']
 
-        # Multiple inputs may correspond to a single parameter.
-        # Avoid exporting the same parameter more than once.
-    exported_params = set()
-    for input in inputs:
-        name = input.name
-        param_name = name.split(' ')[0]
-
-        if name in skip or param_name in exported_params:
+    # Multiple inputs may correspond to a single parameter.
+    # Each parameter is exported once if any of its inputs are visible.
+    for param_name, fields in socket_index.param_to_fields.items():
+        visible_fields = {field: i for i, field in fields if not hidden[i]}
+        if len(visible_fields) == 0 or param_name in skip:
             continue
 
-        elif name == 'BlendState0 Field1 (Source Color)':
+        field_inputs = {field: node.inputs[i] for i, field in fields}
+
+        if param_name == 'BlendState0':
+            if 'Field1' not in visible_fields:
+                continue
             data = ssbh_data_py.matl_data.BlendStateData()                          
-            data.source_color = ssbh_data_py.matl_data.BlendFactor.from_str(node.inputs['BlendState0 Field1 (Source Color)'].default_value)
-            data.destination_color = ssbh_data_py.matl_data.BlendFactor.from_str(node.inputs['BlendState0 Field3 (Destination Color)'].default_value)
-            data.alpha_sample_to_coverage = node.inputs['BlendState0 Field7 (Alpha to Coverage)'].default_value
+            data.source_color = ssbh_data_py.matl_data.BlendFactor.from_str(field_inputs['Field1'].default_value)
+            data.destination_color = ssbh_data_py.matl_data.BlendFactor.from_str(field_inputs['Field3'].default_value)
+            data.alpha_sample_to_coverage = field_inputs['Field7'].default_value
 
             attribute = ssbh_data_py.matl_data.BlendStateParam(ssbh_data_py.matl_data.ParamId.BlendState0, data)
             entry.blend_states.append(attribute)
-        elif name == 'RasterizerState0 Field1 (Polygon Fill)':
+        elif param_name == 'RasterizerState0':
+            if 'Field1' not in visible_fields:
+                continue
             data = ssbh_data_py.matl_data.RasterizerStateData()
-            data.fill_mode = ssbh_data_py.matl_data.FillMode.from_str(node.inputs['RasterizerState0 Field1 (Polygon Fill)'].default_value)
-            data.cull_mode = ssbh_data_py.matl_data.CullMode.from_str(node.inputs['RasterizerState0 Field2 (Cull Mode)'].default_value)
-            data.depth_bias = node.inputs['RasterizerState0 Field3 (Depth Bias)'].default_value
+            data.fill_mode = ssbh_data_py.matl_data.FillMode.from_str(field_inputs['Field1'].default_value)
+            data.cull_mode = ssbh_data_py.matl_data.CullMode.from_str(field_inputs['Field2'].default_value)
+            data.depth_bias = field_inputs['Field3'].default_value
 
             attribute = ssbh_data_py.matl_data.RasterizerStateParam(ssbh_data_py.matl_data.ParamId.RasterizerState0, data)
             entry.rasterizer_states.append(attribute)
-        elif 'Texture' in param_name and 'RGB' in name.split(' ')[1]:
-            texture_node = input.links[0].from_node
+        elif 'Texture' in param_name:
+            if 'RGB' not in visible_fields:
+                continue
+            texture_node = field_inputs['RGB'].links[0].from_node
 
             texture_attribute = ssbh_data_py.matl_data.TextureParam(ssbh_data_py.matl_data.ParamId.from_str(param_name), texture_node.label)
             entry.textures.append(texture_attribute)
@@ -366,12 +567,12 @@ def create_material_entry_from_node_group(node):
             sampler_number = param_name.split('Texture')[1]
             sampler_param_id_text = f'Sampler{sampler_number}'
 
-                # Sampler Data
-                # TODO: Use the default if the sampler is missing.
+            # Sampler Data
+            # TODO: Use the default if the sampler is missing.
             sampler_data = ssbh_data_py.matl_data.SamplerData()
 
             sampler_node = texture_node.inputs[0].links[0].from_node
-                # TODO: These conversions may return None on error.
+            # TODO: These conversions may return None on error.
             sampler_data.wraps = ssbh_data_py.matl_data.WrapMode.from_str(sampler_node.wrap_s)
             sampler_data.wrapt = ssbh_data_py.matl_data.WrapMode.from_str(sampler_node.wrap_t)
             sampler_data.wrapr = ssbh_data_py.matl_data.WrapMode.from_str(sampler_node.wrap_r)
@@ -384,25 +585,27 @@ def create_material_entry_from_node_group(node):
             sampler_attribute = ssbh_data_py.matl_data.SamplerParam(ssbh_data_py.matl_data.ParamId.from_str(sampler_param_id_text), sampler_data)
             entry.samplers.append(sampler_attribute)
         elif 'Sampler' in param_name:
-                # Samplers are not their own input in the master node, rather they are a seperate node entirely
+            # Samplers are not their own input in the master node, rather they are a seperate node entirely
             pass
         elif 'Boolean' in param_name:
+            input = node.inputs[fields[0][0]]
             attribute = ssbh_data_py.matl_data.BooleanParam(ssbh_data_py.matl_data.ParamId.from_str(param_name), input.default_value)
             entry.booleans.append(attribute)
         elif 'Float' in param_name:
+            input = node.inputs[fields[0][0]]
             attribute = ssbh_data_py.matl_data.FloatParam(ssbh_data_py.matl_data.ParamId.from_str(param_name), input.default_value)
             entry.floats.append(attribute)
         elif 'Vector' in param_name:
             if param_name in material_inputs.vec4_param_to_inputs:
                 attribute = ssbh_data_py.matl_data.Vector4Param(ssbh_data_py.matl_data.ParamId.from_str(param_name), [0.0, 0.0, 0.0, 0.0])        
 
-                inputs = [node.inputs.get(name) for _, name, _ in material_inputs.vec4_param_to_inputs[param_name]]
+                inputs = [node.inputs[socket_index.name_to_index[name]] for _, name, _ in material_inputs.vec4_param_to_inputs[param_name]]
                     
-                    # Assume inputs are RGBA, RGB/A, or X/Y/Z/W.
+                # Assume inputs are RGBA, RGB/A, or X/Y/Z/W.
                 if len(inputs) == 1:
                     attribute.data = inputs[0].default_value
                 elif len(inputs) == 2:
-                        # Discard the 4th RGB component and use the explicit alpha instead.
+                    # Discard the 4th RGB component and use the explicit alpha instead.
                     attribute.data[:3] = list(inputs[0].default_value)[:3]
                     attribute.data[3] = inputs[1].default_value
                 elif len(inputs) == 4:
@@ -412,10 +615,7 @@ def create_material_entry_from_node_group(node):
                     attribute.data[3] = inputs[3].default_value
 
                 entry.vectors.append(attribute)
-        else:
-            continue
 
-        exported_params.add(param_name)
     return entry
 
 
@@ -438,7 +638,7 @@ def per_loop_to_per_vertex(per_loop, vertex_indices, dim):
     return per_vertex
 
 
-def make_mesh_data(operator, context, export_mesh_groups, ssbh_skel_data):
+def make_mesh_data(operator, context, export_mesh_groups, skel_index):
     ssbh_mesh_data = ssbh_data_py.mesh_data.MeshData()
 
     for group_name, meshes in export_mesh_groups:
@@ -473,7 +673,7 @@ def make_mesh_data(operator, context, export_mesh_groups, ssbh_skel_data):
 
             try:
                 # Use the original mesh name since the copy will have strings like ".001" appended.
-                ssbh_mesh_object = make_mesh_object(context, mesh_object_copy, ssbh_skel_data, group_name, i, mesh.name)
+                ssbh_mesh_object = make_mesh_object(context, mesh_object_copy, skel_index, group_name, i, mesh.name)
             finally:
                 bpy.data.meshes.remove(mesh_object_copy.data)
 
@@ -482,7 +682,7 @@ def make_mesh_data(operator, context, export_mesh_groups, ssbh_skel_data):
     return ssbh_mesh_data
 
 
-def make_mesh_object(context, mesh, ssbh_skel_data, group_name, i, mesh_name):
+def make_mesh_object(context, mesh, skel_index, group_name, i, mesh_name):
     # ssbh_data_py accepts lists, tuples, or numpy arrays for AttributeData.data.
     # foreach_get and foreach_set provide substantially faster access to property collections in Blender.
     # https://devtalk.blender.org/t/alternative-in-2-80-to-create-meshes-from-python-using-the-tessfaces-api/7445/3
@@ -531,11 +731,10 @@ def make_mesh_object(context, mesh, ssbh_skel_data, group_name, i, mesh_name):
     # Avoid adding unused influences if there are no weights.
     # Some meshes are parented to a bone instead of using vertex skinning.
     # This requires the influence list to be empty to save properly.
-    skel_bone_names = {bone.name for bone in ssbh_skel_data.bones}
     ssbh_mesh_object.bone_influences = []
     for name, weights in group_to_weights.values():
         # TODO: Some objects have influences not in the bone (fighter/miifighter/model/b_deacon_m).
-        if name in skel_bone_names and len(weights) > 0:
+        if name in skel_index.name_to_index and len(weights) > 0:
             ssbh_mesh_object.bone_influences.append(ssbh_data_py.mesh_data.BoneInfluence(name, weights))
 
     if len(ssbh_mesh_object.bone_influences) == 0:
@@ -663,8 +862,7 @@ def unreorient_root(reoriented_matrix) -> Matrix:
 
 
 # TODO: Can these functions share code?
-def make_skel_no_link(context):
-    arma = context.scene.sub_model_export_armature
+def make_skel_no_link(context, arma):
     bpy.context.view_layer.objects.active = arma
     # The object should be selected and visible before entering edit mode.
     arma.select_set(True)
@@ -674,13 +872,14 @@ def make_skel_no_link(context):
     ssbh_skel = ssbh_data_py.skel_data.SkelData()
     edit_bones = arma.data.edit_bones
     edit_bones_list = list(edit_bones)
+    edit_bone_name_to_index = {edit_bone.name: index for index, edit_bone in enumerate(edit_bones_list)}
     for edit_bone in edit_bones_list:
         #if edit_bone.use_deform == False: # Need a way to not export user created control bones
             #continue
         ssbh_bone = None
         if edit_bone.parent is not None:
             unreoriented_matrix = unreorient_matrix(edit_bone.parent.matrix.inverted() @ edit_bone.matrix)
-            ssbh_bone = ssbh_data_py.skel_data.BoneData(edit_bone.name, unreoriented_matrix, edit_bones_list.index(edit_bone.parent))
+            ssbh_bone = ssbh_data_py.skel_data.BoneData(edit_bone.name, unreoriented_matrix, edit_bone_name_to_index[edit_bone.parent.name])
         else:
             ssbh_bone = ssbh_data_py.skel_data.BoneData(edit_bone.name, unreorient_root(edit_bone.matrix), None)
         ssbh_skel.bones.append(ssbh_bone) 
@@ -691,12 +890,11 @@ def make_skel_no_link(context):
     return ssbh_skel
 
 
-def make_skel(context, linked_nusktb_settings):
+def make_skel(context, arma, vanilla_nusktb, linked_nusktb_settings):
     '''
     Wow i wrote this terribly lol, #TODO ReWrite this
     '''
     # TODO: Report error if a valid skel is not selected.
-    arma = context.scene.sub_model_export_armature
     bpy.context.view_layer.objects.active = arma
     # The object should be selected and visible before entering edit mode.
     arma.select_set(True)
@@ -737,9 +935,9 @@ def make_skel(context, linked_nusktb_settings):
     
     ssbh_skel = ssbh_data_py.skel_data.SkelData()
  
-    if '' != context.scene.sub_vanilla_nusktb:
+    if '' != vanilla_nusktb:
         reordered_bones = []
-        vanilla_ssbh_skel = ssbh_data_py.skel_data.read_skel(context.scene.sub_vanilla_nusktb)
+        vanilla_ssbh_skel = ssbh_data_py.skel_data.read_skel(vanilla_nusktb)
         for vanilla_ssbh_bone in vanilla_ssbh_skel.bones:
             linked_bone = output_bones.get(vanilla_ssbh_bone.name)
             if linked_bone is None:
@@ -749,6 +947,9 @@ def make_skel(context, linked_nusktb_settings):
         
         for remaining_bone in output_bones.values():
             reordered_bones.append(remaining_bone)
+
+        # Searching the list for every parent is quadratic, so look up the parent indices by name instead.
+        reordered_bone_name_to_index = {bone.name: index for index, bone in enumerate(reordered_bones)}
         
         ssbh_bone_name_to_bone_dict = {}
         for ssbh_bone in vanilla_ssbh_skel.bones:
@@ -763,11 +964,11 @@ def make_skel(context, linked_nusktb_settings):
                 if vanilla_ssbh_bone is not None:
                     #print('O&V Link Found: index %s, transform= %s' % (index, vanilla_ssbh_bone.transform))
                     index = index + 1
-                    ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, vanilla_ssbh_bone.transform, reordered_bones.index(blender_bone.parent) if blender_bone.parent else None)
+                    ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, vanilla_ssbh_bone.transform, reordered_bone_name_to_index[blender_bone.parent.name] if blender_bone.parent else None)
                 else:
                     if blender_bone.parent:
                         unreoriented_matrix = unreorient_matrix(blender_bone.parent.matrix.inverted() @ blender_bone.matrix)
-                        ssbh_bone = ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, unreoriented_matrix, reordered_bones.index(blender_bone.parent))
+                        ssbh_bone = ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, unreoriented_matrix, reordered_bone_name_to_index[blender_bone.parent.name])
                         #print(f'O&V No Link Found: index {index}, name {blender_bone.name}, rel_mat.transposed()= {rel_mat.transposed()}')
                         index = index + 1
                     else:
@@ -778,10 +979,10 @@ def make_skel(context, linked_nusktb_settings):
                     blender_bone_matrix_as_list = [list(row) for row in blender_bone.matrix.transposed()]
                     blender_bone_parent_matrix_as_list = [list(row) for row in blender_bone.parent.matrix.transposed()]
                     rel_transform = ssbh_data_py.skel_data.calculate_relative_transform(blender_bone_matrix_as_list, blender_bone_parent_matrix_as_list)
-                    ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, rel_transform, reordered_bones.index(blender_bone.parent))
+                    ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, rel_transform, reordered_bone_name_to_index[blender_bone.parent.name])
                     '''
                     unreoriented_matrix = unreorient_matrix(blender_bone.parent.matrix.inverted() @ blender_bone.matrix)
-                    ssbh_bone = ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, unreoriented_matrix, reordered_bones.index(blender_bone.parent))
+                    ssbh_bone = ssbh_bone = ssbh_data_py.skel_data.BoneData(blender_bone.name, unreoriented_matrix, reordered_bone_name_to_index[blender_bone.parent.name])
                     #print('OO: index %s, name %s, rel_mat.transposed()= %s' % (index, blender_bone.name, rel_mat.transposed()))
                     index = index + 1
                 else:
@@ -795,15 +996,6 @@ def make_skel(context, linked_nusktb_settings):
     return ssbh_skel
 
 
-def save_ssbh_json(ssbh_json, dumped_json_path, output_file_path):
-    ssbh_lib_json_exe_path = get_ssbh_lib_json_exe_path()
-    with open(dumped_json_path, 'w') as f:
-        json.dump(ssbh_json, f, indent=2)
-    subprocess.run([ssbh_lib_json_exe_path, dumped_json_path, output_file_path])
-    os.remove(dumped_json_path)
-    return
-
-
 def create_and_save_nuhlpb(folder, armature:bpy.types.Object):
     root_empty = None
     for child in armature.children:
@@ -885,5 +1077,5 @@ def create_and_save_nuhlpb(folder, armature:bpy.types.Object):
         nuhlpb_json['data']['Hlpb']['list1'].append(index)
         nuhlpb_json['data']['Hlpb']['list2'].append(1)
 
-    save_ssbh_json(nuhlpb_json, str(folder.joinpath('model.nuhlpb.tmp.json')), str(folder.joinpath('model.nuhlpb')))
+    nuhlpb.write_nuhlpb(nuhlpb_json, str(folder.joinpath('model.nuhlpb')))
 
@@ -1,12 +1,18 @@
 import math
+import os
 from os import name
 import bpy
 from .. import ssbh_data_py
 from bpy_extras.io_utils import ImportHelper
-from bpy.props import IntProperty, StringProperty, BoolProperty
+from bpy.props import IntProperty, StringProperty, BoolProperty, FloatProperty
 from bpy.types import Operator
 import mathutils
-from .import_model import reorient, reorient_root
+import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import anim_pose
+from .anim_fcurves import ActionKeyframeWriter, KeyframeTolerances
+from .skel_index import get_bone_hierarchy_order
 import re
 
 class ImportAnimPanel(bpy.types.Panel):
@@ -35,6 +41,8 @@ class ImportAnimPanel(bpy.types.Panel):
             row.operator('sub.anim_armature_clear', icon='CANCEL', text='Clear Selected Armature')
             row = layout.row(align=True)
             row.operator('sub.anim_model_importer', icon='FILE', text='Import a Model Animation')
+            row = layout.row(align=True)
+            row.operator('sub.batch_anim_model_importer', icon='FILE_FOLDER', text='Import a Motion Folder')
         elif context.scene.sub_anim_camera is not None:
             row = layout.row(align=True)
             row.label(text=f'Selected camera: {context.scene.sub_anim_camera.name}')
@@ -58,14 +66,10 @@ class AnimCameraClearOperator(Operator):
         context.scene.sub_anim_camera = None
         return {'FINISHED'}
 
-class AnimModelImporterOperator(Operator, ImportHelper):
-    bl_idname = 'sub.anim_model_importer'
-    bl_label = 'Import Anim'
-
-    filter_glob: StringProperty(
-        default='*.nuanmb',
-        options={'HIDDEN'}
-    )
+class ModelAnimImportOptions:
+    '''
+    The options shared by the single file and folder model animation importers.
+    '''
     include_transform_track: BoolProperty(
         name='Include Transform',
         description='Include Transform Track',
@@ -86,10 +90,112 @@ class AnimModelImporterOperator(Operator, ImportHelper):
         description='What frame to start importing the track on',
         default=1,
     )
+    compress_constant_tracks: BoolProperty(
+        name='Compress Constant Tracks',
+        description='Only add keyframes where values change instead of on every frame',
+        default=True,
+    )
+    decimate_keyframes: BoolProperty(
+        name='Reduce Keyframes',
+        description='Remove keyframes that linear interpolation can reproduce within the tolerances',
+        default=False,
+    )
+    location_tolerance: FloatProperty(
+        name='Location Tolerance',
+        description='The maximum location error when reducing keyframes',
+        default=0.001,
+        min=0.0,
+        precision=4,
+    )
+    rotation_tolerance: FloatProperty(
+        name='Rotation Tolerance',
+        description='The maximum rotation error in degrees when reducing keyframes',
+        default=0.1,
+        min=0.0,
+        precision=3,
+    )
+    scale_tolerance: FloatProperty(
+        name='Scale Tolerance',
+        description='The maximum scale error when reducing keyframes',
+        default=0.001,
+        min=0.0,
+        precision=4,
+    )
+    material_tolerance: FloatProperty(
+        name='Material Tolerance',
+        description='The maximum error for material values when reducing keyframes',
+        default=0.001,
+        min=0.0,
+        precision=4,
+    )
+
+    def get_tolerances(self):
+        if not self.decimate_keyframes:
+            return None
+        return KeyframeTolerances(self.location_tolerance, self.rotation_tolerance,
+                                  self.scale_tolerance, self.material_tolerance)
+
+class AnimModelImporterOperator(Operator, ImportHelper, ModelAnimImportOptions):
+    bl_idname = 'sub.anim_model_importer'
+    bl_label = 'Import Anim'
+
+    filter_glob: StringProperty(
+        default='*.nuanmb',
+        options={'HIDDEN'}
+    )
     def execute(self, context):
-        import_model_anim(context, self.filepath,
+        writer = import_model_anim(context, self.filepath,
                         self.include_transform_track, self.include_material_track,
-                        self.include_visibility_track, self.first_blender_frame)
+                        self.include_visibility_track, self.first_blender_frame,
+                        self.compress_constant_tracks, self.get_tolerances())
+        self.report({'INFO'}, f'Imported {writer.key_count} keyframes ({writer.frame_key_count} before reduction)')
+        return {'FINISHED'}
+
+class BatchAnimModelImporterOperator(Operator, ImportHelper, ModelAnimImportOptions):
+    bl_idname = 'sub.batch_anim_model_importer'
+    bl_label = 'Import Anim Folder'
+    bl_description = 'Import every .nuanmb in the selected folder into its own action'
+
+    filter_glob: StringProperty(
+        default='*.nuanmb',
+        options={'HIDDEN'}
+    )
+    use_nla_strips: BoolProperty(
+        name='Add NLA Strips',
+        description='Add the actions one after another as strips on a new NLA track',
+        default=False,
+    )
+    set_frame_range: BoolProperty(
+        name='Set Frame Range',
+        description='Set the scene frame range to fit the imported animations',
+        default=False,
+    )
+
+    # Initially set the filename field to be nothing
+    def invoke(self, context, _event):
+        self.filepath = ""
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        folder = self.filepath if os.path.isdir(self.filepath) else os.path.dirname(self.filepath)
+        results = batch_import_model_anims(context, folder,
+                        self.include_transform_track, self.include_material_track,
+                        self.include_visibility_track, self.first_blender_frame,
+                        self.compress_constant_tracks, self.get_tolerances(),
+                        self.use_nla_strips, self.set_frame_range)
+        if len(results) == 0:
+            self.report({'WARNING'}, f'No .nuanmb files found in {folder}')
+            return {'FINISHED'}
+
+        writers = [writer for _, writer, _ in results if writer is not None]
+        key_count = sum(writer.key_count for writer in writers)
+        frame_key_count = sum(writer.frame_key_count for writer in writers)
+        failed_count = len(results) - len(writers)
+        if failed_count > 0:
+            self.report({'WARNING'}, f'Imported {len(writers)} animations. {failed_count} files could not be read.')
+        else:
+            self.report({'INFO'}, f'Imported {len(writers)} animations with {key_count} keyframes ({frame_key_count} before reduction)')
         return {'FINISHED'}
 
 class AnimCameraImporterOperator(Operator, ImportHelper):
@@ -113,14 +219,40 @@ class AnimCameraImporterOperator(Operator, ImportHelper):
 def poll_cameras(self, obj):
     return obj.type == 'CAMERA'
 
+class ArmatureRestData:
+    '''
+    The bone order and rest matrices for an armature.
+    These don't change between animations, so they can be shared when importing multiple files.
+    '''
+    def __init__(self, armature):
+        bones = armature.pose.bones
+        self.reordered = [bones[name] for name in get_bone_hierarchy_order(armature)]
+        self.bone_name_to_edit_bone_matrix = get_rest_matrices(armature)
+
+
+def prepare_anim_armature(context):
+    armature = context.scene.sub_anim_armature
+    if context.object is not None and context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT', toggle=False) # whatever object is currently selected, exit whatever mode its in
+    context.view_layer.objects.active = armature
+    if armature.animation_data is None:
+        armature.animation_data_create()
+    return armature
+
+
 def import_model_anim(context, filepath,
                     include_transform_track, include_material_track,
-                    include_visibility_track, first_blender_frame):
+                    include_visibility_track, first_blender_frame,
+                    compress_constant_tracks=True, tolerances=None):
+    '''
+    Computes the values for every frame up front and writes them directly to the action's F-curves.
+    This never changes the current frame, so Blender doesn't need to evaluate the scene for each frame.
+    Keyframes are only reduced based on error if tolerances is not None.
+    Returns the ActionKeyframeWriter with the keyframe counts.
+    '''
+    start = time.time()
+
     ssbh_anim_data = ssbh_data_py.anim_data.read_anim(filepath)
-    name_group_dict = {group.group_type.name : group for group in ssbh_anim_data.groups}
-    transform_group = name_group_dict.get('Transform', None)
-    visibility_group = name_group_dict.get('Visibility', None)
-    material_group = name_group_dict.get('Material', None)
 
     # Find max frame count
     frame_count = ssbh_anim_data.final_frame_index + 1
@@ -128,43 +260,155 @@ def import_model_anim(context, filepath,
     scene = context.scene
     scene.frame_start = first_blender_frame
     scene.frame_end = scene.frame_start + frame_count - 1
-    scene.frame_set(scene.frame_start)
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False) # whatever object is currently selected, exit whatever mode its in
-    context.view_layer.objects.active = context.scene.sub_anim_armature
-    bpy.ops.object.mode_set(mode='EDIT', toggle=False) 
-    bone_name_to_edit_bone_matrix = {bone.name:bone.matrix.copy() for bone in context.scene.sub_anim_armature.data.edit_bones}
-    #print(bone_name_to_edit_bone_matrix) # DEBUG, remove for release
-    bpy.ops.object.mode_set(mode='POSE', toggle=False) # put our armature in pose mode
+    armature = prepare_anim_armature(context)
     
     from pathlib import Path
-    action_name = context.scene.sub_anim_armature.name + ' ' + Path(filepath).name
-    if context.scene.sub_anim_armature.animation_data is None:
-        context.scene.sub_anim_armature.animation_data_create()
+    action_name = armature.name + ' ' + Path(filepath).name
     action = bpy.data.actions.new(action_name)
-    context.scene.sub_anim_armature.animation_data.action = action
+    armature.animation_data.action = action
+
+    writer = ActionKeyframeWriter(action, compress_constant=compress_constant_tracks)
+    write_model_anim(context, writer, ssbh_anim_data, ArmatureRestData(armature),
+                     include_transform_track, include_material_track, include_visibility_track,
+                     first_blender_frame, tolerances)
+
+    scene.frame_set(scene.frame_start) # Show the first frame for convenience
+
+    end = time.time()
+    print(f'Imported {Path(filepath).name} with {writer.key_count} keyframes ({writer.frame_key_count} before reduction) in {writer.fcurve_count} F-curves in {end - start} seconds')
+    return writer
+
+
+def write_model_anim(context, writer, ssbh_anim_data, rest_data,
+                     include_transform_track, include_material_track, include_visibility_track,
+                     first_blender_frame, tolerances=None):
+    '''
+    Sets up the drivers for the animation and writes its tracks to the writer's action.
+    This doesn't assign the action to the armature.
+    '''
+    name_group_dict = {group.group_type.name : group for group in ssbh_anim_data.groups}
+    transform_group = name_group_dict.get('Transform', None)
+    visibility_group = name_group_dict.get('Visibility', None)
+    material_group = name_group_dict.get('Material', None)
 
     if include_transform_track and transform_group is not None:
         bones = context.scene.sub_anim_armature.pose.bones
-        bone_to_node = {b:n for n in transform_group.nodes for b in bones if b.name == n.name}
+        bone_to_node = {bones[n.name]:n for n in transform_group.nodes if n.name in bones}
         setup_bone_scale_drivers(bone_to_node.keys()) # Only want to setup drivers for the bones that have an entry in the anim
+        write_armature_transform_tracks(writer, bone_to_node, rest_data.reordered, rest_data.bone_name_to_edit_bone_matrix,
+                                        first_blender_frame, tolerances)
     
     if include_visibility_track and visibility_group is not None:
         setup_visibility_drivers(context, visibility_group)
+        write_visibility_tracks(writer, visibility_group, first_blender_frame)
 
     if include_material_track and material_group is not None:
         setup_material_drivers(context, material_group)
+        write_material_tracks(writer, material_group, first_blender_frame, tolerances)
+
+
+def read_anims(paths):
+    '''
+    The ssbh_data_py readers are native code, so decode all the files in parallel.
+    Blender data should only be modified from the main thread, so the actions are created afterwards.
+    Files that fail to read are returned as the exception instead.
+    '''
+    def read(path):
+        try:
+            return ssbh_data_py.anim_data.read_anim(path)
+        except Exception as e:
+            return e
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(read, paths))
+    end = time.time()
+    print(f'Read {len(paths)} animations in {end - start} seconds')
+    return results
+
+
+def batch_import_model_anims(context, folder,
+                             include_transform_track, include_material_track,
+                             include_visibility_track, first_blender_frame,
+                             compress_constant_tracks=True, tolerances=None,
+                             use_nla_strips=False, set_frame_range=False):
+    '''
+    Imports every .nuanmb in the folder into its own action named after the file.
+    The rest data is calculated once for the armature and shared by every animation.
+    The armature's current action is kept unless it doesn't have one.
+    If use_nla_strips is True, the actions are added one after another as strips on a new NLA track.
+    Returns a list of (file name, ActionKeyframeWriter or None, error or None) for each file.
+    '''
+    start = time.time()
+
+    paths = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith('.nuanmb'))
+    if len(paths) == 0:
+        return []
+
+    anims = read_anims(paths)
+
+    scene = context.scene
+    armature = prepare_anim_armature(context)
+    rest_data = ArmatureRestData(armature)
+
+    nla_track = None
+    if use_nla_strips:
+        nla_track = armature.animation_data.nla_tracks.new()
+        nla_track.name = os.path.basename(os.path.normpath(folder))
+    strip_start = first_blender_frame
+
+    results = []
+    last_frame = first_blender_frame
+    window_manager = context.window_manager
+    window_manager.progress_begin(0, len(paths))
+    try:
+        for i, (path, ssbh_anim_data) in enumerate(zip(paths, anims)):
+            name = os.path.basename(path)
+            if isinstance(ssbh_anim_data, Exception):
+                print(f'Failed to read {name}: {ssbh_anim_data}')
+                results.append((name, None, str(ssbh_anim_data)))
+                continue
+
+            action = bpy.data.actions.new(armature.name + ' ' + name)
+            # Keep actions that aren't assigned to anything when saving.
+            action.use_fake_user = True
+            writer = ActionKeyframeWriter(action, compress_constant=compress_constant_tracks)
+            write_model_anim(context, writer, ssbh_anim_data, rest_data,
+                             include_transform_track, include_material_track, include_visibility_track,
+                             first_blender_frame, tolerances)
+
+            frame_count = ssbh_anim_data.final_frame_index + 1
+            if nla_track is not None:
+                strip = nla_track.strips.new(action.name, int(strip_start), action)
+                # Compressed actions can have their last keyframe before the end of the animation.
+                # Strips need at least one frame between the start and end.
+                strip.action_frame_start = first_blender_frame
+                strip.action_frame_end = first_blender_frame + max(frame_count - 1, 1)
+                strip_start = strip.frame_end + 1
+                last_frame = max(last_frame, strip.frame_end)
+            else:
+                last_frame = max(last_frame, first_blender_frame + frame_count - 1)
+                if armature.animation_data.action is None:
+                    armature.animation_data.action = action
+
+            results.append((name, writer, None))
+            window_manager.progress_update(i + 1)
+    finally:
+        window_manager.progress_end()
+
+    if set_frame_range:
+        scene.frame_start = first_blender_frame
+        scene.frame_end = int(last_frame)
+        scene.frame_set(scene.frame_start)
+    else:
+        # Update the pose for the current frame.
+        scene.frame_set(scene.frame_current)
+
+    end = time.time()
+    key_count = sum(writer.key_count for _, writer, _ in results if writer is not None)
+    print(f'Imported {len(results)} animations with {key_count} keyframes in {end - start} seconds')
+    return results
 
-    for index, frame in enumerate(range(scene.frame_start, scene.frame_end + 1)): # +1 because range() excludes the final value
-        scene.frame_set(frame)
-        if include_transform_track and transform_group is not None:
-            do_armature_transform_stuff(context, transform_group, index, frame, bone_to_node, bone_name_to_edit_bone_matrix)
-        if include_material_track and material_group is not None:
-            do_material_stuff(context, material_group, index, frame)
-        if include_visibility_track and visibility_group is not None:
-            do_visibility_stuff(context, visibility_group, index, frame)
-    
-    scene.frame_set(scene.frame_start) # Return to the first frame for convenience
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False) # Done with our object, return to pose mode
 
 def setup_bone_scale_drivers(pose_bones):
     for pose_bone in pose_bones:
@@ -175,6 +419,8 @@ def setup_bone_scale_drivers(pose_bones):
         pose_bone['inherit_scale'] = 1 # The custom properties exist on the pose_bone, not the bone...
         pose_bone['compensate_scale'] = 1
         driver_handle = pose_bone.bone.driver_add('inherit_scale') # ... but drivers belong on the bone, not the pose_bone
+        if len(driver_handle.driver.variables) > 0:
+            continue # driver_add returns the existing driver, which was already set up by a previous animation
         inheritscale_var = driver_handle.driver.variables.new()
         inheritscale_var.name = "inherit_scale"
         isv = inheritscale_var # shorthand for this var
@@ -185,92 +431,85 @@ def setup_bone_scale_drivers(pose_bones):
         driver_handle.driver.expression = f'0 if {isv.name} == 1 else 3' # 0 is 'FULL' and 3 is 'NONE'
 
 
-def do_armature_transform_stuff(context, transform_group, index, frame, bone_to_node, bone_name_to_edit_bone_matrix):
-    bones = context.scene.sub_anim_armature.pose.bones
-    # Get a list of bones in 'heirarchal' order
-    # TODO: make own function
-    def heirarchy_order(bone, reordered):
-        if bone not in reordered:
-            reordered.append(bone)
-        for child in bone.children:
-            heirarchy_order(child, reordered)
-    reordered = []
-    heirarchy_order(bones[0], reordered)
+def get_rest_matrices(armature):
+    # Bone.matrix_local is the same armature space matrix as the edit bone, so this doesn't need to enter edit mode.
+    return {bone.name: np.array(bone.matrix_local, dtype=np.float64) for bone in armature.data.bones}
 
-    for bone in reordered:
-        node = bone_to_node.get(bone, None)
-        if node is None: # Not all bones will have a transform node. For example, helper bones never have transforms in the anim.
-            #print(f'Skipping bone "{bone.name}", no associated node')
-            continue   
-        try:
-            node.tracks[0].values[index]
-        except IndexError: # Not all bones will have a value at every frame. Many bones only have one frame.
-            continue
 
-        from mathutils import Matrix, Quaternion
-        t = translation = node.tracks[0].values[index].translation
-        r = rotation = node.tracks[0].values[index].rotation
-        s = scale = node.tracks[0].values[index].scale
-        compensate_scale = node.tracks[0].scale_options.compensate_scale
-        inherit_scale = node.tracks[0].scale_options.inherit_scale
-        tm = translation_matrix = Matrix.Translation(t)
-        qr = quaternion_rotation = Quaternion([r[3], r[0], r[1], r[2]])
-        rm = rotation_matrix = Matrix.Rotation(qr.angle, 4, qr.axis)
-        # Blender doesn't have this built in for some reason.
-        scale_matrix = Matrix.Diagonal((s[0], s[1], s[2], 1.0))
-
-        raw_matrix = mathutils.Matrix(tm @ rm @ scale_matrix)   
-        if bone.parent is not None:
-            fixed_matrix = reorient(raw_matrix, transpose=False)
-            bone.matrix = bone.parent.matrix @ fixed_matrix
-
-            if compensate_scale:
-                # Scale compensation "compensates" the effect of the immediate parent's scale.
-                # We don't want the compensation to accumulate along a bone chain. 
-                # HACK: Use the transform itself since we may overwrite a scale value.
-                # This assumes the parent is in the animation.
-                # TODO(SMG): Investigate where the parent scale value comes from.
-                # TODO(SMG): Why does setting scale directly work here but not in Cross Mod?
-                parent_node = bone_to_node.get(bone.parent, None)
-                if parent_node is not None:
-                    try:
-                        parent_scale = parent_node.tracks[0].values[index].scale
-                        bone.scale = (bone.scale[0] / parent_scale[0], bone.scale[1] / parent_scale[1], bone.scale[2] / parent_scale[2])
-                    except IndexError:
-                        # TODO: A single frame in ssbh_data_py should be assumed to be a constant animation.
-                        # The single element value applies to all frames.
-                        # This matches the convention used for Smash Ultimate.
-                        pass
-        else:
-            fixed_matrix = reorient_root(raw_matrix, transpose=False)
-            bone.matrix = fixed_matrix
+def get_transform_arrays(track):
+    '''
+    Returns the (F,3) translations, (F,4) rotations, and (F,3) scales for the track values.
+    '''
+    values = track.values
+    translations = np.array([value.translation for value in values], dtype=np.float64)
+    rotations = np.array([value.rotation for value in values], dtype=np.float64)
+    scales = np.array([value.scale for value in values], dtype=np.float64)
+    return translations, rotations, scales
 
-        keyframe_insert_bone_locrotscale(context.scene.sub_anim_armature, bone.name, frame, 'Transform')
 
-        bone['compensate_scale'] = compensate_scale
-        bone['inherit_scale'] = inherit_scale
-        bone.keyframe_insert(
-            data_path=f'["compensate_scale"]',
-            frame=frame,
-            group='Transform',
-            options={'INSERTKEY_NEEDED'},
-        )
-        bone.keyframe_insert(
-            data_path=f'["inherit_scale"]',
-            frame=frame,
-            group='Transform',
-            options={'INSERTKEY_NEEDED'},
-        )
+def write_armature_transform_tracks(writer, bone_to_node, reordered, bone_name_to_edit_bone_matrix, first_blender_frame, tolerances=None):
+    start = time.time()
 
+    location_tolerance = tolerances.location if tolerances is not None else None
+    rotation_tolerance = tolerances.rotation_quaternion() if tolerances is not None else None
+    scale_tolerance = tolerances.scale if tolerances is not None else None
+
+    # Bones that don't inherit scale depend on the scale of the parent's pose.
+    # Only calculate the pose of every bone when the animation has these bones.
+    track_poses = any(len(node.tracks) > 0 and not node.tracks[0].scale_options.inherit_scale for node in bone_to_node.values())
+    bone_to_pose = {}
+
+    for bone in reordered:
+        rest = bone_name_to_edit_bone_matrix[bone.name]
+        parent_rest = bone_name_to_edit_bone_matrix[bone.parent.name] if bone.parent is not None else None
+        parent_pose = bone_to_pose.get(bone.parent) if bone.parent is not None else None
+
+        node = bone_to_node.get(bone, None)
+        track = node.tracks[0] if node is not None else None
+        if track is None or len(track.values) == 0: # Not all bones will have a transform node. For example, helper bones never have transforms in the anim.
+            if track_poses:
+                bone_to_pose[bone] = anim_pose.calculate_rest_pose_matrices(rest, parent_rest, parent_pose)
+            continue
+
+        translations, rotations, scales = get_transform_arrays(track)
+        if track_poses:
+            bone_to_pose[bone] = anim_pose.calculate_pose_matrices(translations, rotations, scales, parent_pose)
+
+        parent_scales = None
+        if track.scale_options.compensate_scale and bone.parent is not None:
+            # Scale compensation "compensates" the effect of the immediate parent's scale.
+            # We don't want the compensation to accumulate along a bone chain. 
+            # HACK: Use the transform itself since we may overwrite a scale value.
+            # This assumes the parent is in the animation.
+            # TODO(SMG): Investigate where the parent scale value comes from.
+            parent_node = bone_to_node.get(bone.parent, None)
+            if parent_node is not None:
+                parent_scales = get_transform_arrays(parent_node.tracks[0])[2]
+
+        parent_pose_scales = None
+        if not track.scale_options.inherit_scale and parent_pose is not None:
+            # setup_bone_scale_drivers uses the 'NONE' inherit_scale mode for these bones.
+            parent_pose_scales = anim_pose.get_matrix_scales(parent_pose)
+
+        locations, quaternions, pose_scales = anim_pose.calculate_pose_channels(
+            translations, rotations, scales, rest, parent_rest, parent_scales, parent_pose_scales)
+
+        # Not all bones will have a value at every frame. Many bones only have one frame.
+        frames = first_blender_frame + np.arange(len(track.values))
+        bone_path = f'pose.bones["{bone.name}"]'
+        writer.write_components(f'{bone_path}.location', frames, locations, 'Transform', tolerance=location_tolerance)
+        writer.write_components(f'{bone_path}.rotation_quaternion', frames, quaternions, 'Transform', tolerance=rotation_tolerance)
+        writer.write_components(f'{bone_path}.scale', frames, pose_scales, 'Transform', tolerance=scale_tolerance)
+
+        # The scale options are the same for every frame.
+        bone['compensate_scale'] = track.scale_options.compensate_scale
+        bone['inherit_scale'] = track.scale_options.inherit_scale
+        for name in ['compensate_scale', 'inherit_scale']:
+            writer.write(f'{bone_path}["{name}"]', 0, [first_blender_frame], [bone[name]], 'Transform', 'CONSTANT')
+
+    end = time.time()
+    print(f'Calculated and wrote bone transforms in {end - start} seconds')
 
-def keyframe_insert_bone_locrotscale(armature, bone_name, frame, group_name):
-    for parameter in ['location', 'rotation_quaternion', 'scale']:
-        armature.keyframe_insert(
-            data_path=f'pose.bones["{bone_name}"].{parameter}',
-            frame=frame,
-            group=group_name,
-            options={'INSERTKEY_NEEDED'},
-        )
 
 def keyframe_insert_camera_locrotscale(camera, frame):
     for parameter in ['location', 'rotation_quaternion', 'scale']:
@@ -283,6 +522,8 @@ def keyframe_insert_camera_locrotscale(camera, frame):
 
 def node_input_driver_add(input, data_path):
     driver_handle = input.driver_add('default_value')
+    if len(driver_handle.driver.variables) > 0:
+        return
     var = driver_handle.driver.variables.new()
     var.name = "var"
     target = var.targets[0]
@@ -293,6 +534,8 @@ def node_input_driver_add(input, data_path):
 def sampler_uv_transform_driver_add(sampler_node, row, var_name, material, target, target_data_path, expression):
     input = sampler_node.inputs.get('UV Transform')
     driver_handle = input.driver_add('default_value', row)
+    if len(driver_handle.driver.variables) > 0:
+        return
     var = driver_handle.driver.variables.new()
     var.name = var_name
     driver_target = var.targets[0]
@@ -344,20 +587,30 @@ def setup_material_drivers(context, material_group):
                     sampler_uv_transform_driver_add(sampler_1_node, 1, "var", material, w, 'default_value', "0 - var")
 
 
-def do_material_stuff(context, material_group, index, frame):
+def get_material_track_values(track):
+    '''
+    Returns the track's values as a (frames, components) array and the interpolation for its F-curves.
+    '''
+    values = track.values
+    if isinstance(values[0], ssbh_data_py.anim_data.UvTransform):
+        return [uvtransform_to_list(value) for value in values], 'LINEAR'
+    elif isinstance(values[0], bool):
+        return [[float(value)] for value in values], 'CONSTANT'
+    elif isinstance(values[0], (int, float)):
+        return [[value] for value in values], 'LINEAR'
+    else:
+        return [list(value) for value in values], 'LINEAR'
+
+
+def write_material_tracks(writer, material_group, first_blender_frame, tolerances=None):
+    material_tolerance = tolerances.material if tolerances is not None else None
     for node in material_group.nodes:
         for track in node.tracks:
-            try:
-                track.values[index]
-            except IndexError:
+            if len(track.values) == 0:
                 continue
-            value = track.values[index]
-            arma = context.scene.sub_anim_armature
-            if isinstance(value, ssbh_data_py.anim_data.UvTransform):
-                arma[f'{node.name}:{track.name}'] = uvtransform_to_list(value)
-            else:
-                arma[f'{node.name}:{track.name}'] = value
-            arma.keyframe_insert(data_path=f'["{node.name}:{track.name}"]', frame=frame, group='Material', options={'INSERTKEY_NEEDED'})
+            values, interpolation = get_material_track_values(track)
+            frames = [first_blender_frame + index for index in range(len(values))]
+            writer.write_components(f'["{node.name}:{track.name}"]', frames, values, 'Material', interpolation, material_tolerance)
 
 
 def setup_visibility_drivers(context, visibility_group):
@@ -374,6 +627,8 @@ def setup_visibility_drivers(context, visibility_group):
             if true_mesh_name == node.name:
                 for property in ['hide_viewport', 'hide_render']:
                     driver_handle = mesh.driver_add(property)
+                    if len(driver_handle.driver.variables) > 0:
+                        continue
                     var = driver_handle.driver.variables.new()
                     var.name = "var"
                     target = var.targets[0]
@@ -381,17 +636,14 @@ def setup_visibility_drivers(context, visibility_group):
                     target.data_path = f'["{true_mesh_name}"]'
                     driver_handle.driver.expression = f'1 - {var.name}'
 
-def do_visibility_stuff(context, visibility_group, index, frame):
+def write_visibility_tracks(writer, visibility_group, first_blender_frame):
     for node in visibility_group.nodes:
-        try:
-            node.tracks[0].values[index]
-        except IndexError: # Not every vis track entry will have values on every frame. Many only have the first frame.
+        # Not every vis track entry will have values on every frame. Many only have the first frame.
+        values = node.tracks[0].values
+        if len(values) == 0:
             continue
-        value = node.tracks[0].values[index]
-
-        arma = context.scene.sub_anim_armature
-        arma[f'{node.name}'] = value
-        arma.keyframe_insert(data_path=f'["{node.name}"]', frame=frame, group='Visibility', options={'INSERTKEY_NEEDED'})
+        frames = [first_blender_frame + index for index in range(len(values))]
+        writer.write(f'["{node.name}"]', 0, frames, [float(value) for value in values], 'Visibility', 'CONSTANT')
 
 def import_camera_anim(context, filepath, first_blender_frame):
     camera = context.scene.sub_anim_camera
@@ -1,4 +1,3 @@
-import json
 import os
 import os.path
 from tokenize import String
@@ -15,9 +14,11 @@ from bpy.props import StringProperty, BoolProperty
 from bpy_extras.io_utils import ImportHelper
 from bpy_extras import image_utils
 
-from ..operators import master_shader, material_inputs
+from ..operators import master_shader, material_inputs, material_instances, shader_db
+from .skel_index import SkeletonIndex
+from . import nuhlpb, texture_cache
 
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
 class ImportModelPanel(bpy.types.Panel):
     bl_space_type = 'VIEW_3D'
@@ -48,12 +49,16 @@ class ImportModelPanel(bpy.types.Panel):
             row.label(text='Please select a folder...')
             row = layout.row(align=True)
             row.operator('sub.ssbh_model_folder_selector', icon='ZOOM_ALL', text='Browse for the model folder')
+            row = layout.row(align=True)
+            row.operator('sub.batch_model_importer', icon='IMPORT', text='Batch Import Model Folders')
             return
         
         row = layout.row(align=True)
         row.label(text='Selected Folder: "' + context.scene.sub_model_folder_path +'"')
         row = layout.row(align=True)
         row.operator('sub.ssbh_model_folder_selector', icon='ZOOM_ALL', text='Browse for a different model folder')
+        row = layout.row(align=True)
+        row.operator('sub.batch_model_importer', icon='IMPORT', text='Batch Import Model Folders')
 
         all_requirements_met = True
         min_requirements_met = True
@@ -105,12 +110,21 @@ class ImportModelPanel(bpy.types.Panel):
             row.alert = True
             row.label(text='Needs .NUMSHB and .NUSKTB at a minimum to import!', icon='ERROR')
             return
-        elif not all_requirements_met:
+
+        row = layout.row(align=True)
+        row.prop(context.scene, 'sub_model_import_all_vertex_groups')
+        row = layout.row(align=True)
+        row.prop(context.scene, 'sub_model_import_lazy_textures')
+
+        if not all_requirements_met:
             row = layout.row(align=True)
             row.operator('sub.model_importer', icon='IMPORT', text='Limited Model Import')
         else:
             row = layout.row(align=True)
             row.operator('sub.model_importer', icon='IMPORT', text='Import Model')
+
+        row = layout.row(align=True)
+        row.operator('sub.load_lazy_textures', icon='TEXTURE', text='Load Lazy Textures')
         
 
 class ModelFolderSelector(bpy.types.Operator, ImportHelper):
@@ -137,29 +151,15 @@ class ModelFolderSelector(bpy.types.Operator, ImportHelper):
         return {'RUNNING_MODAL'}
 
     def execute(self, context):
-        context.scene.sub_model_numshb_file_name = '' 
-        context.scene.sub_model_nusktb_file_name = '' 
-        context.scene.sub_model_numdlb_file_name = '' 
-        context.scene.sub_model_numatb_file_name = ''  
         #context.scene.sub_merge_same_name_meshes = self.merge_same_name_meshes
         #print(self.filepath)
         context.scene.sub_model_folder_path = self.filepath
-        all_files = os.listdir(context.scene.sub_model_folder_path)
-        model_files = [file for file in all_files if 'model' in file]
-        for model_file in model_files:
-            print(model_file)
-            name, extension = os.path.splitext(model_file)
-            print(extension)
-            if '.numshb' == extension:
-                context.scene.sub_model_numshb_file_name = model_file
-            elif '.nusktb' == extension:
-                context.scene.sub_model_nusktb_file_name = model_file
-            elif '.numdlb' == extension:
-                context.scene.sub_model_numdlb_file_name = model_file
-            elif '.numatb' == extension:
-                context.scene.sub_model_numatb_file_name = model_file
-            elif '.nuhlpb' == extension:
-                context.scene.sub_model_nuhlpb_file_name = model_file
+        model_files = find_model_files(context.scene.sub_model_folder_path)
+        context.scene.sub_model_numshb_file_name = model_files['.numshb']
+        context.scene.sub_model_nusktb_file_name = model_files['.nusktb']
+        context.scene.sub_model_numdlb_file_name = model_files['.numdlb']
+        context.scene.sub_model_numatb_file_name = model_files['.numatb']
+        context.scene.sub_model_nuhlpb_file_name = model_files['.nuhlpb']
         return {'FINISHED'}
 
 class ModelImporter(bpy.types.Operator):
@@ -175,6 +175,150 @@ class ModelImporter(bpy.types.Operator):
         print(f'Imported model in {end - start} seconds')
         return {'FINISHED'}
 
+class BatchModelImporter(bpy.types.Operator, ImportHelper):
+    bl_idname = 'sub.batch_model_importer'
+    bl_label = 'Batch Import Models'
+    bl_description = 'Import every model folder found under the selected folder'
+
+    filter_glob: StringProperty(
+        default='',
+        options={'HIDDEN'}
+    )
+
+    # Initially set the filename field to be nothing
+    def invoke(self, context, _event):
+        self.filepath = ""
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        root_dir = self.filepath if os.path.isdir(self.filepath) else os.path.dirname(self.filepath)
+        batch_import_models(self, context, root_dir, context.scene.sub_model_import_all_vertex_groups,
+                            context.scene.sub_model_import_lazy_textures)
+        return {'FINISHED'}
+
+
+class LazyTextureLoader(bpy.types.Operator):
+    bl_idname = 'sub.load_lazy_textures'
+    bl_label = 'Load Lazy Textures'
+    bl_description = 'Read the files for all textures imported with Lazy Textures enabled'
+
+    def execute(self, context):
+        start = time.time()
+
+        lazy_images = [image for image in bpy.data.images if texture_cache.LAZY_TEXTURE_PROPERTY in image]
+        loaded_count, missing_paths = texture_cache.load_lazy_images(lazy_images)
+
+        end = time.time()
+        print(f'Loaded {loaded_count} lazy textures in {end - start} seconds')
+        for path in missing_paths:
+            print(f'Missing texture file {path}')
+
+        if len(missing_paths) > 0:
+            self.report({'WARNING'}, f'Loaded {loaded_count} textures. {len(missing_paths)} texture files are missing.')
+        else:
+            self.report({'INFO'}, f'Loaded {loaded_count} textures')
+        return {'FINISHED'}
+
+
+def find_model_files(dir, file_names=None):
+    '''
+    Returns the model file name for each supported extension or '' if the folder doesn't have one.
+    '''
+    if file_names is None:
+        file_names = os.listdir(dir)
+
+    model_files = {'.numshb': '', '.nusktb': '', '.numdlb': '', '.numatb': '', '.nuhlpb': ''}
+    for file_name in sorted(file_names):
+        if 'model' not in file_name:
+            continue
+        _, extension = os.path.splitext(file_name)
+        if extension in model_files and model_files[extension] == '':
+            model_files[extension] = file_name
+    return model_files
+
+
+def find_model_folders(root_dir):
+    '''
+    Returns (folder, model files) for every folder under root_dir with at least a .numshb and .nusktb.
+    The folders are sorted, so costume slots like c00 through c07 are imported in order.
+    '''
+    model_folders = []
+    for dir, dir_names, file_names in os.walk(root_dir):
+        dir_names.sort()
+        model_files = find_model_files(dir, file_names)
+        if model_files['.numshb'] != '' and model_files['.nusktb'] != '':
+            model_folders.append((os.path.join(dir, ''), model_files))
+    return model_folders
+
+
+def batch_import_models(operator, context, root_dir, create_all_vertex_groups=False, lazy_textures=False):
+    '''
+    Imports every model folder under root_dir.
+    The master shader, shader data, and images are cached, so models only pay for loading what previous models didn't.
+    Returns a list of (folder, armature or None, seconds, error or None) for each model folder.
+    '''
+    start = time.time()
+
+    model_folders = find_model_folders(root_dir)
+    if len(model_folders) == 0:
+        operator.report({'WARNING'}, f'No model folders found in {root_dir}')
+        return []
+
+    results = []
+    window_manager = context.window_manager
+    window_manager.progress_begin(0, len(model_folders))
+    try:
+        for i, (dir, model_files) in enumerate(model_folders):
+            # Name the armature after the folder since every model is named 'model'.
+            name = os.path.relpath(dir, root_dir)
+            if name == '.':
+                name = os.path.basename(os.path.normpath(dir))
+
+            print(f'Importing model {i + 1} of {len(model_folders)}: {name}')
+            model_start = time.time()
+            try:
+                armature = import_model_files(context, dir,
+                                              model_files['.numdlb'], model_files['.numshb'], model_files['.nusktb'],
+                                              model_files['.numatb'], model_files['.nuhlpb'],
+                                              create_all_vertex_groups, lazy_textures)
+                armature.name = name
+                error = None
+            except Exception as e:
+                # Skip broken folders instead of losing the rest of the batch.
+                armature = None
+                error = str(e)
+                print(f'Failed to import {name}: {e}')
+                # A failed import can leave the armature in edit mode.
+                if context.object is not None and context.object.mode != 'OBJECT':
+                    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+            model_end = time.time()
+
+            results.append((name, armature, model_end - model_start, error))
+            window_manager.progress_update(i + 1)
+    finally:
+        window_manager.progress_end()
+
+    end = time.time()
+    print_batch_import_timings(results, end - start)
+
+    failed_count = sum(1 for result in results if result[3] is not None)
+    if failed_count > 0:
+        operator.report({'WARNING'}, f'Imported {len(results) - failed_count} of {len(results)} models in {end - start:.2f} seconds. Check the console for errors.')
+    else:
+        operator.report({'INFO'}, f'Imported {len(results)} models in {end - start:.2f} seconds')
+    return results
+
+
+def print_batch_import_timings(results, total_seconds):
+    name_width = max([len('Model')] + [len(name) for name, _, _, _ in results])
+    print(f'{"Model":<{name_width}}  {"Seconds":>8}  Status')
+    for name, _, seconds, error in results:
+        status = 'OK' if error is None else f'Failed: {error}'
+        print(f'{name:<{name_width}}  {seconds:>8.3f}  {status}')
+    print(f'Imported {len(results)} models in {total_seconds} seconds')
+
+
 def import_model(self, context):
     dir = context.scene.sub_model_folder_path
     numdlb_name = context.scene.sub_model_numdlb_file_name
@@ -183,35 +327,73 @@ def import_model(self, context):
     numatb_name = context.scene.sub_model_numatb_file_name
     nuhlpb_name = context.scene.sub_model_nuhlpb_file_name
 
-    start = time.time()
-    ssbh_model = ssbh_data_py.modl_data.read_modl(dir + numdlb_name) if numdlb_name != '' else None
+    import_model_files(context, dir, numdlb_name, numshb_name, nusktb_name, numatb_name, nuhlpb_name,
+                       context.scene.sub_model_import_all_vertex_groups, context.scene.sub_model_import_lazy_textures)
+
+
+def import_model_files(context, dir, numdlb_name, numshb_name, nusktb_name, numatb_name, nuhlpb_name,
+                       create_all_vertex_groups=False, lazy_textures=False):
+    '''
+    Imports the model files in dir and returns the created armature.
+    File names that are '' are skipped.
+    '''
+    ssbh_model, ssbh_mesh, ssbh_skel, ssbh_matl, nuhlpb_json = read_model_files(
+        dir, numdlb_name, numshb_name, nusktb_name, numatb_name, nuhlpb_name)
+
+    # The index is shared by armature creation and mesh parenting to avoid repeatedly searching the bones.
+    skel_index = SkeletonIndex(ssbh_skel)
+    armature = create_armature(skel_index, context)
+    created_meshes = create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, skel_index, armature, context, dir,
+                                 create_all_vertex_groups, lazy_textures)
+    if nuhlpb_json is not None:
+        import_nuhlpb_data_from_json(nuhlpb_json, armature, context)
+    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+    return armature
+
 
+def read_mesh_numpy(path):
     # Numpy provides much faster performance than Python lists.
     # TODO(SMG): This API for ssbh_data_py will likely have changes and improvements in the future.
-    ssbh_mesh = ssbh_data_py.mesh_data.read_mesh(dir + numshb_name, use_numpy=True) if numshb_name != '' else None
+    return ssbh_data_py.mesh_data.read_mesh(path, use_numpy=True)
 
-    ssbh_skel = ssbh_data_py.skel_data.read_skel(dir + nusktb_name) if numshb_name != '' else None
-    ssbh_matl = ssbh_data_py.matl_data.read_matl(dir + numatb_name) if numatb_name != '' else None
-    nuhlpb_json = read_nuhlpb_json(dir + nuhlpb_name) if nuhlpb_name != '' else None
-    end = time.time()
-    print(f'Read files in {end - start} seconds')
 
-    armature = create_armature(ssbh_skel, context)
-    created_meshes = create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, ssbh_skel, armature, context)
-    import_nuhlpb_data_from_json(nuhlpb_json, armature, context)
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
-    return
+def read_model_files(dir, numdlb_name, numshb_name, nusktb_name, numatb_name, nuhlpb_name):
+    '''
+    The ssbh_data_py readers are native code, so decode all the files in parallel.
+    Blender data should only be modified from the main thread,
+    so every file is read before any scene construction starts.
+    Missing files are returned as None.
+    '''
+    readers = [
+        (numdlb_name, ssbh_data_py.modl_data.read_modl),
+        (numshb_name, read_mesh_numpy),
+        (nusktb_name, ssbh_data_py.skel_data.read_skel),
+        (numatb_name, ssbh_data_py.matl_data.read_matl),
+        (nuhlpb_name, nuhlpb.read_nuhlpb),
+    ]
+
+    def read_timed(reader, path):
+        start = time.time()
+        data = reader(path)
+        end = time.time()
+        return data, end - start
 
-def get_ssbh_lib_json_exe_path():
-    # Use the Path class to handle path differences between Windows, Linux, and MacOS.
-    this_file_path = Path(__file__)
-    return this_file_path.parent.parent.joinpath('ssbh_lib_json').joinpath('ssbh_lib_json.exe').resolve()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=len(readers)) as executor:
+        futures = [executor.submit(read_timed, reader, dir + name) if name != '' else None for name, reader in readers]
 
-def get_shader_db_file_path():
-    # This file was generated with duplicates removed to optimize space.
-    # https://github.com/ScanMountGoat/Smush-Material-Research#shader-database
-    this_file_path = Path(__file__)
-    return this_file_path.parent.parent.joinpath('shader_file').joinpath('Nufx.db').resolve()
+    results = []
+    for (name, _), future in zip(readers, futures):
+        if future is None:
+            results.append(None)
+            continue
+        data, duration = future.result()
+        print(f'Read {name} in {duration} seconds')
+        results.append(data)
+
+    end = time.time()
+    print(f'Read files in {end - start} seconds')
+    return results
 
 
 '''
@@ -222,31 +404,6 @@ Oh hey SMG is a collaborator of this repo now, and you cant steal code from a co
 def get_matrix4x4_blender(ssbh_matrix):
     return mathutils.Matrix(ssbh_matrix).transposed()
 
-def find_bone(skel, name):
-    for bone in skel.bones:
-        if bone.name == name:
-            return bone
-
-    return None
-
-
-def find_bone_index(skel, name):
-    for i, bone in enumerate(skel.bones):
-        if bone.name == name:
-            return i
-
-    return None
-
-def get_name_from_index(index, bones):
-    if index is None:
-        return None
-    return bones[index].name
-
-def get_index_from_name(name, bones):
-    for index, bone in enumerate(bones):
-        if bone.name == name:
-            return index
-
 def reorient(m, transpose=True):
     from mathutils import Matrix
     m = Matrix(m)
@@ -291,7 +448,60 @@ def reorient_root(m, transpose=True):
     return m
 
 
-def create_armature(ssbh_skel, context): 
+def calculate_edit_bone_matrices(skel_index: SkeletonIndex):
+    '''
+    Calculates the edit bone matrix for every bone at once with numpy.
+    This matches applying reorient() to each bone and multiplying by the parent's edit bone matrix,
+    but only loops over the depth of the skeleton rather than every bone.
+    '''
+    # ssbh matrixes need to be transposed first.
+    transforms = np.array([bone.transform for bone in skel_index.bones], dtype=np.float64).transpose(0, 2, 1)
+
+    # reorient() swaps the X and Y axes and flips some signs.
+    # This is the same as conjugating by a signed permutation matrix, which works on every bone at once.
+    reorientation = np.array([
+        [ 0.0, 1.0, 0.0, 0.0],
+        [-1.0, 0.0, 0.0, 0.0],
+        [ 0.0, 0.0,-1.0, 0.0],
+        [ 0.0, 0.0, 0.0,-1.0],
+    ])
+    local_matrices = reorientation @ transforms @ reorientation.T
+
+    # Group bones by depth so each level can be multiplied by its parents in a single batch.
+    depths = [0] * len(skel_index.bones)
+    levels = []
+    for index in skel_index.hierarchy_order:
+        parent_index = skel_index.parent_indices[index]
+        depth = 0 if parent_index is None else depths[parent_index] + 1
+        depths[index] = depth
+        if depth == len(levels):
+            levels.append([])
+        levels[depth].append(index)
+
+    world_matrices = np.zeros((len(skel_index.bones), 4, 4))
+    if len(levels) == 0:
+        return world_matrices
+
+    # The root bone needs to be modified differently to fix the world orientation.
+    # This is the same fixed matrix returned by reorient_root().
+    world_matrices[levels[0]] = np.array([
+        [ 0.0, 1.0, 0.0, 0.0],
+        [ 0.0, 0.0,-1.0, 0.0],
+        [-1.0, 0.0, 0.0, 0.0],
+        [ 0.0, 0.0, 0.0, 1.0],
+    ])
+
+    for level in levels[1:]:
+        level = np.array(level)
+        parent_matrices = world_matrices[[skel_index.parent_indices[index] for index in level]]
+        # Edit bones don't store scale, so remove it to match reading back the parent's edit bone matrix.
+        parent_matrices[:, :3, :3] /= np.linalg.norm(parent_matrices[:, :3, :3], axis=1, keepdims=True)
+        world_matrices[level] = parent_matrices @ local_matrices[level]
+
+    return world_matrices
+
+
+def create_armature(skel_index: SkeletonIndex, context): 
     '''
     So blender bone matrixes are not relative to their parent, unlike the ssbh skel.
     Also, blender has a different coordinate system for the bones.
@@ -314,41 +524,30 @@ def create_armature(ssbh_skel, context):
     context.view_layer.objects.active = armature
     bpy.ops.object.mode_set(mode='EDIT', toggle=False)
     
-    bone_name_parent_name_dict = {bone.name:get_name_from_index(bone.parent_index, ssbh_skel.bones) for bone in ssbh_skel.bones}
-    
     edit_bones = armature.data.edit_bones
 
     # Make Bones
-    for ssbh_bone in ssbh_skel.bones:
+    # Keep the edit bones in the same order as the ssbh bones to avoid looking them up by name.
+    blender_bones = []
+    for ssbh_bone in skel_index.bones:
         blender_bone = edit_bones.new(ssbh_bone.name)
         blender_bone.head = [0,0,0]
         blender_bone.tail = [0,1,0] # Doesnt actually matter where its pointing, it just needs to point somewhere
+        blender_bones.append(blender_bone)
 
     # Assign Parents
-    for ssbh_bone in ssbh_skel.bones:  
-        blender_bone = edit_bones.get(ssbh_bone.name)
-        parent_bone_name = bone_name_parent_name_dict[ssbh_bone.name]
-        if parent_bone_name is None:
+    for blender_bone, parent_index in zip(blender_bones, skel_index.parent_indices):
+        if parent_index is None:
             continue
-        parent_bone = edit_bones.get(parent_bone_name, None)
-        blender_bone.parent = parent_bone
+        blender_bone.parent = blender_bones[parent_index]
 
     # Get a list of bones in 'heirarchal' order
-    def heirarchy_order(bone, reordered):
-        if bone not in reordered:
-            reordered.append(bone)
-        for child in bone.children:
-            heirarchy_order(child, reordered)
-    reordered = []
-    heirarchy_order(edit_bones[0], reordered)
+    reordered = [blender_bones[index] for index in skel_index.hierarchy_order]
 
     # Transform bones    
-    for blender_bone in reordered:
-        ssbh_bone = ssbh_skel.bones[get_index_from_name(blender_bone.name, ssbh_skel.bones)]
-        if blender_bone.parent is None:
-            blender_bone.matrix = reorient_root(ssbh_bone.transform)
-            continue
-        blender_bone.matrix = blender_bone.parent.matrix @ reorient(ssbh_bone.transform)
+    world_matrices = calculate_edit_bone_matrices(skel_index)
+    for index in skel_index.hierarchy_order:
+        blender_bones[index].matrix = mathutils.Matrix(world_matrices[index].tolist())
     
 
     # fix bone lengths
@@ -456,50 +655,98 @@ def create_armature(ssbh_skel, context):
     return armature
 
 
-def attach_armature_create_vertex_groups(mesh_obj, skel, armature, ssbh_mesh_object):
+def get_vertex_group_names(ssbh_mesh_object, skel_bone_names, create_all_vertex_groups):
+    '''
+    Only the bones used for skinning or parenting need a vertex group.
+    Creating groups for every bone on every mesh bloats the file and slows down the armature modifier.
+    Groups use the skeleton's bone order, and any influences for bones missing from the skeleton come last.
+    '''
+    if create_all_vertex_groups:
+        used_names = set(skel_bone_names)
+    else:
+        used_names = set()
+
+    used_names.update(influence.bone_name for influence in ssbh_mesh_object.bone_influences)
+    if ssbh_mesh_object.parent_bone_name != '':
+        used_names.add(ssbh_mesh_object.parent_bone_name)
+
+    names = [name for name in skel_bone_names if name in used_names]
+    names.extend(sorted(used_names.difference(skel_bone_names)))
+    return names
+
+
+def attach_armature_create_vertex_groups(mesh_obj, skel_index, armature, ssbh_mesh_object, vertex_group_names):
     from math import radians
     from mathutils import Matrix
-    if skel is not None:
-        # Create vertex groups for each bone to support skinning.
-        for bone in skel.bones:
-            mesh_obj.vertex_groups.new(name=bone.name)
-
-        # Apply the initial parent bone transform if present.
-        parent_bone = find_bone(skel, ssbh_mesh_object.parent_bone_name)
-        if parent_bone is not None:
-            world_transform = skel.calculate_world_transform(parent_bone)
-            mesh_obj.matrix_world = get_matrix4x4_blender(world_transform)
-
-            # Use regular skin weights for mesh objects parented to a bone.
-            # TODO: Should this only apply if there are no influences?
-            # TODO: Should this be handled by actual parenting in Blender?
-            mesh_obj.vertex_groups[parent_bone.name].add(ssbh_mesh_object.vertex_indices, 1.0, 'REPLACE')
-        else:
-            # Set the vertex skin weights for each bone.
-            # TODO: Is there a faster way than setting weights per vertex?
-            for influence in ssbh_mesh_object.bone_influences:
-                # TODO: Will influences always refer to valid bones in the skeleton?
-                vertex_group = mesh_obj.vertex_groups[influence.bone_name]
-                for w in influence.vertex_weights:
-                    vertex_group.add([w.vertex_index], w.vertex_weight, 'REPLACE')
-        # Fix the rotation of the mesh objects. 
-        # TODO: Figure out how to apply all transforms.
-        trans_vec, rot_vec, scale_vec = mesh_obj.matrix_world.decompose()
-        trans_mat = Matrix.Translation(trans_vec)
-        rot_mat = rot_vec.to_matrix().to_4x4()
-        scale_mat = Matrix.Scale(scale_vec[0],4,(1,0,0)) * Matrix.Scale(scale_vec[1],4,(0,1,0)) * Matrix.Scale(scale_vec[2],4,(0,0,1)) # theres gotta be a better way of doing this
-        axis_correction = Matrix.Rotation(radians(90), 4, 'X')  
-        mesh_obj.matrix_world = axis_correction @ trans_mat @ rot_mat @ scale_mat
+    # Create vertex groups for the bones used by this mesh to support skinning.
+    for name in vertex_group_names:
+        mesh_obj.vertex_groups.new(name=name)
+
+    # Apply the initial parent bone transform if present.
+    parent_bone_index = skel_index.find_bone_index(ssbh_mesh_object.parent_bone_name)
+    if parent_bone_index is not None:
+        parent_bone = skel_index.bones[parent_bone_index]
+        world_transform = skel_index.get_world_transform(parent_bone_index)
+        mesh_obj.matrix_world = get_matrix4x4_blender(world_transform)
+
+        # Use regular skin weights for mesh objects parented to a bone.
+        # TODO: Should this only apply if there are no influences?
+        # TODO: Should this be handled by actual parenting in Blender?
+        mesh_obj.vertex_groups[parent_bone.name].add(ssbh_mesh_object.vertex_indices, 1.0, 'REPLACE')
+    else:
+        # Set the vertex skin weights for each bone.
+        start = time.time()
+        weight_count, call_count = 0, 0
+        for influence in ssbh_mesh_object.bone_influences:
+            # TODO: Will influences always refer to valid bones in the skeleton?
+            vertex_group = mesh_obj.vertex_groups[influence.bone_name]
+            weight_count += len(influence.vertex_weights)
+            call_count += add_influence_weights(vertex_group, influence)
+        end = time.time()
+        # The previous approach made one call to add() per weight, so the weight count is the old call count.
+        print(f'Skinned {mesh_obj.name} in {end - start} seconds ({weight_count} weights, {call_count} calls)')
+    # Fix the rotation of the mesh objects. 
+    # TODO: Figure out how to apply all transforms.
+    trans_vec, rot_vec, scale_vec = mesh_obj.matrix_world.decompose()
+    trans_mat = Matrix.Translation(trans_vec)
+    rot_mat = rot_vec.to_matrix().to_4x4()
+    scale_mat = Matrix.Scale(scale_vec[0],4,(1,0,0)) * Matrix.Scale(scale_vec[1],4,(0,1,0)) * Matrix.Scale(scale_vec[2],4,(0,0,1)) # theres gotta be a better way of doing this
+    axis_correction = Matrix.Rotation(radians(90), 4, 'X')  
+    mesh_obj.matrix_world = axis_correction @ trans_mat @ rot_mat @ scale_mat
 
     # Attach the mesh object to the armature object.
     if armature is not None:
         mesh_obj.parent = armature
-        for bone in armature.data.bones.values():
-            mesh_obj.vertex_groups.new(name=bone.name)
         modifier = mesh_obj.modifiers.new(armature.data.name, type="ARMATURE")
         modifier.object = armature
 
 
+def add_influence_weights(vertex_group, influence):
+    '''
+    VertexGroup.add() takes a list of vertices but only a single weight.
+    Bucket the vertices by weight so each unique weight value only needs one call.
+    This is much faster than adding one vertex at a time for meshes with tens of thousands of vertices.
+    Returns the number of calls made to add().
+    '''
+    count = len(influence.vertex_weights)
+    if count == 0:
+        return 0
+
+    indices = np.fromiter((w.vertex_index for w in influence.vertex_weights), dtype=np.int32, count=count)
+    weights = np.fromiter((w.vertex_weight for w in influence.vertex_weights), dtype=np.float32, count=count)
+
+    # Sort by weight so each bucket is a contiguous slice of the vertex indices.
+    unique_weights, inverse, bucket_sizes = np.unique(weights, return_inverse=True, return_counts=True)
+    sorted_indices = indices[np.argsort(inverse, kind='stable')]
+    bucket_ends = np.cumsum(bucket_sizes)
+    bucket_starts = bucket_ends - bucket_sizes
+
+    for weight, bucket_start, bucket_end in zip(unique_weights, bucket_starts, bucket_ends):
+        vertex_group.add(sorted_indices[bucket_start:bucket_end].tolist(), float(weight), 'REPLACE')
+
+    return len(unique_weights)
+
+
 def create_blender_mesh(ssbh_mesh_object, skel, name_index_mat_dict):
     blender_mesh = bpy.data.meshes.new(ssbh_mesh_object.name)
 
@@ -568,7 +815,7 @@ def create_blender_mesh(ssbh_mesh_object, skel, name_index_mat_dict):
     return blender_mesh
 
 
-def create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, ssbh_skel, armature, context):
+def create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, skel_index, armature, context, dir, create_all_vertex_groups=False, lazy_textures=False):
     '''
     So the goal here is to create a set of materials to share among the meshes for this model.
     But, other previously created models can have materials of the same name.
@@ -576,13 +823,24 @@ def create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, ssbh_skel, armature, context):
     example, bpy.data.materials.new('A') might create 'A' or 'A.001', so store reference to the mat created rather than the name
     '''
     created_meshes = []
-    unique_numdlb_material_labels = {e.material_label for e in ssbh_model.entries}
+    # Limited imports without a .numdlb or .numatb still create the meshes without materials.
+    model_entries = ssbh_model.entries if ssbh_model is not None and ssbh_matl is not None else []
+    unique_numdlb_material_labels = {e.material_label for e in model_entries}
     
     # Make Master Shader if its not already made
     master_shader.create_master_shader()
 
+    # Look up the shader data for every material at once instead of querying the database for each material.
+    if ssbh_matl is not None:
+        shader_db.get_shader_database().prefetch([entry.shader_label for entry in ssbh_matl.entries])
+
     texture_name_to_image_dict = {}
-    texture_name_to_image_dict = import_material_images(ssbh_matl, context)
+    matl_index = None
+    if ssbh_matl is not None:
+        texture_name_to_image_dict = import_material_images(ssbh_matl, dir, lazy_textures)
+        matl_index = MatlIndex(ssbh_matl)
+
+    start = time.time()
 
     label_to_material_dict = {}
     for label in unique_numdlb_material_labels:
@@ -591,33 +849,56 @@ def create_mesh(ssbh_model, ssbh_matl, ssbh_mesh, ssbh_skel, armature, context):
         # Mesh import should still succeed even if materials can't be created.
         # TODO: Report some sort of error to the user?
         try:
-            setup_blender_mat(blender_mat, label, ssbh_matl, texture_name_to_image_dict)
+            setup_blender_mat(blender_mat, label, ssbh_matl, texture_name_to_image_dict, matl_index)
             label_to_material_dict[label] = blender_mat
         except Exception as e:
             print(f'Failed to create material for {label}: {e}')
 
+    end = time.time()
+    print(f'Created {len(label_to_material_dict)} materials in {end - start} seconds')
+
     name_index_mat_dict = { 
         (e.mesh_object_name,e.mesh_object_sub_index):label_to_material_dict[e.material_label] 
-        for e in ssbh_model.entries if e.material_label in label_to_material_dict
+        for e in model_entries if e.material_label in label_to_material_dict
     }
 
     start = time.time()
+    skinning_time = 0.0
+
+    # The bone names are shared by every mesh object, so only gather them once.
+    skel_bone_names = [bone.name for bone in skel_index.bones]
 
     for i, ssbh_mesh_object in enumerate(ssbh_mesh.objects):
-        blender_mesh = create_blender_mesh(ssbh_mesh_object, ssbh_skel, name_index_mat_dict)
+        blender_mesh = create_blender_mesh(ssbh_mesh_object, skel_index.skel, name_index_mat_dict)
         mesh_obj = bpy.data.objects.new(blender_mesh.name, blender_mesh)
 
-        attach_armature_create_vertex_groups(mesh_obj, ssbh_skel, armature, ssbh_mesh_object)
+        skinning_start = time.time()
+        vertex_group_names = get_vertex_group_names(ssbh_mesh_object, skel_bone_names, create_all_vertex_groups)
+        attach_armature_create_vertex_groups(mesh_obj, skel_index, armature, ssbh_mesh_object, vertex_group_names)
+        skinning_time += time.time() - skinning_start
         mesh_obj["numshb order"] = i
         context.collection.objects.link(mesh_obj)
         created_meshes.append(mesh_obj)
     
     end = time.time()
-    print(f'Created meshes in {end - start} seconds')
+    print(f'Created meshes in {end - start} seconds ({skinning_time} seconds skinning)')
 
     return created_meshes
 
-def import_material_images(ssbh_matl, context):
+def get_texture_file_path(dir, texture_name):
+    # Absolute texture names like /common/shader/sfxpbs/default_normal refer to the game's file system.
+    # Look for those textures in the model folder by name instead.
+    if texture_name.startswith('/'):
+        texture_name = os.path.basename(texture_name)
+    return os.path.normpath(os.path.join(dir, texture_name + '.png'))
+
+
+def import_material_images(ssbh_matl, dir, lazy_textures=False):
+    '''
+    Loads the images used by the matl's textures from dir.
+    Images are shared with previous imports that used the same unmodified files.
+    Lazy textures create the images without reading the files.
+    '''
     texture_name_to_image_dict = {}
     texture_name_set = set()
 
@@ -627,61 +908,57 @@ def import_material_images(ssbh_matl, context):
 
     print('texture_name_set = %s' % texture_name_set)
 
-    for texture_name in texture_name_set:
-        dir = context.scene.sub_model_folder_path
-        image = image_utils.load_image(texture_name + '.png', dir, place_holder=True, check_existing=False)  
-        texture_name_to_image_dict[texture_name] = image
+    texture_name_to_path = {texture_name: get_texture_file_path(dir, texture_name) for texture_name in texture_name_set}
+    path_to_image = texture_cache.get_texture_cache().load_images(texture_name_to_path.values(), lazy_textures)
+    for texture_name, path in texture_name_to_path.items():
+        texture_name_to_image_dict[texture_name] = path_to_image[path]
 
     return texture_name_to_image_dict
 
 
-def enable_inputs(node_group_node, param_id):
-    for input in node_group_node.inputs:
-        if input.name.split(' ')[0] == param_id:
-            input.hide = False
+class MatlIndex:
+    '''
+    Lookups for a matl's entries and parameters, so each material doesn't have to search every entry.
+    This is created once for each MatlData and shared by all of its materials.
+    '''
+    def __init__(self, ssbh_matl):
+        # Later entries with the same label replace earlier entries like the previous linear search.
+        self.label_to_entry = {entry.material_label: entry for entry in ssbh_matl.entries}
+        # Maps a material label to a dict of param id name like 'Sampler0' to param.
+        self.label_to_params = {}
+
+    def get_entry(self, material_label):
+        return self.label_to_entry.get(material_label)
+
+    def get_params(self, material_label):
+        params = self.label_to_params.get(material_label)
+        if params is None:
+            entry = self.label_to_entry[material_label]
+            params = {}
+            for param_list in [entry.blend_states, entry.floats, entry.booleans, entry.vectors, entry.rasterizer_states, entry.samplers, entry.textures]:
+                for param in param_list:
+                    params[param.param_id.name] = param
+            self.label_to_params[material_label] = params
+        return params
 
 
 def get_vertex_attributes(node_group_node, shader_name):
     # Query the shader database for attribute information.
-    # Using SQLite is much faster than iterating through the JSON dump.
-    with sqlite3.connect(get_shader_db_file_path()) as con:
-        # Construct a query to find all the vertex attributes for this shader.
-        # Invalid shaders will return an empty list.
-        sql = """
-            SELECT v.AttributeName 
-            FROM VertexAttribute v 
-            INNER JOIN ShaderProgram s ON v.ShaderProgramID = s.ID 
-            WHERE s.Name = ?
-            """
-        # The database has a single entry for each program, so don't include the render pass tag.
-        return [row[0] for row in con.execute(sql, (shader_name[:len('SFX_PBS_0000000000000080')],)).fetchall()]
-
-
-def setup_blender_mat(blender_mat, material_label, ssbh_matl: ssbh_data_py.matl_data.MatlData, texture_name_to_image_dict):
-    # TODO: Handle none?
-    entry = None
-    for ssbh_mat_entry in ssbh_matl.entries:
-        if ssbh_mat_entry.material_label == material_label:
-            entry = ssbh_mat_entry
+    # The database caches the results for each shader, so this only queries SQLite once per shader.
+    return shader_db.get_shader_database().get_vertex_attributes(shader_name)
 
-    # Change Mat Settings
-    # Change Transparency Stuff Later
-    blender_mat.blend_method = 'CLIP'
-    blender_mat.use_backface_culling = True
-    blender_mat.show_transparent_back = False
-    # TODO: This should be based on the blend state and not the shader label.
-    alpha_blend_suffixes = ['_far', '_sort', '_near']
-    if any(suffix in entry.shader_label for suffix in alpha_blend_suffixes):
-        blender_mat.blend_method = 'BLEND'
-        
-    # Clone Master Shader
-    master_shader_name = master_shader.get_master_shader_name()
-    master_node_group = bpy.data.node_groups.get(master_shader_name)
-    clone_group = master_node_group.copy()
 
-    # Setup Clone
-    clone_group.name = entry.shader_label
+def setup_blender_mat(blender_mat, material_label, ssbh_matl: ssbh_data_py.matl_data.MatlData, texture_name_to_image_dict, matl_index=None):
+    # Importing a whole matl should create the index once and reuse it for every material.
+    if matl_index is None:
+        matl_index = MatlIndex(ssbh_matl)
 
+    # TODO: Handle none?
+    entry = matl_index.get_entry(material_label)
+    params = matl_index.get_params(material_label)
+
+    set_material_settings(blender_mat, entry)
+        
     # Add our new Nodes
     blender_mat.use_nodes = True
     nodes = blender_mat.node_tree.nodes
@@ -696,162 +973,323 @@ def setup_blender_mat(blender_mat, material_label, ssbh_matl: ssbh_data_py.matl_
     node_group_node.name = 'smash_ultimate_shader'
     node_group_node.width = 600
     node_group_node.location = (-300, 300)
-    node_group_node.node_tree = clone_group
-    for input in node_group_node.inputs:
-        input.hide = True
-    shader_label = node_group_node.inputs['Shader Label']
-    shader_label.hide = False
-    shader_name = entry.shader_label
-    shader_label.default_value = entry.shader_label
-    material_label = node_group_node.inputs['Material Name']
-    material_label.hide = False
-    material_label.default_value = entry.material_label
+    # Materials with the same shader share a node group instead of each cloning the master shader.
+    node_group_node.node_tree = material_instances.get_shader_node_group(entry.shader_label)
 
-    # TODO: Refactor this to be cleaner?
-    blend_state = entry.blend_states[0].data
-    enable_inputs(node_group_node, entry.blend_states[0].param_id.name)
-
-    blend_state_inputs = []
-    for input in node_group_node.inputs:
-        if input.name.split(' ')[0] == 'BlendState0':
-            blend_state_inputs.append(input)
-            
-    for input in blend_state_inputs:
-        field_name = input.name.split(' ')[1]
-        if field_name == 'Field1':
-            input.default_value = blend_state.source_color.name
-        if field_name == 'Field3':
-            input.default_value = blend_state.destination_color.name
-        if field_name == 'Field7':
-            input.default_value = blend_state.alpha_sample_to_coverage
-
-    rasterizer_state = entry.rasterizer_states[0].data
-    enable_inputs(node_group_node, entry.rasterizer_states[0].param_id.name)
-
-    rasterizer_state_inputs = [input for input in node_group_node.inputs if input.name.split(' ')[0] == 'RasterizerState0']
-    for input in rasterizer_state_inputs:
-        field_name = input.name.split(' ')[1]
-        if field_name == 'Field1':
-            input.default_value = rasterizer_state.fill_mode.name
-        if field_name == 'Field2':
-            input.default_value = rasterizer_state.cull_mode.name
-        if field_name == 'Field3':
-            input.default_value = rasterizer_state.depth_bias
-
-    for param in entry.booleans:
-        input = node_group_node.inputs.get(param.param_id.name)
-        input.hide = False
-        input.default_value = param.data
-
-    for param in entry.floats:
-        input = node_group_node.inputs.get(param.param_id.name)
-        input.hide = False
-        input.default_value = param.data
-    
-    for param in entry.vectors:
-        param_name = param.param_id.name
-
-        if param_name in material_inputs.vec4_param_to_inputs:
-            # Find and enable inputs.
-            inputs = [node_group_node.inputs.get(name) for _, name, _ in material_inputs.vec4_param_to_inputs[param_name]]
-            for input in inputs:
-                input.hide = False
-
-            # Assume inputs are RGBA, RGB/A, or X/Y/Z/W.
-            x, y, z, w = param.data
-            if len(inputs) == 1:
-                inputs[0].default_value = (x,y,z,w)
-            elif len(inputs) == 2:
-                inputs[0].default_value = (x,y,z,1)
-                inputs[1].default_value = w
-            elif len(inputs) == 4:
-                inputs[0].default_value = x
-                inputs[1].default_value = y
-                inputs[2].default_value = z
-                inputs[3].default_value = w
-
-            if param_name == 'CustomVector47':
-                node_group_node.inputs['use_custom_vector_47'].default_value = 1.0
+    visible_indices = set_material_entry_values(node_group_node, entry)
 
     links.new(material_output_node.inputs[0], node_group_node.outputs[0])
 
     # Add image texture nodes
-    node_count = 0
+    for node_count, texture_param in enumerate(entry.textures):
+        sampler_entry = get_sampler_param(params, texture_param)
+        visible_indices.update(create_texture_nodes(blender_mat, node_group_node, texture_param, sampler_entry, texture_name_to_image_dict, node_count))
+
+    visible_indices.update(create_color_set_nodes(blender_mat, node_group_node, entry.shader_label))
+
+    material_instances.set_visible_inputs(node_group_node, visible_indices)
+
+
+def update_blender_mat(blender_mat, material_label, matl_index, texture_name_to_image_dict):
+    '''
+    Updates a material created by setup_blender_mat in place instead of deleting and recreating its nodes.
+    Only inputs with different values are assigned, and texture nodes are only created or removed for added or removed textures.
+    Materials without a shader node group are recreated with setup_blender_mat.
+    '''
+    node_group_node = get_shader_node(blender_mat)
+    if node_group_node is None:
+        setup_blender_mat(blender_mat, material_label, None, texture_name_to_image_dict, matl_index)
+        return
 
+    entry = matl_index.get_entry(material_label)
+    params = matl_index.get_params(material_label)
+
+    set_material_settings(blender_mat, entry)
+
+    shared_group = material_instances.get_shader_node_group(entry.shader_label)
+    if node_group_node.node_tree != shared_group:
+        node_group_node.node_tree = shared_group
+
+    visible_indices = set_material_entry_values(node_group_node, entry)
+
+    param_to_texture_node = get_linked_texture_nodes(node_group_node)
+    texture_node_count = len(param_to_texture_node)
     for texture_param in entry.textures:
-        enable_inputs(node_group_node, texture_param.param_id.name)
-
-        texture_node = nodes.new('ShaderNodeTexImage')
-        texture_node.location = (-800, -500 * node_count + 1000)
-        texture_file_name = texture_param.data
-        texture_node.name = texture_file_name
-        texture_node.label = texture_file_name
-        texture_node.image = texture_name_to_image_dict[texture_file_name]
-        matched_rgb_input = None
-        matched_alpha_input = None
-        for input in node_group_node.inputs:
-            if texture_param.param_id.name == input.name.split(' ')[0]:
-                if 'RGB' == input.name.split(' ')[1]:
-                    matched_rgb_input = input
-                else:
-                    matched_alpha_input = input
-        # For now, manually set the colorspace types....
-        linear_textures = ['Texture6', 'Texture4']
-        if texture_param.param_id.name in linear_textures:
-            texture_node.image.colorspace_settings.name = 'Linear'
-            texture_node.image.alpha_mode = 'CHANNEL_PACKED'
-        
-        uv_map_node = nodes.new('ShaderNodeUVMap')
-        uv_map_node.name = 'uv_map_node'
-        uv_map_node.location = (texture_node.location[0] - 900, texture_node.location[1])
-        uv_map_node.label = texture_param.param_id.name + ' UV Map'
-
-        if texture_param.param_id.name == 'Texture9':
-            uv_map_node.uv_map = 'bake1'
-        elif texture_param.param_id.name == 'Texture1':
-            uv_map_node.uv_map = 'uvSet'
+        param_name = texture_param.param_id.name
+        sampler_entry = get_sampler_param(params, texture_param)
+        texture_node = param_to_texture_node.pop(param_name, None)
+        if texture_node is None:
+            visible_indices.update(create_texture_nodes(blender_mat, node_group_node, texture_param, sampler_entry, texture_name_to_image_dict, texture_node_count))
+            texture_node_count += 1
+            continue
+
+        socket_index = material_instances.get_socket_index(node_group_node)
+        visible_indices.update(socket_index.get_indices(param_name))
+        visible_indices.update(socket_index.get_indices(sampler_entry.param_id.name))
+
+        image = texture_name_to_image_dict[texture_param.data]
+        if texture_node.image != image:
+            texture_node.image = image
+            texture_node.name = texture_param.data
+            texture_node.label = texture_param.data
+        set_texture_colorspace(texture_node, param_name)
+
+        sampler_node = get_linked_node(texture_node.inputs[0])
+        if sampler_node is not None and sampler_node.bl_idname == 'CustomNodeUltimateSampler':
+            set_sampler_node_values(sampler_node, sampler_entry.data)
+
+    # Remove the nodes for textures that are no longer in the material.
+    for texture_node in param_to_texture_node.values():
+        remove_texture_nodes(blender_mat, texture_node)
+
+    visible_indices.update(create_color_set_nodes(blender_mat, node_group_node, entry.shader_label))
+
+    material_instances.set_visible_inputs(node_group_node, visible_indices)
+
+
+def get_shader_node(blender_mat):
+    if blender_mat.node_tree is None:
+        return None
+    node = blender_mat.node_tree.nodes.get('smash_ultimate_shader')
+    if node is None or node.type != 'GROUP' or node.node_tree is None:
+        return None
+    return node
+
+
+def set_material_settings(blender_mat, entry):
+    # Change Mat Settings
+    # Change Transparency Stuff Later
+    blender_mat.blend_method = 'CLIP'
+    blender_mat.use_backface_culling = True
+    blender_mat.show_transparent_back = False
+    # TODO: This should be based on the blend state and not the shader label.
+    alpha_blend_suffixes = ['_far', '_sort', '_near']
+    if any(suffix in entry.shader_label for suffix in alpha_blend_suffixes):
+        blender_mat.blend_method = 'BLEND'
+
+
+def set_material_entry_values(node_group_node, entry):
+    '''
+    Sets the inputs for the entry's labels and non texture parameters.
+    Returns the indices of the inputs that should be visible.
+    '''
+    # Find sockets by index and hide all the unused inputs at once at the end.
+    inputs = node_group_node.inputs
+    socket_index = material_instances.get_socket_index(node_group_node)
+    name_to_index = socket_index.name_to_index
+    visible_indices = set()
+
+    visible_indices.add(name_to_index['Shader Label'])
+    material_instances.set_input_value(inputs['Shader Label'], entry.shader_label)
+    visible_indices.add(name_to_index['Material Name'])
+    material_instances.set_input_value(inputs['Material Name'], entry.material_label)
+
+    for param in [entry.blend_states[0], entry.rasterizer_states[0], *entry.booleans, *entry.floats, *entry.vectors]:
+        visible_indices.update(set_param_values(node_group_node, socket_index, param))
+
+    return visible_indices
+
+
+def set_param_values(node_group_node, socket_index, param):
+    '''
+    Sets the inputs for a blend state, rasterizer state, boolean, float, or vector param.
+    Returns the indices of the param's inputs.
+    '''
+    inputs = node_group_node.inputs
+    name_to_index = socket_index.name_to_index
+    param_name = param.param_id.name
+    visible_indices = set()
+
+    # TODO: Refactor this to be cleaner?
+    if param_name.startswith('BlendState'):
+        blend_state = param.data
+        for i, field_name in socket_index.get_fields(param_name):
+            visible_indices.add(i)
+            if field_name == 'Field1':
+                material_instances.set_input_value(inputs[i], blend_state.source_color.name)
+            if field_name == 'Field3':
+                material_instances.set_input_value(inputs[i], blend_state.destination_color.name)
+            if field_name == 'Field7':
+                material_instances.set_input_value(inputs[i], blend_state.alpha_sample_to_coverage)
+
+    elif param_name.startswith('RasterizerState'):
+        rasterizer_state = param.data
+        for i, field_name in socket_index.get_fields(param_name):
+            visible_indices.add(i)
+            if field_name == 'Field1':
+                material_instances.set_input_value(inputs[i], rasterizer_state.fill_mode.name)
+            if field_name == 'Field2':
+                material_instances.set_input_value(inputs[i], rasterizer_state.cull_mode.name)
+            if field_name == 'Field3':
+                material_instances.set_input_value(inputs[i], rasterizer_state.depth_bias)
+
+    elif param_name.startswith('CustomBoolean') or param_name.startswith('CustomFloat'):
+        i = name_to_index[param_name]
+        visible_indices.add(i)
+        material_instances.set_input_value(inputs[i], param.data)
+
+    elif param_name in material_inputs.vec4_param_to_inputs:
+        # Find and enable inputs.
+        vector_indices = [name_to_index[name] for _, name, _ in material_inputs.vec4_param_to_inputs[param_name]]
+        visible_indices.update(vector_indices)
+        vector_inputs = [inputs[i] for i in vector_indices]
+
+        # Assume inputs are RGBA, RGB/A, or X/Y/Z/W.
+        x, y, z, w = param.data
+        if len(vector_inputs) == 1:
+            material_instances.set_input_value(vector_inputs[0], (x,y,z,w))
+        elif len(vector_inputs) == 2:
+            material_instances.set_input_value(vector_inputs[0], (x,y,z,1))
+            material_instances.set_input_value(vector_inputs[1], w)
+        elif len(vector_inputs) == 4:
+            material_instances.set_input_value(vector_inputs[0], x)
+            material_instances.set_input_value(vector_inputs[1], y)
+            material_instances.set_input_value(vector_inputs[2], z)
+            material_instances.set_input_value(vector_inputs[3], w)
+
+        if param_name == 'CustomVector47':
+            material_instances.set_input_value(inputs['use_custom_vector_47'], 1.0)
+
+    return visible_indices
+
+
+def get_sampler_param(params, texture_param):
+    # TODO: Handle the None case?
+    return params.get('Sampler' + texture_param.param_id.name.split('Texture')[1])
+
+
+def set_texture_colorspace(texture_node, param_name):
+    # For now, manually set the colorspace types....
+    linear_textures = ['Texture6', 'Texture4']
+    if param_name in linear_textures:
+        texture_node.image.colorspace_settings.name = 'Linear'
+        texture_node.image.alpha_mode = 'CHANNEL_PACKED'
+
+
+def set_sampler_node_values(sampler_node, sampler_data):
+    sampler_node.wrap_s = sampler_data.wraps.name
+    sampler_node.wrap_t = sampler_data.wrapt.name
+    sampler_node.wrap_r = sampler_data.wrapr.name
+    sampler_node.min_filter = sampler_data.min_filter.name
+    sampler_node.mag_filter = sampler_data.mag_filter.name
+    sampler_node.anisotropic_filtering = sampler_data.max_anisotropy is not None
+    sampler_node.max_anisotropy = sampler_data.max_anisotropy.name if sampler_data.max_anisotropy else 'One'
+    sampler_node.border_color = tuple(sampler_data.border_color)
+    sampler_node.lod_bias = sampler_data.lod_bias
+
+
+def create_texture_nodes(blender_mat, node_group_node, texture_param, sampler_entry, texture_name_to_image_dict, node_count):
+    '''
+    Creates the UV map, sampler, and image texture nodes for the texture and links them to the shader node group.
+    Returns the indices of the texture and sampler inputs.
+    '''
+    nodes = blender_mat.node_tree.nodes
+    links = blender_mat.node_tree.links
+    inputs = node_group_node.inputs
+    socket_index = material_instances.get_socket_index(node_group_node)
+
+    texture_fields = socket_index.get_fields(texture_param.param_id.name)
+    visible_indices = {i for i, _ in texture_fields}
+
+    texture_node = nodes.new('ShaderNodeTexImage')
+    texture_node.location = (-800, -500 * node_count + 1000)
+    texture_file_name = texture_param.data
+    texture_node.name = texture_file_name
+    texture_node.label = texture_file_name
+    texture_node.image = texture_name_to_image_dict[texture_file_name]
+    matched_rgb_input = None
+    matched_alpha_input = None
+    for i, field_name in texture_fields:
+        if 'RGB' == field_name:
+            matched_rgb_input = inputs[i]
         else:
-            uv_map_node.uv_map = 'map1'
-
-        # Create Sampler Node
-        sampler_node = nodes.new('CustomNodeUltimateSampler')
-        sampler_node.name = 'sampler_node'
-        sampler_node.label = 'Sampler' + texture_param.param_id.name.split('Texture')[1]
-        sampler_node.location = (texture_node.location[0] - 600, texture_node.location[1])
-        sampler_node.width = 500
-
-        # TODO: Handle the None case?
-        sampler_entry = None
-        for sampler_param in entry.samplers:
-            if texture_param.param_id.name.split('Texture')[1] == sampler_param.param_id.name.split('Sampler')[1]:
-                sampler_entry = sampler_param
-                break
-
-        enable_inputs(node_group_node, sampler_entry.param_id.name)
-        sampler_data = sampler_entry.data
-        sampler_node.wrap_s = sampler_data.wraps.name
-        sampler_node.wrap_t = sampler_data.wrapt.name
-        sampler_node.wrap_r = sampler_data.wrapr.name
-        sampler_node.min_filter = sampler_data.min_filter.name
-        sampler_node.mag_filter = sampler_data.mag_filter.name
-        sampler_node.anisotropic_filtering = sampler_data.max_anisotropy is not None
-        sampler_node.max_anisotropy = sampler_data.max_anisotropy.name if sampler_data.max_anisotropy else 'One'
-        sampler_node.border_color = tuple(sampler_data.border_color)
-        sampler_node.lod_bias = sampler_data.lod_bias       
-
-        links.new(sampler_node.inputs['UV Input'], uv_map_node.outputs[0])
-        links.new(texture_node.inputs[0], sampler_node.outputs[0])
-        links.new(matched_rgb_input, texture_node.outputs['Color'])
-        links.new(matched_alpha_input, texture_node.outputs['Alpha'])
-        node_count = node_count + 1
+            matched_alpha_input = inputs[i]
+    set_texture_colorspace(texture_node, texture_param.param_id.name)
+    
+    uv_map_node = nodes.new('ShaderNodeUVMap')
+    uv_map_node.name = 'uv_map_node'
+    uv_map_node.location = (texture_node.location[0] - 900, texture_node.location[1])
+    uv_map_node.label = texture_param.param_id.name + ' UV Map'
+
+    if texture_param.param_id.name == 'Texture9':
+        uv_map_node.uv_map = 'bake1'
+    elif texture_param.param_id.name == 'Texture1':
+        uv_map_node.uv_map = 'uvSet'
+    else:
+        uv_map_node.uv_map = 'map1'
+
+    # Create Sampler Node
+    sampler_node = nodes.new('CustomNodeUltimateSampler')
+    sampler_node.name = 'sampler_node'
+    sampler_node.label = 'Sampler' + texture_param.param_id.name.split('Texture')[1]
+    sampler_node.location = (texture_node.location[0] - 600, texture_node.location[1])
+    sampler_node.width = 500
+
+    visible_indices.update(socket_index.get_indices(sampler_entry.param_id.name))
+    set_sampler_node_values(sampler_node, sampler_entry.data)
+
+    links.new(sampler_node.inputs['UV Input'], uv_map_node.outputs[0])
+    links.new(texture_node.inputs[0], sampler_node.outputs[0])
+    links.new(matched_rgb_input, texture_node.outputs['Color'])
+    links.new(matched_alpha_input, texture_node.outputs['Alpha'])
+
+    return visible_indices
+
+
+def get_linked_node(input):
+    return input.links[0].from_node if input.is_linked else None
+
+
+def get_linked_texture_nodes(node_group_node):
+    '''
+    Returns a dict of texture param id like 'Texture0' to the image texture node linked to its RGB input.
+    '''
+    socket_index = material_instances.get_socket_index(node_group_node)
+    param_to_texture_node = {}
+    for param_id, fields in socket_index.param_to_fields.items():
+        if not param_id.startswith('Texture'):
+            continue
+        for i, field_name in fields:
+            if field_name != 'RGB':
+                continue
+            node = get_linked_node(node_group_node.inputs[i])
+            if node is not None and node.type == 'TEX_IMAGE':
+                param_to_texture_node[param_id] = node
+    return param_to_texture_node
+
+
+def remove_texture_nodes(blender_mat, texture_node):
+    # Remove the sampler and UV map nodes that only exist for this texture.
+    nodes = blender_mat.node_tree.nodes
+    sampler_node = get_linked_node(texture_node.inputs[0])
+    if sampler_node is not None and sampler_node.bl_idname == 'CustomNodeUltimateSampler':
+        uv_map_node = get_linked_node(sampler_node.inputs['UV Input'])
+        if uv_map_node is not None and uv_map_node.type == 'UVMAP':
+            nodes.remove(uv_map_node)
+        nodes.remove(sampler_node)
+    nodes.remove(texture_node)
+
+
+def create_color_set_nodes(blender_mat, node_group_node, shader_label):
+    '''
+    Creates vertex color nodes for the color sets required by the shader if the material doesn't have them already.
+    Returns the indices of the color set inputs.
+    '''
+    nodes = blender_mat.node_tree.nodes
+    links = blender_mat.node_tree.links
+    inputs = node_group_node.inputs
+    socket_index = material_instances.get_socket_index(node_group_node)
+    visible_indices = set()
 
     # Set up color sets.
     # Use the default values for non required attributes to be consistent between renderers.
     # Ignore the rendering accuracy of missing required attributes for now.
-    required_attributes = get_vertex_attributes(node_group_node, shader_name)
+    required_attributes = get_vertex_attributes(node_group_node, shader_label)
 
     def create_and_enable_color_set(name, row):
-        enable_inputs(node_group_node, name)
+        visible_indices.update(socket_index.get_indices(name))
+        if nodes.get(name) is not None:
+            return
 
         color_set_node = nodes.new('ShaderNodeVertexColor')
         color_set_node.name = name
@@ -860,8 +1298,8 @@ def setup_blender_mat(blender_mat, material_label, ssbh_matl: ssbh_data_py.matl_
         # Vertically stack color sets with even spacing.
         color_set_node.location = (-500, 150 - row * 150)
 
-        links.new(node_group_node.inputs[f'{name} RGB'], color_set_node.outputs['Color'])
-        links.new(node_group_node.inputs[f'{name} Alpha'], color_set_node.outputs['Alpha'])
+        links.new(inputs[f'{name} RGB'], color_set_node.outputs['Color'])
+        links.new(inputs[f'{name} Alpha'], color_set_node.outputs['Alpha'])
 
     if 'colorSet1' in required_attributes:
         create_and_enable_color_set('colorSet1', 0)
@@ -869,19 +1307,8 @@ def setup_blender_mat(blender_mat, material_label, ssbh_matl: ssbh_data_py.matl_
     if 'colorSet5' in required_attributes:
         create_and_enable_color_set('colorSet5', 1)
 
-def read_nuhlpb_json(nuhlpb_path) -> str:
-    import subprocess
-    ssbh_lib_json_exe_path = get_ssbh_lib_json_exe_path()
-    output_json_path = nuhlpb_path + '.json'
-    try:
-        subprocess.run([ssbh_lib_json_exe_path, nuhlpb_path, output_json_path], capture_output=True, check=True)
-    except:
-        pass # Lol
-    
-    nuhlpb_json = None
-    with open(output_json_path) as f:
-        nuhlpb_json = json.load(f)
-    return nuhlpb_json
+    return visible_indices
+
 
 def create_new_empty(name, parent, specified_collection=None) -> bpy.types.Object:
     empty = bpy.data.objects.new('empty', None)
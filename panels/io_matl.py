@@ -1,10 +1,13 @@
+import os
+import time
+
 import bpy
 from bpy.types import FileSelectParams
-import subprocess, json
-from ..operators import master_shader
 
-def get_ssbh_lib_json_path():
-    return bpy.context.scene.ssbh_lib_json_path
+from .. import ssbh_data_py
+from ..operators import master_shader, shader_db
+from . import import_model, matl_diff, texture_cache
+
 def get_numatb_path():
     return bpy.context.scene.numatb_file_path
 def get_io_matl_armature():
@@ -20,21 +23,9 @@ class MaterialPanel(bpy.types.Panel):
     def draw(self, context):
         layout = self.layout
         layout.use_property_split = False
-        
-        row = layout.row(align=True)
-        row.label(text='Select ssbh_lib_json.exe')
-        
-        row = layout.row(align=True)
-        row.prop(context.scene, 'ssbh_lib_json_path', icon='FILE')
 
         row = layout.row(align=True)
-        row.operator('sub.ssbh_lib_json_file_selector', icon='ZOOM_ALL', text='Browse for ssbh_lib_json.exe')
-
-        if not context.scene.ssbh_lib_json_path:
-            return
-
-        row = layout.row(align=True)
-        row.label(text='Nice, now select the .numatb file to import')
+        row.label(text='Select the .numatb file to import')
 
         row = layout.row(align=True)
         row.prop(context.scene, 'numatb_file_path', icon='FILE')
@@ -60,199 +51,151 @@ class MaterialPanel(bpy.types.Panel):
 class MatlReimporter(bpy.types.Operator):
     bl_idname = 'sub.matl_reimporter'
     bl_label = 'Material Reimporter'
+    bl_description = 'Update the materials from the .numatb. Textures are loaded from the folder containing the .numatb, and textures not found there reuse the images already in the scene'
 
     def execute(self, context):
-        reimport_materials()
+        updated_count, unchanged_count = reimport_materials(get_numatb_path(), get_io_matl_armature())
+        self.report({'INFO'}, f'Updated {updated_count} materials ({unchanged_count} unchanged)')
         return {'FINISHED'}
 
-def reimport_materials():
+def get_armature_materials(armature):
+    materials = []
+    for child in armature.children:
+        if child.type == 'MESH':
+            for slot in child.material_slots:
+                if slot.material is not None and slot.material not in materials:
+                    materials.append(slot.material)
+    return materials
+
+def get_material_label(material):
+    # Blender adds suffixes like '.001' to duplicate names, so prefer the name stored in the shader node.
+    node_group_node = import_model.get_shader_node(material)
+    if node_group_node is not None:
+        material_name_input = node_group_node.inputs.get('Material Name')
+        if material_name_input is not None and material_name_input.default_value:
+            return material_name_input.default_value
+    return material.name
+
+def find_existing_image(texture_name, materials):
+    '''
+    Returns an image already in the scene for the texture or None.
+    Texture nodes created by the importer are labeled with the texture name.
+    '''
+    for material in materials:
+        if material.node_tree is None:
+            continue
+        for node in material.node_tree.nodes:
+            if node.bl_idname == 'ShaderNodeTexImage' and node.label == texture_name and node.image is not None:
+                return node.image
+    # Imported images are named after their .png file.
+    file_name = os.path.basename(import_model.get_texture_file_path('', texture_name))
+    return bpy.data.images.get(file_name)
+
+class ReimportImages:
     '''
-    Plan is:
-        run ssbh_lib_json to convert .numatb to .json
-        parse json
-        create master shader if not already made
-        for material belonging to armature, match blender material name to parsed material,
-        , and then delete the existing material nodes,
-        , and then create a copy of the master shader for this material,
-        , and then hide the unneeded sockets of that shader,
-        , and then create texture nodes,
-        , and lastly link it all up.
+    The images for the textures used by the changed materials.
+    This replaces the dict from import_material_images, so unchanged materials don't read any textures.
+    The .numatb may not be in the model folder,
+    so textures without a file in dir reuse the images already in the scene when possible.
     '''
-    ssbh_lib_json_path = get_ssbh_lib_json_path()
-    numatb_path = get_numatb_path()
-    output_json_path = numatb_path + '.json'
+    def __init__(self, dir, materials):
+        self.dir = dir
+        self.materials = materials
+        self.texture_name_to_image = {}
+
+    def __getitem__(self, texture_name):
+        # Materials with edited texture nodes are set up again and may need textures that weren't loaded yet.
+        if texture_name not in self.texture_name_to_image:
+            self.load([texture_name])
+        return self.texture_name_to_image[texture_name]
+
+    def load(self, texture_names):
+        '''
+        Loads the images for all of the texture names at once, so the texture cache can decode the files in parallel.
+        '''
+        texture_name_to_path = {}
+        for texture_name in texture_names:
+            if texture_name in self.texture_name_to_image:
+                continue
+
+            path = import_model.get_texture_file_path(self.dir, texture_name)
+            if not os.path.isfile(texture_cache.get_source_path(path)):
+                image = find_existing_image(texture_name, self.materials)
+                if image is not None:
+                    self.texture_name_to_image[texture_name] = image
+                    continue
+
+            texture_name_to_path[texture_name] = path
+
+        if len(texture_name_to_path) == 0:
+            return
 
-    # Run ssbh_lib_json
-    subprocess.run([ssbh_lib_json_path, numatb_path])
+        # Missing textures without an existing image still use placeholder images like model import.
+        path_to_image = texture_cache.get_texture_cache().load_images(texture_name_to_path.values())
+        for texture_name, path in texture_name_to_path.items():
+            self.texture_name_to_image[texture_name] = path_to_image[path]
 
-    # Load Outputed Json
-    numatb_json = None
-    with open(output_json_path) as f:
-        numatb_json = json.load(f)
-    
-    # Parse Json
-    mat_entries = numatb_json['data']['Matl']['entries']
+def reimport_materials(numatb_path, armature):
+    '''
+    Reads the .numatb and updates the materials of the armature's meshes with matching material labels.
+    This uses the same code as model import, so existing materials are updated in place
+    and new materials are set up the same way as importing the model again.
+    Materials are compared with the .numatb first, so only the changed params are applied
+    and only the images for changed textures are loaded.
+    Returns the number of updated and unchanged materials.
+    '''
+    start = time.time()
+
+    ssbh_matl = ssbh_data_py.matl_data.read_matl(numatb_path)
+    matl_index = import_model.MatlIndex(ssbh_matl)
 
-    materials = []
-    armature = get_io_matl_armature()
-    for child in armature.children:
-        if child.type == 'MESH':
-            mat = child.material_slots[0].material
-            if mat not in materials:
-                materials.append(mat)
-    
     # Make Master Shader if its not already made
-    master_shader.create_master_shader() 
+    master_shader.create_master_shader()
+    shader_db.get_shader_database().prefetch([entry.shader_label for entry in ssbh_matl.entries])
 
-    #find matching mat
+    materials = get_armature_materials(armature)
+
+    # Diff every material before updating any of them, so the changed textures can be loaded together.
+    material_updates = []
+    texture_names = set()
+    unchanged_count = 0
     for material in materials:
-        entry = None
-        for mat_entry in mat_entries:
-            if mat_entry['material_label'] == material.name:
-                entry = mat_entry
+        label = get_material_label(material)
+        entry = matl_index.get_entry(label)
         if entry is None:
             print('No matching material found for material %s, leaving as-is' % (material.name))
             continue
-        print(entry['shader_label'])
-
-        # purge time (except texture nodes)
-        nodes = material.node_tree.nodes
-        texture_nodes = []
-        for node in nodes:
-            if node.type == 'TEX_IMAGE':
-                texture_nodes.append(node)
-            else:
-                nodes.remove(node)
-
-        # Clone Master Shader
-        master_shader_name = master_shader.get_master_shader_name()
-        master_node_group = bpy.data.node_groups.get(master_shader_name)
-        clone_group = master_node_group.copy()
-        
-        # Setup Clone
-        clone_group.name = entry['shader_label']
-
-        # Add our new nodes
-        node_group_node = nodes.new('ShaderNodeGroup')
-        node_group_node.width = 600
-        node_group_node.location = (-300, 300)
-        node_group_node.node_tree = clone_group
-        for input in node_group_node.inputs:
-            input.hide = True
-        shader_label = node_group_node.inputs['Shader Label']
-        shader_label.hide = False
-        shader_label.default_value = entry['shader_label']
-        material_label = node_group_node.inputs['Material Name']
-        material_label.hide = False
-        material_label.default_value = entry['material_label']
-
-        attributes = entry['attributes']['Attributes16']
-        for attribute in attributes:
-            param_id = attribute['param_id']
-            for input in node_group_node.inputs:
-                if input.name.split(' ')[0] == param_id:
-                    input.hide = False
-            if 'BlendState0' in param_id:
-                blend_state = attribute['param']['data']['BlendState']
-                source_color = blend_state['source_color']
-                unk2 = blend_state['unk2']
-                destination_color = blend_state['destination_color']
-                unk4 = blend_state['unk4']
-                unk5 = blend_state['unk5']
-                unk6 = blend_state['unk6']
-                unk7 = blend_state['unk7']
-                unk8 = blend_state['unk8']
-                unk9 = blend_state['unk9']
-                unk10 = blend_state['unk10']
-                blend_state_inputs = []
-                for input in node_group_node.inputs:
-                    if input.name.split(' ')[0] == 'BlendState0':
-                        blend_state_inputs.append(input)
-                for input in blend_state_inputs:
-                    field_name = input.name.split(' ')[1]
-                    if field_name == 'Field1':
-                        input.default_value = source_color
-                    if field_name == 'Field2':
-                        input.default_value = unk2
-                    if field_name == 'Field3':
-                        input.default_value = destination_color
-                    if field_name == 'Field4':
-                        input.default_value = unk4
-                    if field_name == 'Field5':
-                        input.default_value = unk5
-                    if field_name == 'Field6':
-                        input.default_value = unk6
-                    if field_name == 'Field7':
-                        input.default_value = unk7
-                    if field_name == 'Field8':
-                        input.default_value = unk8
-                    if field_name == 'Field9':
-                        input.default_value = unk9
-                    if field_name == 'Field10':
-                        input.default_value = unk10
-
-            if 'CustomBoolean' in param_id:
-                bool_value = attribute['param']['data']['Boolean']
-                input = node_group_node.inputs.get(param_id)
-                input.default_value = bool_value
-
-            if 'CustomFloat' in param_id:
-                float_value = attribute['param']['data']['Float']
-                input = node_group_node.inputs.get(param_id)
-                input.default_value = float_value
-            
-            if 'CustomVector' in param_id:
-                vector4 = attribute['param']['data']['Vector4']
-                x = vector4['x']
-                y = vector4['y']
-                z = vector4['z']
-                w = vector4['w']
-                inputs = []
-                for input in node_group_node.inputs:
-                    if input.name.split(' ')[0] == param_id:
-                        inputs.append(input)
-                if len(inputs) == 1:
-                    inputs[0].default_value = (x,y,z,w)
-                elif len(inputs) == 2:
-                    for input in inputs:
-                        field = input.name.split(' ')[1]
-                        if field == 'RGB':
-                            input.default_value = (x,y,z,1)
-                        if field == 'Alpha':
-                            input.default_value = w
-                else:
-                    for input in inputs:
-                        axis = input.name.split(' ')[1]
-                        if axis == 'X':
-                            input.default_value = x
-                        if axis == 'Y':
-                            input.default_value = y
-                        if axis == 'Z':
-                            input.default_value = z
-                        if axis == 'W':
-                            input.default_value = w 
-            
-        
-        
 
-        
+        node_group_node = import_model.get_shader_node(material)
+        if node_group_node is None:
+            # Materials not created by the importer don't have values to compare.
+            material_updates.append((material, label, None, None))
+            texture_names.update(param.data for param in entry.textures)
+            continue
 
+        diff = matl_diff.diff_material(node_group_node, entry)
+        if diff.is_empty():
+            unchanged_count += 1
+            continue
 
+        material_updates.append((material, label, node_group_node, diff))
+        texture_names.update(matl_diff.get_diff_texture_names(diff, entry))
 
+    texture_name_to_image_dict = ReimportImages(os.path.dirname(numatb_path), materials)
+    texture_name_to_image_dict.load(texture_names)
 
-class SsbhLibJsonFileSelector(bpy.types.Operator):
-    bl_idname = 'sub.ssbh_lib_json_file_selector'
-    bl_label = 'File Selector'
+    for material, label, node_group_node, diff in material_updates:
+        if diff is None:
+            import_model.update_blender_mat(material, label, matl_index, texture_name_to_image_dict)
+        else:
+            print(f'{material.name}: {diff.summary()}')
+            matl_diff.apply_material_diff(material, node_group_node, diff, label, matl_index, texture_name_to_image_dict)
 
-    filepath = bpy.props.StringProperty(subtype='FILE_PATH')
-    def execute(self, context):
-        print(self.filepath)
-        context.scene.ssbh_lib_json_path = self.filepath
-        return {'FINISHED'}
+    updated_count = len(material_updates)
+    end = time.time()
+    print(f'Reimported materials in {end - start} seconds ({updated_count} updated, {unchanged_count} unchanged)')
+    return updated_count, unchanged_count
 
-    def invoke(self, context, event):
-        context.window_manager.fileselect_add(self)
-        return {'RUNNING_MODAL'}
 
 class NumatbFileSelector(bpy.types.Operator):
     bl_idname = 'sub.numatb_file_selector'
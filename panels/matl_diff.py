@@ -0,0 +1,255 @@
+import math
+
+from ..operators import material_inputs, material_instances
+from . import import_model
+
+
+class MaterialDiff:
+    '''
+    The params that differ between a material's shader node group and a MatlEntryData.
+    Params are identified by their param id like 'CustomVector0' or 'Texture4'.
+    '''
+    def __init__(self, shader_label_changed, added, removed, changed):
+        self.shader_label_changed = shader_label_changed
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def is_empty(self):
+        return not self.shader_label_changed and not self.added and not self.removed and not self.changed
+
+    def changes_textures(self):
+        # Texture nodes need to be created or removed for added or removed textures.
+        return any(param_id.startswith('Texture') or param_id.startswith('Sampler') for param_id in self.added + self.removed)
+
+    def summary(self):
+        parts = []
+        if self.shader_label_changed:
+            parts.append('changed shader')
+        if self.added:
+            parts.append(f'added {", ".join(self.added)}')
+        if self.removed:
+            parts.append(f'removed {", ".join(self.removed)}')
+        if self.changed:
+            parts.append(f'changed {", ".join(self.changed)}')
+        return '; '.join(parts) if parts else 'no changes'
+
+
+def get_sampler_values(sampler_node):
+    return (
+        sampler_node.wrap_s,
+        sampler_node.wrap_t,
+        sampler_node.wrap_r,
+        sampler_node.min_filter,
+        sampler_node.mag_filter,
+        sampler_node.max_anisotropy if sampler_node.anisotropic_filtering else None,
+        tuple(sampler_node.border_color),
+        sampler_node.lod_bias,
+    )
+
+
+def get_sampler_data_values(sampler_data):
+    return (
+        sampler_data.wraps.name,
+        sampler_data.wrapt.name,
+        sampler_data.wrapr.name,
+        sampler_data.min_filter.name,
+        sampler_data.mag_filter.name,
+        sampler_data.max_anisotropy.name if sampler_data.max_anisotropy else None,
+        tuple(sampler_data.border_color),
+        sampler_data.lod_bias,
+    )
+
+
+def get_node_values(node_group_node):
+    '''
+    Returns a dict of param id to a comparable value for each param with a visible input.
+    This reads the same inputs and nodes as the exporter.
+    '''
+    socket_index = material_instances.get_socket_index(node_group_node)
+    hidden = material_instances.get_hidden_inputs(node_group_node)
+    inputs = node_group_node.inputs
+
+    values = {}
+    for param_id, fields in socket_index.param_to_fields.items():
+        field_inputs = {field: inputs[i] for i, field in fields if not hidden[i]}
+        if len(field_inputs) == 0:
+            continue
+
+        if param_id.startswith('BlendState'):
+            if 'Field1' in field_inputs:
+                values[param_id] = (
+                    field_inputs['Field1'].default_value,
+                    get_field_value(inputs, fields, 'Field3'),
+                    get_field_value(inputs, fields, 'Field7'),
+                )
+        elif param_id.startswith('RasterizerState'):
+            if 'Field1' in field_inputs:
+                values[param_id] = (
+                    field_inputs['Field1'].default_value,
+                    get_field_value(inputs, fields, 'Field2'),
+                    get_field_value(inputs, fields, 'Field3'),
+                )
+        elif param_id.startswith('CustomBoolean') or param_id.startswith('CustomFloat'):
+            values[param_id] = inputs[fields[0][0]].default_value
+        elif param_id in material_inputs.vec4_param_to_inputs:
+            values[param_id] = get_vector_value(inputs, socket_index, param_id)
+        elif param_id.startswith('Texture'):
+            if 'RGB' not in field_inputs:
+                continue
+            texture_node = import_model.get_linked_node(field_inputs['RGB'])
+            values[param_id] = texture_node.label if texture_node is not None else None
+
+            sampler_id = 'Sampler' + param_id.split('Texture')[1]
+            if sampler_id not in socket_index.param_to_fields:
+                continue
+            sampler_node = import_model.get_linked_node(texture_node.inputs[0]) if texture_node is not None else None
+            if sampler_node is not None and sampler_node.bl_idname == 'CustomNodeUltimateSampler':
+                values[sampler_id] = get_sampler_values(sampler_node)
+            else:
+                values[sampler_id] = None
+
+    return values
+
+
+def get_field_value(inputs, fields, field_name):
+    for i, field in fields:
+        if field == field_name:
+            return inputs[i].default_value
+    return None
+
+
+def get_vector_value(inputs, socket_index, param_id):
+    vector_inputs = [inputs[socket_index.name_to_index[name]] for _, name, _ in material_inputs.vec4_param_to_inputs[param_id]]
+    # Assume inputs are RGBA, RGB/A, or X/Y/Z/W.
+    if len(vector_inputs) == 1:
+        return tuple(vector_inputs[0].default_value)
+    elif len(vector_inputs) == 2:
+        return tuple(vector_inputs[0].default_value)[:3] + (vector_inputs[1].default_value,)
+    else:
+        return tuple(input.default_value for input in vector_inputs)
+
+
+def get_entry_values(entry, socket_index):
+    '''
+    Returns a dict of param id to a comparable value for each param in the entry that has inputs in the node group.
+    '''
+    values = {}
+    for param in entry.blend_states:
+        blend_state = param.data
+        values[param.param_id.name] = (blend_state.source_color.name, blend_state.destination_color.name, blend_state.alpha_sample_to_coverage)
+
+    for param in entry.rasterizer_states:
+        rasterizer_state = param.data
+        values[param.param_id.name] = (rasterizer_state.fill_mode.name, rasterizer_state.cull_mode.name, rasterizer_state.depth_bias)
+
+    for param in [*entry.booleans, *entry.floats]:
+        values[param.param_id.name] = param.data
+
+    for param in entry.vectors:
+        if param.param_id.name in material_inputs.vec4_param_to_inputs:
+            values[param.param_id.name] = tuple(param.data)
+
+    for param in entry.textures:
+        values[param.param_id.name] = param.data
+
+    for param in entry.samplers:
+        values[param.param_id.name] = get_sampler_data_values(param.data)
+
+    return {param_id: value for param_id, value in values.items() if param_id in socket_index.param_to_fields}
+
+
+def values_equal(a, b):
+    if isinstance(a, tuple) or isinstance(b, tuple):
+        if not isinstance(a, tuple) or not isinstance(b, tuple) or len(a) != len(b):
+            return False
+        return all(values_equal(x, y) for x, y in zip(a, b))
+    # Blender stores floats with single precision.
+    if isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None:
+            return False
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-6)
+    return a == b
+
+
+def diff_material(node_group_node, entry):
+    '''
+    Compares the current values of the material's shader node group with the entry.
+    '''
+    socket_index = material_instances.get_socket_index(node_group_node)
+    shader_label_changed = node_group_node.inputs['Shader Label'].default_value != entry.shader_label
+
+    node_values = get_node_values(node_group_node)
+    # Samplers are only exported with their texture.
+    entry_values = get_entry_values(entry, socket_index)
+    entry_values = {
+        param_id: value for param_id, value in entry_values.items()
+        if not param_id.startswith('Sampler') or 'Texture' + param_id.split('Sampler')[1] in entry_values
+    }
+
+    added = [param_id for param_id in entry_values if param_id not in node_values]
+    removed = [param_id for param_id in node_values if param_id not in entry_values]
+    changed = [
+        param_id for param_id, value in entry_values.items()
+        if param_id in node_values and not values_equal(node_values[param_id], value)
+    ]
+    return MaterialDiff(shader_label_changed, sorted(added), sorted(removed), sorted(changed))
+
+
+def get_diff_texture_names(diff, entry):
+    '''
+    Returns the names of the textures that apply_material_diff assigns to image texture nodes.
+    '''
+    if diff.shader_label_changed or diff.changes_textures():
+        # The whole material is updated.
+        return {param.data for param in entry.textures}
+    return {param.data for param in entry.textures if param.param_id.name in diff.changed}
+
+
+def apply_material_diff(blender_mat, node_group_node, diff, material_label, matl_index, texture_name_to_image_dict):
+    '''
+    Updates only the inputs and nodes for the params in the diff.
+    Changes to the shader or the set of textures update the whole material in place instead.
+    '''
+    if diff.is_empty():
+        return
+
+    if diff.shader_label_changed or diff.changes_textures():
+        import_model.update_blender_mat(blender_mat, material_label, matl_index, texture_name_to_image_dict)
+        return
+
+    params = matl_index.get_params(material_label)
+    socket_index = material_instances.get_socket_index(node_group_node)
+    param_to_texture_node = None
+
+    shown_indices = set()
+    for param_id in diff.added + diff.changed:
+        param = params[param_id]
+        if param_id.startswith('Texture') or param_id.startswith('Sampler'):
+            if param_to_texture_node is None:
+                param_to_texture_node = import_model.get_linked_texture_nodes(node_group_node)
+
+            texture_id = 'Texture' + param_id.split('Sampler')[1] if param_id.startswith('Sampler') else param_id
+            texture_node = param_to_texture_node.get(texture_id)
+            sampler_node = import_model.get_linked_node(texture_node.inputs[0]) if texture_node is not None else None
+            if texture_node is None or sampler_node is None:
+                # The texture nodes were edited or deleted, so set up the textures again.
+                import_model.update_blender_mat(blender_mat, material_label, matl_index, texture_name_to_image_dict)
+                return
+
+            if param_id.startswith('Texture'):
+                texture_node.image = texture_name_to_image_dict[param.data]
+                texture_node.name = param.data
+                texture_node.label = param.data
+                import_model.set_texture_colorspace(texture_node, param_id)
+            else:
+                import_model.set_sampler_node_values(sampler_node, param.data)
+            shown_indices.update(socket_index.get_indices(param_id))
+        else:
+            shown_indices.update(import_model.set_param_values(node_group_node, socket_index, param))
+
+    if diff.added or diff.removed:
+        hidden_indices = set()
+        for param_id in diff.removed:
+            hidden_indices.update(socket_index.get_indices(param_id))
+        material_instances.update_hidden_inputs(node_group_node, shown_indices, hidden_indices)
@@ -0,0 +1,202 @@
+'''
+Reading and writing for .nuhlpb helper bone files without running ssbh_lib_json.
+
+This file doesn't use any relative imports or Blender modules, so it can run outside of Blender.
+
+The data uses the same dict layout as the JSON from ssbh_lib_json like nuhlpb_json['data']['Hlpb']['aim_entries'].
+All values are little endian.
+    0x00: magic 'HBSS' and 0x40 as u32, padded to 0x10
+    0x10: magic 'BPLH'
+    0x14: major version, minor version as u16
+    0x18: aim entries, interpolation entries, list1, list2 as arrays
+Arrays are a relative offset and count as u64.
+Strings are a relative offset as u64 to null terminated UTF-8 bytes.
+Relative offsets are from the start of the offset itself.
+'''
+import struct
+
+HEADER_SIZE = 0x10
+ARRAY = struct.Struct('<qQ')
+STRING_OFFSET = struct.Struct('<q')
+
+AIM_STRINGS = ['name', 'aim_bone_name1', 'aim_bone_name2', 'aim_type1', 'aim_type2', 'target_bone_name1', 'target_bone_name2']
+AIM_VALUES = struct.Struct('<2i20f')
+AIM_ENTRY_SIZE = len(AIM_STRINGS) * STRING_OFFSET.size + AIM_VALUES.size
+
+INTERPOLATION_STRINGS = ['name', 'bone_name', 'root_bone_name', 'parent_bone_name', 'driver_bone_name']
+INTERPOLATION_VALUES = struct.Struct('<I3f4f4f3f3f')
+INTERPOLATION_ENTRY_SIZE = len(INTERPOLATION_STRINGS) * STRING_OFFSET.size + INTERPOLATION_VALUES.size
+
+
+def read_string(data, offset_position):
+    relative_offset, = STRING_OFFSET.unpack_from(data, offset_position)
+    if relative_offset == 0:
+        return ''
+    start = offset_position + relative_offset
+    end = data.index(b'\0', start)
+    return data[start:end].decode('utf-8')
+
+
+def read_array(data, offset_position):
+    '''
+    Returns the absolute offset and count of the array.
+    '''
+    relative_offset, count = ARRAY.unpack_from(data, offset_position)
+    return offset_position + relative_offset, count
+
+
+def read_vector(values, names):
+    return dict(zip(names, values))
+
+
+def parse_nuhlpb(data):
+    '''
+    Returns the dict for the .nuhlpb file data.
+    '''
+    if data[0:4] != b'HBSS' or data[HEADER_SIZE:HEADER_SIZE + 4] != b'BPLH':
+        raise ValueError('The file is not a .nuhlpb file')
+
+    major_version, minor_version = struct.unpack_from('<2H', data, HEADER_SIZE + 4)
+    arrays_position = HEADER_SIZE + 8
+
+    aim_entries = []
+    offset, count = read_array(data, arrays_position)
+    for i in range(count):
+        position = offset + i * AIM_ENTRY_SIZE
+        entry = {}
+        for j, name in enumerate(AIM_STRINGS):
+            entry[name] = read_string(data, position + j * STRING_OFFSET.size)
+        values = AIM_VALUES.unpack_from(data, position + len(AIM_STRINGS) * STRING_OFFSET.size)
+        for j, value in enumerate(values):
+            entry[f'unk{j + 1}'] = value
+        aim_entries.append(entry)
+
+    interpolation_entries = []
+    offset, count = read_array(data, arrays_position + ARRAY.size)
+    for i in range(count):
+        position = offset + i * INTERPOLATION_ENTRY_SIZE
+        entry = {}
+        for j, name in enumerate(INTERPOLATION_STRINGS):
+            entry[name] = read_string(data, position + j * STRING_OFFSET.size)
+        values = INTERPOLATION_VALUES.unpack_from(data, position + len(INTERPOLATION_STRINGS) * STRING_OFFSET.size)
+        entry['unk_type'] = values[0]
+        entry['aoi'] = read_vector(values[1:4], 'xyz')
+        entry['quat1'] = read_vector(values[4:8], 'xyzw')
+        entry['quat2'] = read_vector(values[8:12], 'xyzw')
+        entry['range_min'] = read_vector(values[12:15], 'xyz')
+        entry['range_max'] = read_vector(values[15:18], 'xyz')
+        interpolation_entries.append(entry)
+
+    lists = []
+    for i in range(2):
+        offset, count = read_array(data, arrays_position + (2 + i) * ARRAY.size)
+        lists.append(list(struct.unpack_from(f'<{count}i', data, offset)) if count > 0 else [])
+
+    hlpb = {
+        'major_version': major_version,
+        'minor_version': minor_version,
+        'aim_entries': aim_entries,
+        'interpolation_entries': interpolation_entries,
+        'list1': lists[0],
+        'list2': lists[1],
+    }
+    return {'data': {'Hlpb': hlpb}}
+
+
+def read_nuhlpb(path):
+    with open(path, 'rb') as f:
+        return parse_nuhlpb(f.read())
+
+
+class NuhlpbWriter:
+    '''
+    Writes each array's items followed by the strings for those items.
+    Offsets are written as placeholders and filled in once the position of their data is known.
+    '''
+    def __init__(self):
+        self.data = bytearray()
+
+    def align(self, alignment):
+        self.data.extend(b'\0' * (-len(self.data) % alignment))
+
+    def reserve(self, size):
+        position = len(self.data)
+        self.data.extend(b'\0' * size)
+        return position
+
+    def write_relative_offset(self, offset_position, target_position):
+        STRING_OFFSET.pack_into(self.data, offset_position, target_position - offset_position)
+
+    def write_strings(self, string_positions):
+        for offset_position, value in string_positions:
+            self.align(4)
+            self.write_relative_offset(offset_position, len(self.data))
+            self.data.extend(value.encode('utf-8') + b'\0')
+
+    def write_array(self, array_position, items, item_size, write_item):
+        if len(items) == 0:
+            ARRAY.pack_into(self.data, array_position, 0, 0)
+            return
+
+        self.align(8)
+        items_position = self.reserve(len(items) * item_size)
+        ARRAY.pack_into(self.data, array_position, items_position - array_position, len(items))
+
+        string_positions = []
+        for i, item in enumerate(items):
+            string_positions.extend(write_item(items_position + i * item_size, item))
+        self.write_strings(string_positions)
+
+
+def write_aim_entry(data, position, entry):
+    string_positions = [(position + i * STRING_OFFSET.size, entry[name]) for i, name in enumerate(AIM_STRINGS)]
+    values = [int(entry['unk1']), int(entry['unk2'])] + [float(entry[f'unk{i}']) for i in range(3, 22 + 1)]
+    AIM_VALUES.pack_into(data, position + len(AIM_STRINGS) * STRING_OFFSET.size, *values)
+    return string_positions
+
+
+def write_interpolation_entry(data, position, entry):
+    string_positions = [(position + i * STRING_OFFSET.size, entry[name]) for i, name in enumerate(INTERPOLATION_STRINGS)]
+    values = [int(entry['unk_type'])]
+    for name, components in [('aoi', 'xyz'), ('quat1', 'xyzw'), ('quat2', 'xyzw'), ('range_min', 'xyz'), ('range_max', 'xyz')]:
+        values.extend(float(entry[name][c]) for c in components)
+    INTERPOLATION_VALUES.pack_into(data, position + len(INTERPOLATION_STRINGS) * STRING_OFFSET.size, *values)
+    return string_positions
+
+
+def write_list_value(data, position, value):
+    struct.pack_into('<i', data, position, int(value))
+    # List values don't have any strings.
+    return []
+
+
+def build_nuhlpb(nuhlpb_json):
+    '''
+    Returns the .nuhlpb file data for the dict.
+    '''
+    hlpb = nuhlpb_json['data']['Hlpb']
+
+    writer = NuhlpbWriter()
+    writer.data.extend(struct.pack('<4sI', b'HBSS', 0x40))
+    writer.align(HEADER_SIZE)
+    writer.data.extend(b'BPLH')
+    writer.data.extend(struct.pack('<2H', hlpb['major_version'], hlpb['minor_version']))
+    arrays_position = writer.reserve(4 * ARRAY.size)
+
+    writer.write_array(arrays_position, hlpb['aim_entries'], AIM_ENTRY_SIZE,
+                       lambda position, entry: write_aim_entry(writer.data, position, entry))
+    writer.write_array(arrays_position + ARRAY.size, hlpb['interpolation_entries'], INTERPOLATION_ENTRY_SIZE,
+                       lambda position, entry: write_interpolation_entry(writer.data, position, entry))
+    for i, name in enumerate(['list1', 'list2']):
+        values = hlpb[name]
+        writer.write_array(arrays_position + (2 + i) * ARRAY.size, values, 4,
+                           lambda position, value: write_list_value(writer.data, position, value))
+
+    writer.align(4)
+    return bytes(writer.data)
+
+
+def write_nuhlpb(nuhlpb_json, path):
+    data = build_nuhlpb(nuhlpb_json)
+    with open(path, 'wb') as f:
+        f.write(data)
@@ -0,0 +1,570 @@
+'''
+Decoding for .nutexb textures, so models can be imported without converting their textures to .png first.
+
+This file doesn't use any relative imports or Blender modules, so it can run outside of Blender.
+
+The image data starts at the beginning of the file and uses the Tegra X1 block linear layout.
+The footer is the last 0x70 bytes of the file.
+    0x00: magic ' XNT'
+    0x04: name as a null terminated string
+    0x44: width, height, depth as u32
+    0x50: image format as u16
+    0x58: mipmap count as u32
+    0x60: layer count as u32
+    0x64: image data size as u32
+    0x68: magic ' XET'
+Only the first mipmap of each layer is decoded.
+Cube maps have 6 layers, which are placed side by side in a single image.
+'''
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+FOOTER_SIZE = 0x70
+
+# Increment this when changing the decoded output to ignore previously cached results.
+DECODER_VERSION = 1
+
+# Maps the image format to (name, block width and height in pixels, bytes per block).
+FORMATS = {
+    0x0400: ('R8G8B8A8Unorm', 1, 4),
+    0x0405: ('R8G8B8A8Srgb', 1, 4),
+    0x0450: ('B8G8R8A8Unorm', 1, 4),
+    0x0455: ('B8G8R8A8Srgb', 1, 4),
+    0x0480: ('BC1Unorm', 4, 8),
+    0x0485: ('BC1Srgb', 4, 8),
+    0x04a0: ('BC3Unorm', 4, 16),
+    0x04a5: ('BC3Srgb', 4, 16),
+    0x0180: ('BC4Unorm', 4, 8),
+    0x0280: ('BC5Unorm', 4, 16),
+    0x04e0: ('BC7Unorm', 4, 16),
+    0x04e5: ('BC7Srgb', 4, 16),
+}
+
+GOB_WIDTH_IN_BYTES = 64
+GOB_HEIGHT = 8
+GOB_SIZE = GOB_WIDTH_IN_BYTES * GOB_HEIGHT
+
+
+class NutexbFooter:
+    def __init__(self, name, width, height, depth, image_format, mipmap_count, layer_count, data_size):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.image_format = image_format
+        self.mipmap_count = mipmap_count
+        self.layer_count = layer_count
+        self.data_size = data_size
+
+
+def read_footer(data):
+    if len(data) < FOOTER_SIZE:
+        raise ValueError('The file is too small to be a .nutexb file')
+
+    footer = data[-FOOTER_SIZE:]
+    if footer[0x00:0x04] != b' XNT' or footer[0x68:0x6C] != b' XET':
+        raise ValueError('The file is not a .nutexb file')
+
+    name = footer[0x04:0x44].split(b'\0')[0].decode('utf-8', errors='replace')
+    width, height, depth = struct.unpack_from('<3I', footer, 0x44)
+    image_format, = struct.unpack_from('<H', footer, 0x50)
+    mipmap_count, = struct.unpack_from('<I', footer, 0x58)
+    layer_count, data_size = struct.unpack_from('<2I', footer, 0x60)
+    return NutexbFooter(name, width, height, depth, image_format, mipmap_count, layer_count, data_size)
+
+
+def div_round_up(x, d):
+    return (x + d - 1) // d
+
+
+def block_height_mip0(height_in_blocks):
+    '''
+    Returns the height of a block in GOBs for the first mipmap.
+    '''
+    height_and_half = height_in_blocks + height_in_blocks // 2
+    if height_and_half >= 128:
+        return 16
+    elif height_and_half >= 64:
+        return 8
+    elif height_and_half >= 32:
+        return 4
+    elif height_and_half >= 16:
+        return 2
+    else:
+        return 1
+
+
+def deswizzle_surface(data, width_in_blocks, height_in_blocks, bytes_per_block, block_height):
+    '''
+    Converts the block linear data to rows of blocks with shape (height_in_blocks, width_in_blocks * bytes_per_block).
+    The lowest 4 bits of the swizzled address match the lowest 4 bits of x,
+    so the data is copied in 16 byte chunks instead of computing the address for every byte.
+    '''
+    width_in_bytes = width_in_blocks * bytes_per_block
+    width_in_gobs = div_round_up(width_in_bytes, GOB_WIDTH_IN_BYTES)
+    rows_per_block = GOB_HEIGHT * block_height
+    height_in_gob_blocks = div_round_up(height_in_blocks, rows_per_block)
+    surface_size = width_in_gobs * height_in_gob_blocks * GOB_SIZE * block_height
+
+    x = np.arange(0, width_in_gobs * GOB_WIDTH_IN_BYTES, 16)[np.newaxis, :]
+    y = np.arange(height_in_blocks)[:, np.newaxis]
+
+    gob_address = (y // rows_per_block) * GOB_SIZE * block_height * width_in_gobs \
+        + (x // GOB_WIDTH_IN_BYTES) * GOB_SIZE * block_height \
+        + ((y % rows_per_block) // GOB_HEIGHT) * GOB_SIZE
+    address = gob_address \
+        + ((x % 64) // 32) * 256 \
+        + ((y % 8) // 2) * 64 \
+        + ((x % 32) // 16) * 32 \
+        + (y % 2) * 16
+
+    source = np.zeros(surface_size, dtype=np.uint8)
+    available = np.frombuffer(data, dtype=np.uint8, count=min(len(data), surface_size))
+    source[:len(available)] = available
+
+    chunks = source.reshape(-1, 16)
+    rows = chunks[address // 16].reshape(height_in_blocks, -1)
+    return rows[:, :width_in_bytes]
+
+
+def expand_bits(values, bit_count):
+    '''
+    Scales unsigned values with bit_count bits to the range 0 to 255 by repeating the highest bits.
+    '''
+    values = values << (8 - bit_count)
+    return values | (values >> bit_count)
+
+
+def decode_bc1_blocks(blocks, always_opaque=False):
+    '''
+    Decodes (N, 8) BC1 blocks to (N, 16, 4) RGBA pixels.
+    '''
+    colors = blocks[:, 0:4].copy().view('<u2').astype(np.int32)
+    c0 = colors[:, 0]
+    c1 = colors[:, 1]
+
+    def rgb565(c):
+        return np.stack([
+            expand_bits((c >> 11) & 0x1f, 5),
+            expand_bits((c >> 5) & 0x3f, 6),
+            expand_bits(c & 0x1f, 5)
+        ], axis=-1)
+
+    e0 = rgb565(c0)
+    e1 = rgb565(c1)
+
+    # The block has transparent black instead of a fourth color if c0 <= c1.
+    four_colors = np.ones(len(blocks), dtype=bool) if always_opaque else c0 > c1
+    four_colors = four_colors[:, np.newaxis]
+
+    palette = np.full((len(blocks), 4, 4), 255, dtype=np.int32)
+    palette[:, 0, :3] = e0
+    palette[:, 1, :3] = e1
+    palette[:, 2, :3] = np.where(four_colors, (2 * e0 + e1) // 3, (e0 + e1) // 2)
+    palette[:, 3, :3] = np.where(four_colors, (e0 + 2 * e1) // 3, 0)
+    palette[:, 3, 3] = np.where(four_colors[:, 0], 255, 0)
+
+    indices = blocks[:, 4:8].copy().view('<u4').astype(np.int64)
+    indices = (indices >> (2 * np.arange(16))) & 0x3
+
+    return np.take_along_axis(palette, indices[:, :, np.newaxis], axis=1).astype(np.uint8)
+
+
+def decode_bc4_blocks(blocks):
+    '''
+    Decodes (N, 8) BC4 blocks to (N, 16) single channel values.
+    BC3 uses the same encoding for its alpha channel.
+    '''
+    a0 = blocks[:, 0].astype(np.int32)[:, np.newaxis]
+    a1 = blocks[:, 1].astype(np.int32)[:, np.newaxis]
+
+    # Interpolate 6 values if a0 > a1 and 4 values with 0 and 255 otherwise.
+    k = np.arange(2, 8)
+    eight_values = ((8 - k) * a0 + (k - 1) * a1) // 7
+    six_values = ((6 - k) * a0 + (k - 1) * a1) // 5
+    six_values[:, 4] = 0
+    six_values[:, 5] = 255
+
+    palette = np.concatenate([a0, a1, np.where(a0 > a1, eight_values, six_values)], axis=1)
+
+    bits = np.zeros(len(blocks), dtype=np.int64)
+    for i in range(6):
+        bits |= blocks[:, 2 + i].astype(np.int64) << (8 * i)
+    indices = (bits[:, np.newaxis] >> (3 * np.arange(16))) & 0x7
+
+    return np.take_along_axis(palette, indices, axis=1).astype(np.uint8)
+
+
+def decode_bc3_blocks(blocks):
+    pixels = decode_bc1_blocks(blocks[:, 8:16], always_opaque=True)
+    pixels[:, :, 3] = decode_bc4_blocks(blocks[:, 0:8])
+    return pixels
+
+
+def decode_bc4_rgba_blocks(blocks):
+    values = decode_bc4_blocks(blocks)
+    pixels = np.full((len(blocks), 16, 4), 255, dtype=np.uint8)
+    pixels[:, :, 0] = values
+    pixels[:, :, 1] = values
+    pixels[:, :, 2] = values
+    return pixels
+
+
+def decode_bc5_blocks(blocks):
+    pixels = np.zeros((len(blocks), 16, 4), dtype=np.uint8)
+    pixels[:, :, 0] = decode_bc4_blocks(blocks[:, 0:8])
+    pixels[:, :, 1] = decode_bc4_blocks(blocks[:, 8:16])
+    pixels[:, :, 3] = 255
+    return pixels
+
+
+# Each partition is a bitmask of the pixels in the second subset.
+BC7_PARTITIONS2 = [
+    0xcccc, 0x8888, 0xeeee, 0xecc8, 0xc880, 0xfeec, 0xfec8, 0xec80,
+    0xc800, 0xffec, 0xfe80, 0xe800, 0xffe8, 0xff00, 0xfff0, 0xf000,
+    0xf710, 0x008e, 0x7100, 0x08ce, 0x008c, 0x7310, 0x3100, 0x8cce,
+    0x088c, 0x3110, 0x6666, 0x366c, 0x17e8, 0x0ff0, 0x718e, 0x399c,
+    0xaaaa, 0xf0f0, 0x5a5a, 0x33cc, 0x3c3c, 0x55aa, 0x9696, 0xa55a,
+    0x73ce, 0x13c8, 0x324c, 0x3bdc, 0x6996, 0xc33c, 0x9966, 0x0660,
+    0x0272, 0x04e4, 0x4e40, 0x2720, 0xc936, 0x936c, 0x39c6, 0x639c,
+    0x9336, 0x9cc6, 0x817e, 0xe718, 0xccf0, 0x0fcc, 0x7744, 0xee22,
+]
+
+# Each partition is the subset for each of the 16 pixels.
+BC7_PARTITIONS3 = [
+    '0011001102212222', '0001001122112221', '0000200122112211', '0222002200110111',
+    '0000000011221122', '0011001100220022', '0022002211111111', '0011001122112211',
+    '0000000011112222', '0000111111112222', '0000111122222222', '0012001200120012',
+    '0112011201120112', '0122012201220122', '0011011211221222', '0011200122002220',
+    '0001001101121122', '0111001120012200', '0000112211221122', '0022002200221111',
+    '0111011102220222', '0001000122212221', '0000001101220122', '0000110022102210',
+    '0122012200110000', '0012001211222222', '0110122112210110', '0000011012211221',
+    '0022110211020022', '0110011020022222', '0011012201220011', '0000200022112221',
+    '0000000211221222', '0222002200120011', '0011001200220222', '0120012001200120',
+    '0000111122220000', '0120120120120120', '0120201212010120', '0011220011220011',
+    '0011112222000011', '0101010122222222', '0000000021212121', '0022112200221122',
+    '0022001100220011', '0220122102201221', '0101222222220101', '0000212121212121',
+    '0101010101012222', '0222011102220111', '0002111200021112', '0000211221122112',
+    '0222011101110222', '0002111211120002', '0110011001102222', '0000000021122112',
+    '0110011022222222', '0022001100110022', '0022112211220022', '0000000000002112',
+    '0002000100020001', '0222122202221222', '0101222222222222', '0111201122012220',
+]
+
+# The pixel index of the second subset's anchor for each 2 subset partition.
+BC7_ANCHORS2 = [
+    15, 15, 15, 15, 15, 15, 15, 15,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    15, 2, 8, 2, 2, 8, 8, 15,
+    2, 8, 2, 2, 8, 8, 2, 2,
+    15, 15, 6, 8, 2, 8, 15, 15,
+    2, 8, 2, 2, 2, 15, 15, 6,
+    6, 2, 6, 8, 15, 15, 2, 2,
+    15, 15, 15, 15, 15, 2, 2, 15,
+]
+
+# The pixel indices of the second and third subsets' anchors for each 3 subset partition.
+BC7_ANCHORS3_2 = [
+    3, 3, 15, 15, 8, 3, 15, 15,
+    8, 8, 6, 6, 6, 5, 3, 3,
+    3, 3, 8, 15, 3, 3, 6, 10,
+    5, 8, 8, 6, 8, 5, 15, 15,
+    8, 15, 3, 5, 6, 10, 8, 15,
+    15, 3, 15, 5, 15, 15, 15, 15,
+    3, 15, 5, 5, 5, 8, 5, 10,
+    5, 10, 8, 13, 15, 12, 3, 3,
+]
+
+BC7_ANCHORS3_3 = [
+    15, 8, 8, 3, 15, 15, 3, 8,
+    15, 15, 15, 15, 15, 15, 15, 8,
+    15, 8, 15, 3, 15, 8, 15, 8,
+    3, 15, 6, 10, 15, 15, 10, 8,
+    15, 3, 15, 10, 10, 8, 9, 10,
+    6, 15, 8, 15, 3, 6, 6, 8,
+    15, 3, 15, 15, 15, 15, 15, 15,
+    15, 15, 15, 15, 3, 15, 15, 8,
+]
+
+BC7_WEIGHTS = {
+    2: np.array([0, 21, 43, 64]),
+    3: np.array([0, 9, 18, 27, 37, 46, 55, 64]),
+    4: np.array([0, 4, 9, 13, 17, 21, 26, 30, 34, 38, 43, 47, 51, 55, 60, 64]),
+}
+
+
+class Bc7Mode:
+    def __init__(self, subset_count, partition_bits, rotation_bits, index_selection_bits, color_bits, alpha_bits,
+                 endpoint_pbits, shared_pbits, index_bits, index_bits2):
+        self.subset_count = subset_count
+        self.partition_bits = partition_bits
+        self.rotation_bits = rotation_bits
+        self.index_selection_bits = index_selection_bits
+        self.color_bits = color_bits
+        self.alpha_bits = alpha_bits
+        self.endpoint_pbits = endpoint_pbits
+        self.shared_pbits = shared_pbits
+        self.index_bits = index_bits
+        self.index_bits2 = index_bits2
+
+
+BC7_MODES = [
+    Bc7Mode(3, 4, 0, 0, 4, 0, True, False, 3, 0),
+    Bc7Mode(2, 6, 0, 0, 6, 0, False, True, 3, 0),
+    Bc7Mode(3, 6, 0, 0, 5, 0, False, False, 2, 0),
+    Bc7Mode(2, 6, 0, 0, 7, 0, True, False, 2, 0),
+    Bc7Mode(1, 0, 2, 1, 5, 6, False, False, 2, 3),
+    Bc7Mode(1, 0, 2, 0, 7, 8, False, False, 2, 2),
+    Bc7Mode(1, 0, 0, 0, 7, 7, True, False, 4, 0),
+    Bc7Mode(2, 6, 0, 0, 5, 5, True, False, 2, 0),
+]
+
+
+def create_bc7_subset_tables():
+    '''
+    Returns arrays for the subset of each pixel and whether each pixel is an anchor
+    with shape (subset count, partition, pixel).
+    '''
+    subsets = np.zeros((4, 64, 16), dtype=np.int64)
+    anchors = np.zeros((4, 64, 16), dtype=bool)
+    anchors[:, :, 0] = True
+    for partition in range(64):
+        subsets[2, partition] = [(BC7_PARTITIONS2[partition] >> i) & 1 for i in range(16)]
+        anchors[2, partition, BC7_ANCHORS2[partition]] = True
+
+        subsets[3, partition] = [int(c) for c in BC7_PARTITIONS3[partition]]
+        anchors[3, partition, BC7_ANCHORS3_2[partition]] = True
+        anchors[3, partition, BC7_ANCHORS3_3[partition]] = True
+    return subsets, anchors
+
+
+BC7_SUBSETS, BC7_ANCHORS = create_bc7_subset_tables()
+
+
+class BitReader:
+    '''
+    Reads fields from (N, 128) arrays of bits in order starting from the least significant bit.
+    '''
+    def __init__(self, bits, offset):
+        self.bits = bits
+        self.offset = offset
+
+    def read(self, count):
+        values = np.zeros(len(self.bits), dtype=np.int64)
+        for i in range(count):
+            values |= self.bits[:, self.offset + i].astype(np.int64) << i
+        self.offset += count
+        return values
+
+    def read_indices(self, index_bits, is_anchor):
+        '''
+        Reads an index for each of the 16 pixels. Anchor indices omit their highest bit, which is always 0.
+        '''
+        widths = np.where(is_anchor, index_bits - 1, index_bits)
+        offsets = self.offset + np.cumsum(widths, axis=1) - widths
+
+        values = np.zeros(widths.shape, dtype=np.int64)
+        for i in range(index_bits):
+            positions = np.minimum(offsets + i, 127)
+            bit = np.take_along_axis(self.bits, positions, axis=1).astype(np.int64)
+            values |= np.where(i < widths, bit, 0) << i
+
+        # Indices always use the same total number of bits for a given mode.
+        self.offset += int(widths[0].sum()) if len(widths) > 0 else 0
+        return values
+
+
+def interpolate_bc7(e0, e1, indices, index_bits):
+    '''
+    Interpolates (N, 16, channels) endpoints with (N, 16) indices.
+    '''
+    weights = BC7_WEIGHTS[index_bits][indices][:, :, np.newaxis]
+    return ((64 - weights) * e0 + weights * e1 + 32) >> 6
+
+
+def decode_bc7_mode(bits, mode_index):
+    mode = BC7_MODES[mode_index]
+    block_count = len(bits)
+    reader = BitReader(bits, mode_index + 1)
+
+    partition = reader.read(mode.partition_bits)
+    rotation = reader.read(mode.rotation_bits)
+    index_selection = reader.read(mode.index_selection_bits)
+
+    endpoint_count = mode.subset_count * 2
+    channel_count = 4 if mode.alpha_bits > 0 else 3
+    endpoints = np.zeros((block_count, endpoint_count, 4), dtype=np.int64)
+    for channel in range(channel_count):
+        channel_bits = mode.alpha_bits if channel == 3 else mode.color_bits
+        for endpoint in range(endpoint_count):
+            endpoints[:, endpoint, channel] = reader.read(channel_bits)
+
+    bit_counts = np.array([mode.color_bits] * 3 + [mode.alpha_bits])
+    if mode.endpoint_pbits or mode.shared_pbits:
+        if mode.endpoint_pbits:
+            pbits = np.stack([reader.read(1) for _ in range(endpoint_count)], axis=1)
+        else:
+            # Both endpoints in a subset use the same p-bit.
+            pbits = np.repeat(np.stack([reader.read(1) for _ in range(mode.subset_count)], axis=1), 2, axis=1)
+        endpoints = (endpoints << 1) | pbits[:, :, np.newaxis]
+        bit_counts = bit_counts + 1
+
+    for channel in range(channel_count):
+        endpoints[:, :, channel] = expand_bits(endpoints[:, :, channel], bit_counts[channel])
+    if channel_count == 3:
+        endpoints[:, :, 3] = 255
+
+    subsets = BC7_SUBSETS[mode.subset_count][partition]
+    is_anchor = BC7_ANCHORS[mode.subset_count][partition]
+    indices = reader.read_indices(mode.index_bits, is_anchor)
+
+    # Select the endpoints for the subset of each pixel.
+    e0 = np.take_along_axis(endpoints, (subsets * 2)[:, :, np.newaxis], axis=1)
+    e1 = np.take_along_axis(endpoints, (subsets * 2 + 1)[:, :, np.newaxis], axis=1)
+
+    if mode.index_bits2 == 0:
+        pixels = interpolate_bc7(e0, e1, indices, mode.index_bits)
+    else:
+        # Modes 4 and 5 have separate indices for color and alpha.
+        indices2 = reader.read_indices(mode.index_bits2, is_anchor)
+        swap = index_selection[:, np.newaxis, np.newaxis] == 1
+        color = np.where(swap,
+                         interpolate_bc7(e0, e1, indices2, mode.index_bits2),
+                         interpolate_bc7(e0, e1, indices, mode.index_bits))
+        alpha = np.where(swap,
+                         interpolate_bc7(e0, e1, indices, mode.index_bits),
+                         interpolate_bc7(e0, e1, indices2, mode.index_bits2))
+        pixels = color
+        pixels[:, :, 3] = alpha[:, :, 3]
+
+        # Swap alpha with one of the color channels.
+        for channel in range(3):
+            rotated = rotation == channel + 1
+            swapped = pixels[rotated, :, channel].copy()
+            pixels[rotated, :, channel] = pixels[rotated, :, 3]
+            pixels[rotated, :, 3] = swapped
+
+    return pixels.astype(np.uint8)
+
+
+def decode_bc7_blocks(blocks):
+    '''
+    Decodes (N, 16) BC7 blocks to (N, 16, 4) RGBA pixels.
+    Blocks are decoded in groups with the same mode, so every block in a group has the same layout.
+    '''
+    bits = np.unpackbits(blocks, axis=1, bitorder='little')
+
+    # The mode is the number of zero bits before the first one bit.
+    modes = np.argmax(bits[:, :8], axis=1)
+    valid = bits[:, :8].any(axis=1)
+
+    # Invalid blocks decode to transparent black.
+    pixels = np.zeros((len(blocks), 16, 4), dtype=np.uint8)
+    for mode_index in range(8):
+        selected = np.nonzero(valid & (modes == mode_index))[0]
+        if len(selected) > 0:
+            pixels[selected] = decode_bc7_mode(bits[selected], mode_index)
+    return pixels
+
+
+BLOCK_DECODERS = {
+    'BC1': decode_bc1_blocks,
+    'BC3': decode_bc3_blocks,
+    'BC4': decode_bc4_rgba_blocks,
+    'BC5': decode_bc5_blocks,
+    'BC7': decode_bc7_blocks,
+}
+
+
+def decode_surface(rows, format_name, width, height):
+    '''
+    Decodes deswizzled rows of blocks to an RGBA image with shape (height, width, 4) and rows from top to bottom.
+    '''
+    if format_name.startswith('R8G8B8A8') or format_name.startswith('B8G8R8A8'):
+        pixels = rows.reshape(height, width, 4)
+        if format_name.startswith('B8G8R8A8'):
+            pixels = pixels[:, :, [2, 1, 0, 3]]
+        return np.ascontiguousarray(pixels)
+
+    height_in_blocks, width_in_bytes = rows.shape
+    block_size = 8 if format_name[:3] in ['BC1', 'BC4'] else 16
+    width_in_blocks = width_in_bytes // block_size
+
+    blocks = np.ascontiguousarray(rows).reshape(-1, block_size)
+    pixels = BLOCK_DECODERS[format_name[:3]](blocks)
+
+    # Arrange the 4x4 pixel blocks into rows of pixels.
+    pixels = pixels.reshape(height_in_blocks, width_in_blocks, 4, 4, 4).transpose(0, 2, 1, 3, 4)
+    pixels = pixels.reshape(height_in_blocks * 4, width_in_blocks * 4, 4)
+    return np.ascontiguousarray(pixels[:height, :width])
+
+
+def decode_nutexb(data):
+    '''
+    Decodes the first mipmap of each layer in the .nutexb file data to an RGBA image.
+    Returns a uint8 array with shape (height, width * layer count, 4) and rows from top to bottom.
+    '''
+    footer = read_footer(data)
+    if footer.image_format not in FORMATS:
+        raise ValueError(f'Unsupported .nutexb image format 0x{footer.image_format:04x}')
+    if footer.depth > 1:
+        raise ValueError('3D .nutexb textures are not supported')
+
+    format_name, block_dimension, bytes_per_block = FORMATS[footer.image_format]
+    width_in_blocks = div_round_up(footer.width, block_dimension)
+    height_in_blocks = div_round_up(footer.height, block_dimension)
+    block_height = block_height_mip0(height_in_blocks)
+
+    layer_count = max(footer.layer_count, 1)
+    layer_size = footer.data_size // layer_count
+
+    layers = []
+    for layer in range(layer_count):
+        layer_data = data[layer * layer_size:(layer + 1) * layer_size]
+        rows = deswizzle_surface(layer_data, width_in_blocks, height_in_blocks, bytes_per_block, block_height)
+        layers.append(decode_surface(rows, format_name, footer.width, footer.height))
+
+    return np.concatenate(layers, axis=1) if len(layers) > 1 else layers[0]
+
+
+def get_cache_dir():
+    return os.path.join(tempfile.gettempdir(), 'smash_ultimate_blender', 'nutexb')
+
+
+def get_cache_path(data):
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return os.path.join(get_cache_dir(), f'{digest}_v{DECODER_VERSION}.npy')
+
+
+def read_nutexb_rgba(path):
+    '''
+    Returns the decoded RGBA image for the .nutexb file.
+    Decoded images are cached on disk by the hash of the file's contents,
+    so importing the same texture again only needs to read the cached file.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    cache_path = get_cache_path(data)
+    try:
+        return np.load(cache_path)
+    except (OSError, ValueError):
+        pass
+
+    rgba = decode_nutexb(data)
+
+    # Write to a temporary file first, so other imports never read a partially written cache file.
+    try:
+        os.makedirs(get_cache_dir(), exist_ok=True)
+        temp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            np.save(f, rgba)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f'Failed to cache decoded texture {path}: {e}')
+
+    return rgba
@@ -0,0 +1,97 @@
+def hierarchy_order(roots, get_children):
+    '''
+    Returns the items in 'heirarchal' order, which is where the parent always appears before the child.
+    This is iterative rather than recursive to avoid hitting the recursion limit on long swing bone chains.
+    '''
+    order = []
+    visited = set()
+    stack = list(reversed(roots))
+    while stack:
+        item = stack.pop()
+        if item in visited:
+            continue
+        visited.add(item)
+        order.append(item)
+        stack.extend(reversed(get_children(item)))
+    return order
+
+
+def get_bone_hierarchy_order(armature):
+    '''
+    Returns the armature's bone names in 'heirarchal' order.
+    This walks every bone, so callers that need the order more than once should keep the result.
+    '''
+    children = {bone.name: [] for bone in armature.data.bones}
+    roots = []
+    for bone in armature.data.bones:
+        if bone.parent is None:
+            roots.append(bone.name)
+        else:
+            children[bone.parent.name].append(bone.name)
+
+    return hierarchy_order(roots, children.__getitem__)
+
+
+class SkeletonIndex:
+    '''
+    Lookup tables for a SkelData that only need to be built once per skeleton.
+    The bones of a SkelData can only be searched by scanning the list,
+    which makes operations that look up every bone quadratic for large skeletons.
+    '''
+    def __init__(self, skel):
+        self.skel = skel
+        self.bones = list(skel.bones)
+
+        # Use the first bone with a given name to match the previous linear search.
+        self.name_to_index = {}
+        for index, bone in enumerate(self.bones):
+            self.name_to_index.setdefault(bone.name, index)
+
+        # Treat invalid parent indices as root bones so the hierarchy is always well formed.
+        self.parent_indices = []
+        for bone in self.bones:
+            parent_index = bone.parent_index
+            if parent_index is not None and not 0 <= parent_index < len(self.bones):
+                parent_index = None
+            self.parent_indices.append(parent_index)
+
+        self.children = [[] for _ in self.bones]
+        self.roots = []
+        for index, parent_index in enumerate(self.parent_indices):
+            if parent_index is None:
+                self.roots.append(index)
+            else:
+                self.children[parent_index].append(index)
+
+        self.hierarchy_order = self.calculate_hierarchy_order()
+        self.world_transforms = {}
+
+    def calculate_hierarchy_order(self):
+        '''
+        The ssbh bones are not guaranteed to appear in 'heirarchal' order,
+        which is where the parent always appears before the child.
+        '''
+        return hierarchy_order(self.roots, self.children.__getitem__)
+
+    def find_bone_index(self, name):
+        return self.name_to_index.get(name)
+
+    def find_bone(self, name):
+        index = self.name_to_index.get(name)
+        if index is None:
+            return None
+        return self.bones[index]
+
+    def get_parent_name(self, index):
+        parent_index = self.parent_indices[index]
+        if parent_index is None:
+            return None
+        return self.bones[parent_index].name
+
+    def get_world_transform(self, index):
+        # Calculating world transforms walks the entire parent chain, so cache the result.
+        world_transform = self.world_transforms.get(index)
+        if world_transform is None:
+            world_transform = self.skel.calculate_world_transform(self.bones[index])
+            self.world_transforms[index] = world_transform
+        return world_transform
@@ -0,0 +1,255 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+from bpy_extras import image_utils
+
+from . import nutexb
+
+# Stores the path and modification time an image was loaded from.
+TEXTURE_KEY_PROPERTY = 'smash_ultimate_texture_key'
+# Marks images created without reading their file.
+LAZY_TEXTURE_PROPERTY = 'smash_ultimate_lazy_texture'
+# Stores the .nutexb file for images with pixels decoded by the addon instead of read by Blender.
+DECODED_TEXTURE_PROPERTY = 'smash_ultimate_decoded_texture'
+
+
+def get_texture_key(path, lazy=False):
+    '''
+    Returns a key for the file's resolved path and modification time.
+    Editing the file changes the key, so the updated file is loaded again.
+    Lazy images don't access the file, so they only use the path.
+    '''
+    if lazy:
+        return f'{os.path.normcase(os.path.normpath(path))}|lazy'
+
+    path = os.path.normcase(os.path.realpath(path))
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        # Missing files use placeholder images.
+        mtime = None
+    return f'{path}|{mtime}'
+
+
+def get_source_path(path):
+    '''
+    Returns the file to load for the .png texture path.
+    Textures that haven't been converted to .png are decoded from the .nutexb file in the same folder.
+    '''
+    if os.path.isfile(path):
+        return path
+    nutexb_path = os.path.splitext(path)[0] + '.nutexb'
+    if os.path.isfile(nutexb_path):
+        return nutexb_path
+    return path
+
+
+def is_nutexb_path(path):
+    return path.lower().endswith('.nutexb')
+
+
+def set_image_pixels(image, rgba, source_path):
+    '''
+    Replaces the image's contents with the decoded uint8 RGBA array with rows from top to bottom.
+    The image is stored when the .blend file is saved, since packing encodes the pixels as a .png.
+    '''
+    height, width = rgba.shape[:2]
+    if image.source != 'GENERATED':
+        image.source = 'GENERATED'
+    if tuple(image.size) != (width, height):
+        image.scale(width, height)
+    # Blender stores rows from bottom to top.
+    pixels = (rgba[::-1].astype(np.float32) / 255.0).ravel()
+    image.pixels.foreach_set(pixels)
+    image[DECODED_TEXTURE_PROPERTY] = source_path
+
+
+def create_decoded_image(path, source_path, rgba):
+    height, width = rgba.shape[:2]
+    image = bpy.data.images.new(os.path.basename(path), width, height, alpha=True)
+    set_image_pixels(image, rgba, source_path)
+    return image
+
+
+def store_decoded_images():
+    '''
+    Makes sure decoded images aren't lost after reopening the .blend file.
+    Blender can't read .nutexb files, so decoded images are packed into the .blend file.
+    Returns the number of packed images.
+    '''
+    packed_count = 0
+    for image in bpy.data.images:
+        if DECODED_TEXTURE_PROPERTY not in image or image.packed_file is not None:
+            continue
+
+        # Unused images aren't saved, so don't spend time encoding them.
+        if image.users == 0:
+            continue
+        image.pack()
+        packed_count += 1
+    return packed_count
+
+
+@persistent
+def store_decoded_images_on_save(_):
+    start = time.time()
+    packed_count = store_decoded_images()
+    if packed_count > 0:
+        end = time.time()
+        print(f'Packed {packed_count} decoded textures in {end - start} seconds')
+
+
+def register():
+    bpy.app.handlers.save_pre.append(store_decoded_images_on_save)
+
+
+def unregister():
+    if store_decoded_images_on_save in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(store_decoded_images_on_save)
+
+
+def read_nutexb(path):
+    try:
+        return nutexb.read_nutexb_rgba(path)
+    except (OSError, ValueError) as e:
+        print(f'Failed to decode {path}: {e}')
+        return None
+
+
+def create_lazy_image(path):
+    image = bpy.data.images.new(os.path.basename(path), 1, 1, alpha=True)
+    # Blender reads file images on first use, so the file isn't accessed until the image is displayed or rendered.
+    image.source = 'FILE'
+    image.filepath = path
+    image[LAZY_TEXTURE_PROPERTY] = path
+    return image
+
+
+def load_lazy_images(images):
+    '''
+    Reads the files for lazy images now instead of waiting for them to be displayed.
+    Returns the number of loaded images and the paths of any missing files.
+    '''
+    loaded_count = 0
+    missing_paths = []
+    for image in images:
+        path = image.get(LAZY_TEXTURE_PROPERTY)
+        if path is None:
+            continue
+        source_path = get_source_path(path)
+        if not os.path.isfile(source_path):
+            missing_paths.append(path)
+            continue
+
+        if is_nutexb_path(source_path):
+            # Blender can't read .nutexb files, so decode the pixels instead.
+            rgba = read_nutexb(source_path)
+            if rgba is None:
+                missing_paths.append(path)
+                continue
+            set_image_pixels(image, rgba, source_path)
+        else:
+            image.reload()
+            # Accessing the size reads the file.
+            image.size[0]
+        del image[LAZY_TEXTURE_PROPERTY]
+        # Tag the image like an eagerly loaded image, so later imports can reuse it.
+        image[TEXTURE_KEY_PROPERTY] = get_texture_key(source_path)
+        loaded_count += 1
+
+    return loaded_count, missing_paths
+
+
+class TextureCache:
+    '''
+    Reuses images between imports instead of loading the same file more than once.
+    Images are tagged with their key, so images from previous sessions in the same .blend file are also reused.
+    '''
+    def __init__(self):
+        self.key_to_image_name = {}
+
+    def find_cached_image(self, key):
+        name = self.key_to_image_name.get(key)
+        image = bpy.data.images.get(name) if name is not None else None
+        if image is not None and image.get(TEXTURE_KEY_PROPERTY) == key:
+            return image
+        return None
+
+    def find_tagged_images(self):
+        return {image[TEXTURE_KEY_PROPERTY]: image for image in bpy.data.images if TEXTURE_KEY_PROPERTY in image}
+
+    def load_images(self, paths, lazy=False):
+        '''
+        Returns a dict of path to image for each path.
+        Missing .png files are decoded from .nutexb files instead, in parallel before creating the images.
+        Blender loads .png files itself, which only reads the pixels the first time the image is used.
+        Lazy images for .png files are created without reading their files.
+        Blender can't load .nutexb files on first use, so textures without a .png are still decoded now.
+        '''
+        start = time.time()
+
+        path_to_source = {path: get_source_path(path) for path in set(paths)}
+        lazy_paths = {path for path, source in path_to_source.items() if lazy and not is_nutexb_path(source)}
+        path_to_key = {path: get_texture_key(source, path in lazy_paths) for path, source in path_to_source.items()}
+
+        path_to_image = {}
+        missed_paths = []
+        tagged_images = None
+        for path, key in path_to_key.items():
+            image = self.find_cached_image(key)
+            if image is None:
+                # Only search every image if the cache doesn't have the key.
+                if tagged_images is None:
+                    tagged_images = self.find_tagged_images()
+                image = tagged_images.get(key)
+
+            if image is not None:
+                self.key_to_image_name[key] = image.name
+                path_to_image[path] = image
+            else:
+                missed_paths.append(path)
+
+        existing_paths = [path for path in missed_paths if path not in lazy_paths and os.path.isfile(path_to_source[path])]
+        nutexb_paths = [path for path in existing_paths if is_nutexb_path(path_to_source[path])]
+        path_to_rgba = {}
+        if len(nutexb_paths) > 0:
+            # Most of the decoding time is spent in NumPy, which releases the GIL.
+            with ThreadPoolExecutor() as executor:
+                path_to_rgba.update(zip(nutexb_paths, executor.map(read_nutexb, [path_to_source[path] for path in nutexb_paths])))
+
+        # Blender data can only be created on the main thread.
+        for path in missed_paths:
+            key = path_to_key[path]
+            rgba = path_to_rgba.get(path)
+            if path in lazy_paths:
+                image = create_lazy_image(path)
+            elif rgba is not None:
+                image = create_decoded_image(path, path_to_source[path], rgba)
+            else:
+                image = image_utils.load_image(path, place_holder=True, check_existing=False)
+            image[TEXTURE_KEY_PROPERTY] = key
+            self.key_to_image_name[key] = image.name
+            path_to_image[path] = image
+
+        end = time.time()
+        hit_count = len(path_to_key) - len(missed_paths)
+        print(f'Loaded {len(path_to_key)} textures in {end - start} seconds ({hit_count} cache hits, {len(missed_paths)} cache misses, {len(nutexb_paths)} decoded from .nutexb)')
+
+        return path_to_image
+
+
+_texture_cache = None
+
+
+def get_texture_cache():
+    '''
+    Returns the TextureCache shared by all imports.
+    '''
+    global _texture_cache
+    if _texture_cache is None:
+        _texture_cache = TextureCache()
+    return _texture_cache
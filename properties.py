@@ -43,13 +43,6 @@ def register():
         default="H_Exo_"
     )
 
-    Scene.ssbh_lib_json_path = StringProperty(
-        name='ssbh_lib_json path',
-        description='The Path to the ssbh_lib_json.exe file',
-        default='',
-    )
-    
-
     Scene.numatb_file_path = StringProperty(
         name='.numatb file path',
         description='The Path to the model.numatb file',
@@ -118,6 +111,17 @@ def register():
         default=True,
     )
 
+    Scene.sub_model_import_all_vertex_groups = BoolProperty(
+        name='Create All Vertex Groups',
+        description='Create a vertex group for every bone instead of only the bones each mesh uses',
+        default=False,
+    )
+    Scene.sub_model_import_lazy_textures = BoolProperty(
+        name='Lazy Textures',
+        description="Create images without reading the .png texture files. Blender loads each image the first time it's displayed or rendered. Textures that only have a .nutexb file are still decoded during import",
+        default=False,
+    )
+
     Scene.sub_anim_armature = PointerProperty(
         name='Armature',
         description='Select the Armature',